@@ -0,0 +1,184 @@
+"""
+First-expiry-first-out allocation of withdrawals to batches.
+
+``allocate`` splits withdrawals across the open batches of their item, in
+order of earliest ``expiration_date`` (batches without one go last, ties go
+to the older batch). A withdrawal only draws from batches that had arrived
+by then (``batch_date`` on or before the withdrawal's date), so the backfill
+of old withdrawals doesn't take stock from later batches. The splits are
+stored as ``BatchAllocation`` rows. A batch's remaining quantity is its
+``quantity`` minus what has been allocated from it.
+
+The withdrawals themselves are locked first (in id order), and only then is
+it checked which of them are already allocated, so the receiver and the
+backfill command can't both allocate the same withdrawal. Only the open
+batches of the affected items are locked, with
+``SELECT ... FOR UPDATE`` in primary-key order, so concurrent withdrawals
+of the same item queue briefly and never deadlock. Withdrawals of other
+items are not blocked at all. Remaining quantities are re-read after the
+lock is taken, so two phones selling the last units of a batch cannot both
+allocate them.
+
+New withdrawals made through Django are allocated by ``inventory.signals``;
+``allocate_withdrawals`` backfills the rest in chunks.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, Exists, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import items
+from .models import BatchAllocation, ProductBatches, RawMaterialBatches, Withdrawals
+
+# item type -> (batch model, item foreign key)
+BATCH_SOURCES = {
+    items.PRODUCT: (ProductBatches, 'product'),
+    items.RAW_MATERIAL: (RawMaterialBatches, 'material'),
+}
+
+QUANTITY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def allocated_quantity(item_type):
+    """Subquery summing what has been allocated from the outer batch row."""
+    allocated = (
+        BatchAllocation.objects.filter(item_type=item_type, batch_id=OuterRef('pk'))
+        .order_by()
+        .values('batch_id')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return Coalesce(Subquery(allocated, output_field=QUANTITY), Value(Decimal('0')), output_field=QUANTITY)
+
+
+def remaining_quantity(item_type):
+    """Expression for a batch row's quantity not yet allocated."""
+    return F('quantity') - allocated_quantity(item_type)
+
+
+def _lock_withdrawals(ids):
+    """Lock the withdrawal rows (in id order); returns the ids that still exist."""
+    return set(
+        Withdrawals.objects.select_for_update()
+        .filter(id__in=ids)
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+
+
+def _withdrawal_day(withdrawal):
+    if withdrawal.date is None:
+        return timezone.localdate()
+    if timezone.is_aware(withdrawal.date):
+        return timezone.localdate(withdrawal.date)
+    return withdrawal.date.date()
+
+
+def _lock_open_batches(item_type, item_ids):
+    """
+    Lock the item's batches that still have stock; return
+    {item_id: [[batch_id, remaining, batch_date], ...]} in FEFO order.
+    """
+    model, item_field = BATCH_SOURCES[item_type]
+    open_ids = list(
+        model.objects.filter(**{f"{item_field}_id__in": item_ids})
+        .annotate(remaining=remaining_quantity(item_type))
+        .filter(remaining__gt=0)
+        .values_list('id', flat=True)
+    )
+    if not open_ids:
+        return {}
+    # Lock in primary-key order so concurrent allocators always queue the same way
+    locked = list(
+        model.objects.select_for_update()
+        .filter(id__in=open_ids)
+        .order_by('id')
+        .values_list('id', f"{item_field}_id", 'quantity', 'expiration_date', 'batch_date')
+    )
+    # Re-read allocations now that no one else can allocate from these batches
+    used = dict(
+        BatchAllocation.objects.filter(item_type=item_type, batch_id__in=[row[0] for row in locked])
+        .order_by()
+        .values('batch_id')
+        .annotate(total=Sum('quantity'))
+        .values_list('batch_id', 'total')
+    )
+    queues = defaultdict(list)
+    fefo = sorted(locked, key=lambda row: (row[3] is None, row[3], row[0]))
+    for batch_id, item_id, quantity, _expiration, batch_date in fefo:
+        remaining = Decimal(quantity) - (used.get(batch_id) or Decimal('0'))
+        if remaining > 0:
+            queues[item_id].append([batch_id, remaining, batch_date])
+    return queues
+
+
+def allocate(withdrawals):
+    """
+    Allocate withdrawals (in the order given) that have no allocation yet.
+    Returns the number of ``BatchAllocation`` rows created.
+    """
+    withdrawals = [w for w in withdrawals if items.normalize_item_type(w.item_type) and w.quantity > 0]
+    if not withdrawals:
+        return 0
+    with transaction.atomic():
+        # Whoever locks the withdrawals second sees the first one's allocations
+        existing = _lock_withdrawals([w.id for w in withdrawals])
+        done = set(
+            BatchAllocation.objects.filter(withdrawal_id__in=existing)
+            .values_list('withdrawal_id', flat=True)
+        )
+        pending = [w for w in withdrawals if w.id in existing and w.id not in done]
+        wanted = defaultdict(set)
+        for withdrawal in pending:
+            wanted[items.normalize_item_type(withdrawal.item_type)].add(withdrawal.item_id)
+        queues = {item_type: _lock_open_batches(item_type, ids) for item_type, ids in wanted.items()}
+
+        rows = []
+        for withdrawal in pending:
+            item_type = items.normalize_item_type(withdrawal.item_type)
+            queue = queues[item_type].get(withdrawal.item_id, [])
+            needed = Decimal(withdrawal.quantity)
+            day = _withdrawal_day(withdrawal)
+            for batch in queue:
+                if needed <= 0:
+                    break
+                if batch[1] <= 0 or batch[2] > day:
+                    continue
+                taken = min(needed, batch[1])
+                rows.append(BatchAllocation(
+                    withdrawal_id=withdrawal.id, item_type=item_type, item_id=withdrawal.item_id,
+                    batch_id=batch[0], quantity=taken,
+                ))
+                needed -= taken
+                batch[1] -= taken
+            queue[:] = [batch for batch in queue if batch[1] > 0]
+            if needed > 0:
+                rows.append(BatchAllocation(
+                    withdrawal_id=withdrawal.id, item_type=item_type, item_id=withdrawal.item_id,
+                    batch_id=None, quantity=needed,
+                ))
+        BatchAllocation.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def reallocate(withdrawal):
+    """Drop and redo a withdrawal's allocation (after its item or quantity changed)."""
+    with transaction.atomic():
+        _lock_withdrawals([withdrawal.pk])
+        release(withdrawal.pk)
+        return allocate([withdrawal])
+
+
+def release(withdrawal_id):
+    BatchAllocation.objects.filter(withdrawal_id=withdrawal_id).delete()
+
+
+def unallocated_withdrawals():
+    """Withdrawals without any allocation, oldest first (for the backfill)."""
+    return (
+        Withdrawals.objects.filter(~Exists(BatchAllocation.objects.filter(withdrawal_id=OuterRef('pk'))))
+        .order_by('id')
+    )
@@ -0,0 +1,350 @@
+"""
+JSON list endpoints for the PWA.
+
+Every response carries an ETag derived from the data version of the tables
+it reads (see ``inventory.versions``). A request whose ``If-None-Match`` still
+matches gets a 304 from ``condition`` before the view runs, so no rows are
+fetched and nothing is serialized.
+"""
+import json
+import logging
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import condition, require_GET, require_POST
+
+from . import expiry, intake, items, notifications, producibility, search, snapshots, sync, versions
+from .models import (
+    Expenses,
+    HistoryLog,
+    HistoryLogTypes,
+    ProductBatches,
+    ProductInventory,
+    ProductRecipes,
+    Products,
+    ProductTypes,
+    ProductVariants,
+    RawMaterialBatches,
+    RawMaterialInventory,
+    RawMaterials,
+    Sales,
+    SizeUnits,
+    StockChanges,
+    UnitPrices,
+)
+from .pagination import KeysetPaginator
+
+logger = logging.getLogger(__name__)
+
+# Bump when a payload's shape changes so clients don't keep stale 304s
+API_VERSION = '1'
+
+MAX_PER_PAGE = 100
+
+MAX_SEARCH_RESULTS = 50
+
+
+def versioned(*models, labels=False, dated=False):
+    """
+    Conditional-GET decorator keyed on the data version of ``models``.
+    ``labels`` adds the item label version; ``dated`` adds today's date for
+    responses that depend on it.
+    """
+    def etag(request, *args, **kwargs):
+        extra = [API_VERSION, request.GET.urlencode()]
+        if labels:
+            extra.append(items.current_version())
+        if dated:
+            extra.append(timezone.localdate().isoformat())
+        return versions.data_version(*models, extra=extra)
+    return condition(etag_func=etag)
+
+
+def _page(request, queryset, ordering):
+    try:
+        per_page = min(max(int(request.GET.get('per_page', 50)), 1), MAX_PER_PAGE)
+    except ValueError:
+        per_page = 50
+    return KeysetPaginator(queryset, ordering, per_page).get_page(request.GET.get('cursor'))
+
+
+def _respond(page, results):
+    response = JsonResponse({
+        'results': results,
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+    # Let the browser/service worker keep the body but revalidate every time
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required(login_url="login")
+@require_GET
+@versioned(ProductInventory, Products, labels=True)
+def product_stock_api(request):
+    page = _page(
+        request,
+        ProductInventory.objects.filter(product__is_archived=False),
+        ('product_id',),
+    )
+    resolved = items.resolve_items((items.PRODUCT, row.product_id) for row in page)
+    results = []
+    for row in page:
+        item = resolved.get((items.PRODUCT, row.product_id))
+        results.append({
+            'product_id': row.product_id,
+            'name': item.label if item else items.missing_label(items.PRODUCT, row.product_id),
+            'total_stock': row.total_stock,
+            'restock_threshold': row.restock_threshold,
+        })
+    return _respond(page, results)
+
+
+@login_required(login_url="login")
+@require_GET
+@versioned(RawMaterialInventory, RawMaterials, labels=True)
+def raw_stock_api(request):
+    page = _page(
+        request,
+        RawMaterialInventory.objects.filter(material__is_archived=False),
+        ('material__name', 'material_id'),
+    )
+    resolved = items.resolve_items((items.RAW_MATERIAL, row.material_id) for row in page)
+    results = []
+    for row in page:
+        item = resolved.get((items.RAW_MATERIAL, row.material_id))
+        results.append({
+            'material_id': row.material_id,
+            'name': item.label if item else items.missing_label(items.RAW_MATERIAL, row.material_id),
+            'total_stock': row.total_stock,
+            'reorder_threshold': row.reorder_threshold,
+        })
+    return _respond(page, results)
+
+
+def _ledger_rows(page):
+    return [
+        {
+            'id': row.id,
+            'category': row.category,
+            'amount': row.amount,
+            'date': row.date,
+            'description': row.description,
+        }
+        for row in page
+    ]
+
+
+@login_required(login_url="login")
+@require_GET
+@versioned(Sales)
+def sales_api(request):
+    page = _page(request, Sales.objects.all(), ('-date', '-id'))
+    return _respond(page, _ledger_rows(page))
+
+
+@login_required(login_url="login")
+@require_GET
+@versioned(Expenses)
+def expenses_api(request):
+    page = _page(request, Expenses.objects.all(), ('-date', '-id'))
+    return _respond(page, _ledger_rows(page))
+
+
+@login_required(login_url="login")
+@require_GET
+@versioned(StockChanges, labels=True)
+def stock_changes_api(request):
+    page = _page(request, StockChanges.objects.select_related('created_by_admin'), ('-date', '-id'))
+    resolved = items.resolve_items((row.item_type, row.item_id) for row in page)
+    results = []
+    for row in page:
+        item = items.lookup(resolved, row.item_type, row.item_id)
+        results.append({
+            'id': row.id,
+            'item_type': items.normalize_item_type(row.item_type),
+            'item_id': row.item_id,
+            'item_name': item.label if item else items.missing_label(row.item_type, row.item_id),
+            'quantity_change': row.quantity_change,
+            'category': row.category,
+            'date': row.date,
+            'created_by': getattr(row.created_by_admin, 'username', 'System'),
+        })
+    return _respond(page, results)
+
+
+@login_required(login_url="login")
+@require_GET
+@versioned(HistoryLog, HistoryLogTypes)
+def history_api(request):
+    page = _page(request, HistoryLog.objects.select_related('admin', 'log_type'), ('-log_date', '-id'))
+    results = [
+        {
+            'id': row.id,
+            'admin': row.admin.username,
+            'log_type': row.log_type.category,
+            'log_date': row.log_date,
+        }
+        for row in page
+    ]
+    return _respond(page, results)
+
+
+@login_required(login_url="login")
+@require_GET
+@versioned(ProductRecipes, RawMaterialInventory, RawMaterials, Products, SizeUnits, labels=True)
+def producibility_api(request):
+    results = [
+        {
+            'product_id': capacity.product_id,
+            'name': capacity.label,
+            'max_units': capacity.max_units,
+            'bottleneck': capacity.bottleneck and {
+                'material_id': capacity.bottleneck.material_id,
+                'name': capacity.bottleneck.label,
+            },
+            'materials': [
+                {
+                    'material_id': component.material_id,
+                    'name': component.label,
+                    'needed_per_unit': component.needed,
+                    'available': component.available,
+                    'unit': component.unit,
+                    'supports': component.supports,
+                }
+                for component in capacity.components
+            ],
+            'problems': capacity.problems,
+        }
+        for capacity in producibility.compute()
+    ]
+    response = JsonResponse({'results': results})
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required(login_url="login")
+@require_GET
+@versioned(ProductBatches, RawMaterialBatches, Products, RawMaterials, UnitPrices, labels=True, dated=True)
+def expiring_api(request):
+    days = expiry.horizon_days(request.GET.get('days'))
+    results = [
+        {
+            'item_type': entry.item_type,
+            'item_id': entry.item_id,
+            'name': entry.label,
+            'batches': entry.batches,
+            'quantity': entry.quantity,
+            'value': entry.value,
+            'earliest_expiry': entry.earliest_expiry,
+        }
+        for entry in expiry.expiring(days)
+    ]
+    response = JsonResponse({'days': days, 'results': results})
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required(login_url="login")
+@require_GET
+@versioned(
+    StockChanges, ProductInventory, RawMaterialInventory, Products, RawMaterials, UnitPrices,
+    labels=True, dated=True,
+)
+def stock_as_of_api(request):
+    value = request.GET.get('at') or request.GET.get('date')
+    try:
+        at = snapshots.parse_at(value) if value else timezone.now()
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    result = snapshots.stock_as_of(at)
+    response = JsonResponse({
+        'at': result.at,
+        'snapshot_at': result.snapshot_at,
+        'total_value': result.total_value,
+        'results': [
+            {
+                'item_type': line.item_type,
+                'item_id': line.item_id,
+                'name': line.label,
+                'quantity': line.quantity,
+                'unit_price': line.unit_price,
+                'value': line.value,
+            }
+            for line in result.lines
+        ],
+    })
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required(login_url="login")
+@require_GET
+def sync_api(request):
+    """Rows changed since ``since`` for the service worker's IndexedDB replica."""
+    try:
+        limit = min(max(int(request.GET.get('limit', sync.DEFAULT_LIMIT)), 1), sync.MAX_LIMIT)
+    except ValueError:
+        limit = sync.DEFAULT_LIMIT
+    response = JsonResponse(sync.build_delta(request.GET.get('since'), limit))
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@login_required(login_url="login")
+@require_POST
+def intake_api(request):
+    """
+    Receive product/raw material batches as a JSON list (or ``{"batches": [...]}``)
+    or as CSV, either as the request body or an uploaded ``file``.
+    """
+    try:
+        if 'file' in request.FILES:
+            lines = intake.parse_csv(request.FILES['file'].read().decode('utf-8-sig'))
+        elif request.content_type == 'text/csv':
+            lines = intake.parse_csv(request.body.decode('utf-8-sig'))
+        else:
+            payload = json.loads(request.body)
+            lines = payload.get('batches') if isinstance(payload, dict) else payload
+        result = intake.receive(lines, request.user)
+    except (ValueError, UnicodeDecodeError) as exc:
+        errors = exc.errors if isinstance(exc, intake.IntakeError) else [f"Could not read the batches: {exc}"]
+        return JsonResponse({'errors': errors}, status=400)
+    logger.info(f"User {request.user.username} received {result.batches} batch(es) for {result.items} item(s)")
+    return JsonResponse(result._asdict(), status=201)
+
+
+@login_required(login_url="login")
+@require_GET
+def unread_notifications_api(request):
+    """Unread notification count for the header badge, served from the counter cache."""
+    response = JsonResponse({'unread': notifications.unread_count()})
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required(login_url="login")
+@require_GET
+@versioned(Products, ProductTypes, ProductVariants, RawMaterials, Sales, Expenses, labels=True)
+def search_api(request):
+    """
+    Ranked matches for ``q`` across products, raw materials, sales and
+    expenses, grouped by entity (at most ``limit`` each, default 10).
+    """
+    term = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), MAX_SEARCH_RESULTS)
+    except ValueError:
+        limit = 10
+    groups = search.search(term, limit) if term else {entity: [] for entity in search.ENTITIES}
+    response = JsonResponse({
+        'query': term,
+        'groups': [
+            {'entity': entity, 'count': len(results), 'results': results}
+            for entity, results in groups.items()
+        ],
+    })
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,375 @@
+"""
+Synthetic-data benchmark of the app's pages and JSON endpoints.
+
+``throwaway_database`` builds a test database (``test_<NAME>``, or an
+in-memory SQLite database), runs the migrations and then creates the
+unmanaged tables that the main system normally owns, plus the indexes
+migrations 0003, 0007 and 0011 would have added to them. ``seed`` fills it
+with ``VOLUMES`` rows times a scale factor using ``bulk_create``, then runs
+the same derivations the scheduled commands and signals do (monthly rollup,
+FEFO allocation, notifications, expiry summary, search index). ``run`` drives every view in
+``VIEWS`` through the test client as a superuser and records wall time,
+query count and SQL time per view.
+
+Other aliases (the report replica) are pointed at the same test database.
+The database is dropped afterwards; nothing touches the configured ones.
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from . import allocation, expiry, notifications, rollups, search, timing
+from .models import (
+    AuthUser,
+    Expenses,
+    HistoryLog,
+    HistoryLogTypes,
+    ProductBatches,
+    ProductInventory,
+    ProductRecipes,
+    Products,
+    ProductTypes,
+    ProductVariants,
+    RawMaterialBatches,
+    RawMaterialInventory,
+    RawMaterials,
+    Sales,
+    Sizes,
+    SizeUnits,
+    SrpPrices,
+    StockChanges,
+    UnitPrices,
+    UserSessions,
+    Withdrawals,
+)
+
+# Rows seeded at --scale 1
+VOLUMES = {
+    'users': 10,
+    'products': 60,
+    'raw_materials': 40,
+    'recipes': 240,
+    'product_batches': 600,
+    'raw_material_batches': 400,
+    'withdrawals': 3000,
+    'stock_changes': 5000,
+    'sales': 3000,
+    'expenses': 1500,
+    'history_logs': 4000,
+    'sessions': 300,
+}
+
+# Migrations whose DDL targets unmanaged tables and is skipped when they are missing
+INDEX_MIGRATIONS = (
+    '0003_keyset_indexes', '0007_expiry_indexes', '0011_search_indexes', '0013_stock_change_search_indexes',
+)
+
+# (label, url name, reverse kwargs, query string)
+VIEWS = (
+    ('dashboard', 'dashboard', None, ''),
+    ('product_stock', 'product_stock', None, ''),
+    ('raw_stock', 'raw_stock', None, ''),
+    ('stock_changes', 'stock_changes', None, ''),
+    ('stock_changes_search', 'stock_changes', None, 'q=Var1'),
+    ('sales_list', 'sales_list', None, ''),
+    ('expenses_list', 'expenses_list', None, ''),
+    ('history_log', 'history_log', None, ''),
+    ('best_sellers', 'best_sellers', None, ''),
+    ('best_sellers_all', 'best_sellers', None, 'show_all=1'),
+    ('producibility_report', 'producibility_report', None, ''),
+    ('expiring_report', 'expiring_report', None, ''),
+    ('stock_as_of_report', 'stock_as_of_report', None, ''),
+    ('monthly_report_data', 'monthly_report_data', None, ''),
+    ('monthly_report_live', 'monthly_report_data', None, 'live=1'),
+    ('user_activity', 'user_activity', None, ''),
+    ('product_stock_api', 'product_stock_api', None, ''),
+    ('raw_stock_api', 'raw_stock_api', None, ''),
+    ('stock_changes_api', 'stock_changes_api', None, ''),
+    ('sales_api', 'sales_api', None, ''),
+    ('expenses_api', 'expenses_api', None, ''),
+    ('history_api', 'history_api', None, ''),
+    ('producibility_api', 'producibility_api', None, ''),
+    ('expiring_api', 'expiring_api', None, ''),
+    ('stock_as_of_api', 'stock_as_of_api', None, ''),
+    ('sync_api', 'sync_api', None, ''),
+    ('unread_notifications_api', 'unread_notifications_api', None, ''),
+    ('search_api', 'search_api', None, 'q=wholesale'),
+    ('search_api_prefix', 'search_api', None, 'q=mat'),
+    ('export_sales', 'export_ledger', {'ledger': 'sales'}, ''),
+)
+
+Timing = namedtuple('Timing', ['view', 'status', 'wall_ms', 'queries', 'sql_ms'])
+
+BATCH_SIZE = 1000
+
+
+def volumes(scale=1, overrides=None):
+    """``VOLUMES`` multiplied by ``scale`` (at least 1 row each), with explicit overrides applied."""
+    counts = {name: max(int(count * scale), 1) for name, count in VOLUMES.items()}
+    counts.update(overrides or {})
+    return counts
+
+
+@contextmanager
+def throwaway_database(verbosity=0):
+    """
+    Create a test database with every inventory table, and drop it on exit.
+    The file caches move to a temporary directory, so the benchmark neither
+    sees nor clears the real ones.
+    """
+    setup_test_environment()
+    cache_dir = tempfile.TemporaryDirectory(prefix='benchmark-cache-')
+    override = override_settings(CACHES={
+        alias: {**options, 'LOCATION': os.path.join(cache_dir.name, alias)}
+        for alias, options in settings.CACHES.items()
+    })
+    override.enable()
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    # Point other aliases (the report replica) at the test database too
+    mirrors = {}
+    for alias in connections:
+        if alias != DEFAULT_DB_ALIAS:
+            mirrors[alias] = connections[alias].settings_dict
+            connections[alias].close()
+            connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+    try:
+        create_unmanaged_tables()
+        yield connection.settings_dict['NAME']
+    finally:
+        for alias, settings_dict in mirrors.items():
+            connections[alias].close()
+            connections[alias].settings_dict = settings_dict
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        override.disable()
+        cache_dir.cleanup()
+        teardown_test_environment()
+
+
+def create_unmanaged_tables():
+    existing = set(connection.introspection.table_names())
+    with connection.schema_editor() as editor:
+        for model in apps.get_app_config('inventory').get_models():
+            if not model._meta.managed and model._meta.db_table not in existing:
+                editor.create_model(model)
+    with connection.schema_editor(atomic=False) as editor:
+        for name in INDEX_MIGRATIONS:
+            import_module(f"inventory.migrations.{name}").create_indexes(apps, editor)
+
+
+def _dates(rng, count, days):
+    now = timezone.now()
+    return [now - timedelta(seconds=rng.randint(0, days * 86400)) for _ in range(count)]
+
+
+def seed(counts, days=730, seed_value=1):
+    """Fill the (empty) database with ``counts`` rows spread over the last ``days`` days."""
+    rng = random.Random(seed_value)
+    admin = User.objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+    User.objects.bulk_create([
+        User(username=f"user{i}", email=f"user{i}@example.com", is_active=i % 5 != 0)
+        for i in range(counts['users'] - 1)
+    ], batch_size=BATCH_SIZE)
+    user_ids = list(User.objects.values_list('id', flat=True))
+    author = AuthUser.objects.get(pk=admin.pk)
+
+    grams = SizeUnits.objects.create(unit_name='g', created_by_admin=author)
+    kilos = SizeUnits.objects.create(unit_name='kg', created_by_admin=author)
+    size = Sizes.objects.create(size_label='250', created_by_admin=author)
+    unit_prices = UnitPrices.objects.bulk_create([
+        UnitPrices(unit_price=Decimal(price), created_by_admin=author) for price in (35, 50, 75, 120)
+    ])
+    srp = SrpPrices.objects.create(srp_price=Decimal('150'), created_by_admin=author)
+    product_type = ProductTypes.objects.create(name='Polvoron', created_by_admin=author)
+
+    variants = ProductVariants.objects.bulk_create([
+        ProductVariants(name=f"Var{i}", created_by_admin=author) for i in range(counts['products'])
+    ], batch_size=BATCH_SIZE)
+    products = Products.objects.bulk_create([
+        Products(
+            product_type=product_type, variant=variant, size=size, size_unit=grams,
+            unit_price=rng.choice(unit_prices), srp_price=srp, description=f"Benchmark product {i}",
+            created_by_admin=author, is_archived=i % 20 == 19,
+        )
+        for i, variant in enumerate(variants)
+    ], batch_size=BATCH_SIZE)
+    ProductInventory.objects.bulk_create([
+        ProductInventory(
+            product=product, total_stock=Decimal(rng.randint(0, 500)), restock_threshold=Decimal(rng.randint(5, 50)),
+        )
+        for product in products
+    ], batch_size=BATCH_SIZE)
+
+    materials = RawMaterials.objects.bulk_create([
+        RawMaterials(
+            name=f"Material {i}", size=Decimal(rng.choice((1, 5, 25))), unit=kilos,
+            price_per_unit=Decimal(rng.randint(20, 400)), created_by_admin=author, is_archived=False,
+        )
+        for i in range(counts['raw_materials'])
+    ], batch_size=BATCH_SIZE)
+    RawMaterialInventory.objects.bulk_create([
+        RawMaterialInventory(
+            material=material, total_stock=Decimal(rng.randint(0, 200)), reorder_threshold=Decimal(rng.randint(5, 20)),
+        )
+        for material in materials
+    ], batch_size=BATCH_SIZE)
+    ProductRecipes.objects.bulk_create([
+        ProductRecipes(
+            product=rng.choice(products), material=rng.choice(materials),
+            quantity_needed=Decimal(rng.randint(10, 500)), unit=grams, created_by_admin=author,
+        )
+        for _ in range(counts['recipes'])
+    ], batch_size=BATCH_SIZE)
+
+    today = timezone.localdate()
+    batch_dates = _dates(rng, counts['product_batches'], days)
+    ProductBatches.objects.bulk_create([
+        ProductBatches(
+            batch_date=made.date(), product=rng.choice(products), quantity=rng.randint(10, 200),
+            manufactured_date=made.date(), expiration_date=today + timedelta(days=rng.randint(-180, 365)),
+            created_by_admin=author,
+        )
+        for made in batch_dates
+    ], batch_size=BATCH_SIZE)
+    batch_dates = _dates(rng, counts['raw_material_batches'], days)
+    RawMaterialBatches.objects.bulk_create([
+        RawMaterialBatches(
+            batch_date=received.date(), material=rng.choice(materials), quantity=Decimal(rng.randint(1, 50)),
+            received_date=received.date(),
+            expiration_date=today + timedelta(days=rng.randint(-90, 365)) if rng.random() < 0.7 else None,
+            created_by_admin=author,
+        )
+        for received in batch_dates
+    ], batch_size=BATCH_SIZE)
+
+    reasons = ['SOLD'] * 6 + ['EXPIRED', 'DAMAGED', 'RETURNED', 'OTHERS']
+    withdrawal_dates = sorted(_dates(rng, counts['withdrawals'], days))
+    withdrawals = []
+    for _ in withdrawal_dates:
+        is_product = rng.random() < 0.8
+        withdrawals.append(Withdrawals(
+            item_type='PRODUCT' if is_product else 'RAW_MATERIAL',
+            item_id=rng.choice(products).id if is_product else rng.choice(materials).id,
+            quantity=Decimal(rng.randint(1, 10)),
+            custom_price=Decimal(rng.randint(30, 150)) if rng.random() < 0.2 else None,
+            reason=rng.choice(reasons), created_by_admin=author, is_archived=False,
+        ))
+    withdrawals = Withdrawals.objects.bulk_create(withdrawals, batch_size=BATCH_SIZE)
+    # ``date`` is auto_now_add, so back-date the rows after inserting them
+    for withdrawal, date in zip(withdrawals, withdrawal_dates):
+        withdrawal.date = date
+    Withdrawals.objects.bulk_update(withdrawals, ['date'], batch_size=BATCH_SIZE)
+
+    categories = ['Restock', 'Sold', 'Adjustment', 'Expired', 'Batch Intake']
+    changes = []
+    for date in _dates(rng, counts['stock_changes'], days):
+        item_type = rng.choice(('product', 'PRODUCT', 'raw_material'))
+        changes.append(StockChanges(
+            item_type=item_type,
+            item_id=rng.choice(materials if item_type == 'raw_material' else products).id,
+            quantity_change=Decimal(rng.randint(-20, 50)),
+            category=rng.choice(categories), date=date, created_by_admin=author,
+        ))
+    StockChanges.objects.bulk_create(changes, batch_size=BATCH_SIZE)
+    Sales.objects.bulk_create([
+        Sales(
+            category=rng.choice(('Retail', 'Wholesale', 'Online')), amount=Decimal(rng.randint(100, 5000)),
+            date=date, description='Benchmark sale', created_by_admin=author,
+        )
+        for date in _dates(rng, counts['sales'], days)
+    ], batch_size=BATCH_SIZE)
+    Expenses.objects.bulk_create([
+        Expenses(
+            category=rng.choice(('Rent', 'Supplies', 'Utilities', 'Payroll')), amount=Decimal(rng.randint(50, 3000)),
+            date=date, description='Benchmark expense', created_by_admin=author,
+        )
+        for date in _dates(rng, counts['expenses'], days)
+    ], batch_size=BATCH_SIZE)
+
+    log_types = HistoryLogTypes.objects.bulk_create([
+        HistoryLogTypes(category=category, created_by_admin=author)
+        for category in ('Login', 'Logout', 'Stock Update', 'Sale', 'Expense')
+    ])
+    HistoryLog.objects.bulk_create([
+        HistoryLog(admin_id=rng.choice(user_ids), log_type=rng.choice(log_types), log_date=date)
+        for date in _dates(rng, counts['history_logs'], days)
+    ], batch_size=BATCH_SIZE)
+    sessions = []
+    for i, login_at in enumerate(_dates(rng, counts['sessions'], days)):
+        logged_out = rng.random() < 0.7
+        sessions.append(UserSessions(
+            session_key=f"benchmark{i:031d}", user_id=rng.choice(user_ids), login_at=login_at,
+            logout_at=login_at + timedelta(hours=rng.randint(1, 8)) if logged_out else None,
+            expire_date=login_at + timedelta(days=14),
+        ))
+    UserSessions.objects.bulk_create(sessions, batch_size=BATCH_SIZE)
+
+    # What the signals and scheduled commands would have produced
+    rollups.rebuild()
+    pending = list(allocation.unallocated_withdrawals())
+    for start in range(0, len(pending), BATCH_SIZE):
+        allocation.allocate(pending[start:start + BATCH_SIZE])
+    notifications.generate()
+    expiry.summarize()
+    search.rebuild()
+    for backend in caches.all():
+        backend.clear()
+    return admin
+
+
+def _url(name, kwargs, query):
+    url = reverse(name, kwargs=kwargs)
+    return f"{url}?{query}" if query else url
+
+
+def run(user, repeat=3, warm=False, only=None):
+    """
+    Request every view ``repeat`` times and return one ``Timing`` per view
+    with the median wall/SQL time. The cache is cleared before each request
+    unless ``warm``.
+    """
+    client = Client()
+    client.force_login(user)
+    timings = []
+    for label, name, kwargs, query in VIEWS:
+        if only and label not in only:
+            continue
+        url = _url(name, kwargs, query)
+        walls, sqls, counts, status = [], [], [], None
+        for _ in range(repeat):
+            if not warm:
+                for backend in caches.all():
+                    backend.clear()
+            # Counts the queries of every thread serving the request (see inventory.parallel)
+            timer, token = timing.start()
+            try:
+                started = time.perf_counter()
+                response = client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                walls.append((time.perf_counter() - started) * 1000)
+            finally:
+                timing.finish(token)
+            sqls.append(timer.sql * 1000)
+            counts.append(timer.queries)
+            status = response.status_code
+        timings.append(Timing(
+            label, status, round(statistics.median(walls), 2), max(counts), round(statistics.median(sqls), 2),
+        ))
+    return timings
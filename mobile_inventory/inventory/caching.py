@@ -0,0 +1,183 @@
+"""
+Two-tier page cache.
+
+``TwoTierCache`` is a ``FileBasedCache`` (shared by every worker on the host)
+with a small per-process LRU in front of it, so hot entries skip the disk
+read and unpickle. The local tier is never invalidated by other processes,
+so it is only used for the ``pages`` cache, whose keys embed the data
+version of everything they were built from and never need invalidation.
+Mutable entries (counters, version stamps) live in the plain shared
+``default`` cache.
+
+``cached_page`` caches whole GET responses of views that render the same
+HTML for every signed-in user. The key is the URL (path and query string)
+plus the data version of the view's tables (see ``inventory.versions``). The
+signal receivers bump that version on every ORM/admin write, so a write
+makes the next request render afresh. The version is also put on the request
+as ``request.page_version`` for ``{% cache %}`` fragments in the templates.
+Those still help when the whole response can't be reused, e.g. when a flash
+message is shown. Views routed to a read replica (``reads_from_replica``)
+are not cached while a replica is configured: the version follows the
+primary, so a page rendered from a lagging replica would be stored under a
+version it doesn't reflect yet.
+
+Lookups are counted per tier in the ``inventory_cache_requests_total`` metric.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.http import HttpResponse
+from django.utils import timezone
+
+from . import items, metrics, routers, versions
+
+PAGES = 'pages'
+
+_MISSING = object()
+
+
+class TwoTierCache(FileBasedCache):
+    """
+    ``FileBasedCache`` with an in-process LRU of ``LOCAL_MAX_ENTRIES`` entries
+    (default 256), each kept locally for at most ``LOCAL_TIMEOUT`` seconds
+    (default 300). ``STATS_NAME`` labels its metrics.
+    """
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        options = params.get('OPTIONS', {})
+        self._local_max = int(options.get('LOCAL_MAX_ENTRIES', 256))
+        self._local_timeout = int(options.get('LOCAL_TIMEOUT', 300))
+        self._stats_name = options.get('STATS_NAME', 'two_tier')
+        self._local = OrderedDict()
+        self._local_lock = threading.Lock()
+
+    def _local_get(self, key):
+        with self._local_lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return _MISSING
+            expires, data = entry
+            if expires <= time.monotonic():
+                del self._local[key]
+                return _MISSING
+            self._local.move_to_end(key)
+        # Pickled so callers can't mutate each other's copies, as with LocMemCache
+        return pickle.loads(data)
+
+    def _local_set(self, key, value, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        lifetime = self._local_timeout
+        if timeout is not None:
+            lifetime = min(lifetime, timeout - time.time())
+        if lifetime <= 0:
+            self._local_delete(key)
+            return
+        data = pickle.dumps(value, self.pickle_protocol)
+        with self._local_lock:
+            self._local[key] = (time.monotonic() + lifetime, data)
+            self._local.move_to_end(key)
+            while len(self._local) > self._local_max:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, key):
+        with self._local_lock:
+            self._local.pop(key, None)
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version)
+        value = self._local_get(local_key)
+        if value is not _MISSING:
+            metrics.cache_lookup(f'{self._stats_name}_local', 1)
+            return value
+        metrics.cache_lookup(f'{self._stats_name}_local', 0, 1)
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            metrics.cache_lookup(f'{self._stats_name}_shared', 0, 1)
+            return default
+        metrics.cache_lookup(f'{self._stats_name}_shared', 1)
+        self._local_set(local_key, value, self._local_timeout)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        super().set(key, value, timeout, version)
+        self._local_set(self.make_and_validate_key(key, version), value, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._local_delete(self.make_and_validate_key(key, version))
+        return super().touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        self._local_delete(self.make_and_validate_key(key, version))
+        return super().delete(key, version)
+
+    def has_key(self, key, version=None):
+        if self._local_get(self.make_and_validate_key(key, version)) is not _MISSING:
+            return True
+        return super().has_key(key, version)
+
+    def clear(self):
+        with self._local_lock:
+            self._local.clear()
+        super().clear()
+
+
+def page_cache():
+    return caches[PAGES]
+
+
+def _timeout():
+    return getattr(settings, 'PAGE_CACHE_TTL', 600)
+
+
+def cached_page(*models, labels=False, dated=False):
+    """
+    Cache the view's GET responses under its URL and the data version of
+    ``models``. ``labels`` adds the item label version; ``dated`` adds today's
+    date for pages that depend on it (as ``api.versioned``). Use it below
+    ``login_required``: the cached HTML is shared by all signed-in users. Put
+    it above ``reads_from_replica`` so it can tell the view is replica-routed.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if getattr(view, 'reads_from_replica', False) and routers.replica_alias():
+                return view(request, *args, **kwargs)
+
+            extra = [request.path, request.GET.urlencode()]
+            if labels:
+                extra.append(items.current_version())
+            if dated:
+                extra.append(timezone.localdate().isoformat())
+            request.page_version = versions.data_version(*models, extra=extra)
+            request.page_cache_ttl = _timeout()
+
+            # Pending flash messages are rendered into (and consumed by) the page
+            if request.method != 'GET' or len(get_messages(request)):
+                return view(request, *args, **kwargs)
+
+            cache = page_cache()
+            key = f'page:{view.__module__}.{view.__qualname__}:{request.page_version}'
+            cached = cache.get(key)
+            if cached is not None:
+                metrics.cache_lookup('page_responses', 1)
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+            metrics.cache_lookup('page_responses', 0, 1)
+
+            response = view(request, *args, **kwargs)
+            # A page holding a CSRF token belongs to one session
+            cacheable = not (response.streaming or response.cookies or request.META.get('CSRF_COOKIE_NEEDS_UPDATE'))
+            if response.status_code == 200 and cacheable:
+                cache.set(key, (response.content, response['Content-Type']), request.page_cache_ttl)
+            return response
+        return wrapper
+    return decorator
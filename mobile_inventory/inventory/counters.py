@@ -0,0 +1,96 @@
+"""
+Cached dashboard counters.
+
+The dashboard shows five row counts on every load, and every page shows the
+unread notification badge. They are served from the shared ``default`` cache
+(one file cache for all workers on the host, see ``CACHES``), invalidated by
+the signal receivers in ``inventory.signals`` when rows are written through
+the ORM/admin, and expire after ``DASHBOARD_COUNTER_TTL`` seconds to pick up
+writes made outside Django. Entries are dropped and recounted rather than
+incremented: the file cache's ``incr`` is a get followed by a set, so
+concurrent writers would lose updates.
+With ``DASHBOARD_ESTIMATE_LARGE_TABLES`` enabled, the log tables use the
+PostgreSQL planner estimate instead of ``COUNT(*)``.
+``adashboard_counts`` is the async variant, counting the missing ones
+concurrently (see ``inventory.parallel``).
+"""
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics, parallel
+from .models import Expenses, HistoryLog, Notifications, ProductInventory, RawMaterialInventory, Sales
+from .pagination import approximate_row_count
+
+CACHE_PREFIX = 'dashboard:count:'
+
+COUNTERS = {
+    'product_count': lambda: ProductInventory.objects.filter(product__is_archived=False).count(),
+    'raw_count': lambda: RawMaterialInventory.objects.filter(material__is_archived=False).count(),
+    'sales_count': lambda: Sales.objects.count(),
+    'expense_count': lambda: Expenses.objects.count(),
+    'log_count': lambda: HistoryLog.objects.count(),
+    'unread_notifications': lambda: Notifications.objects.filter(is_read=False).count(),
+}
+
+# Append-only log tables whose exact count may be replaced by a planner estimate
+ESTIMATABLE = {
+    'log_count': HistoryLog,
+}
+
+
+def _ttl():
+    return getattr(settings, 'DASHBOARD_COUNTER_TTL', 300)
+
+
+def _compute(name):
+    if name in ESTIMATABLE and getattr(settings, 'DASHBOARD_ESTIMATE_LARGE_TABLES', False):
+        estimate = approximate_row_count(ESTIMATABLE[name])
+        if estimate is not None:
+            return estimate
+    return COUNTERS[name]()
+
+
+def dashboard_counts():
+    """Return all dashboard counters, counting only the ones missing from the cache."""
+    keys = {name: CACHE_PREFIX + name for name in COUNTERS}
+    cached = cache.get_many(keys.values())
+    counts = {}
+    missing = {}
+    for name, key in keys.items():
+        if key in cached:
+            counts[name] = cached[key]
+        else:
+            counts[name] = missing[key] = _compute(name)
+    metrics.cache_lookup('dashboard_counters', len(counts) - len(missing), len(missing))
+    if missing:
+        cache.set_many(missing, _ttl())
+    return counts
+
+
+async def adashboard_counts():
+    """``dashboard_counts`` for async views, counting the missing counters concurrently."""
+    keys = {name: CACHE_PREFIX + name for name in COUNTERS}
+    cached = await cache.aget_many(keys.values())
+    stale = [name for name, key in keys.items() if key not in cached]
+    counted = dict(zip(stale, await parallel.gather(*(partial(_compute, name) for name in stale))))
+    metrics.cache_lookup('dashboard_counters', len(keys) - len(stale), len(stale))
+    if counted:
+        await cache.aset_many({keys[name]: value for name, value in counted.items()}, _ttl())
+    return {name: counted[name] if name in counted else cached[key] for name, key in keys.items()}
+
+
+def get(name):
+    """Return one counter, counting it only when it is missing from the cache."""
+    key = CACHE_PREFIX + name
+    value = cache.get(key)
+    metrics.cache_lookup('dashboard_counters', int(value is not None), int(value is None))
+    if value is None:
+        value = _compute(name)
+        cache.set(key, value, _ttl())
+    return value
+
+
+def invalidate(*names):
+    cache.delete_many([CACHE_PREFIX + name for name in names])
@@ -0,0 +1,122 @@
+"""
+Batches expiring within a horizon.
+
+``expiring`` groups the product and raw material batches whose
+``expiration_date`` falls in [today, today + days] and that still hold
+stock, by item. For each item it returns the batch count, the quantity at
+risk (what ``inventory.allocation`` has not yet allocated to withdrawals),
+the earliest expiry and the value at risk.
+Products are priced at their ``UnitPrices`` price and raw materials at
+``price_per_unit``, as in the loss figures of the monthly report. The
+``(expiration_date, item)`` indexes from migration 0007 keep this a range
+scan however much batch history accumulates.
+
+``summarize`` stores the day's totals in ``ExpirySummary`` for the dashboard.
+It is run nightly by the ``summarize_expiry`` command.
+"""
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Min, Sum
+from django.utils import timezone
+
+from . import allocation, items
+from .models import ExpirySummary, ProductBatches, RawMaterialBatches
+
+ExpiringItem = namedtuple(
+    'ExpiringItem',
+    ['item_type', 'item_id', 'label', 'batches', 'quantity', 'value', 'earliest_expiry'],
+)
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+# (batch model, item type, item foreign key, price lookup)
+SOURCES = (
+    (ProductBatches, items.PRODUCT, 'product', 'product__unit_price__unit_price'),
+    (RawMaterialBatches, items.RAW_MATERIAL, 'material', 'material__price_per_unit'),
+)
+
+
+def horizon_days(value=None):
+    """Parse a ``days`` parameter, falling back to ``EXPIRY_HORIZON_DAYS`` (1-365)."""
+    default = getattr(settings, 'EXPIRY_HORIZON_DAYS', 30)
+    try:
+        days = int(value) if value not in (None, '') else default
+    except (TypeError, ValueError):
+        days = default
+    return min(max(days, 1), 365)
+
+
+def _grouped(model, item_type, item_field, price, start, end):
+    return (
+        model.objects.filter(
+            expiration_date__gte=start,
+            expiration_date__lte=end,
+            **{f"{item_field}__is_archived": False},
+        )
+        .alias(remaining=allocation.remaining_quantity(item_type))
+        .filter(remaining__gt=0)
+        .values(f"{item_field}_id")
+        .annotate(
+            batch_count=Count('id'),
+            total_quantity=Sum('remaining'),
+            total_value=Sum(ExpressionWrapper(F('remaining') * F(price), output_field=MONEY)),
+            earliest_expiry=Min('expiration_date'),
+        )
+        .order_by()
+    )
+
+
+def expiring(days=None, today=None):
+    """``ExpiringItem`` per product/material with batches expiring within ``days``, soonest first."""
+    today = today or timezone.localdate()
+    end = today + timedelta(days=horizon_days(days))
+    rows = []
+    for model, item_type, item_field, price in SOURCES:
+        for row in _grouped(model, item_type, item_field, price, today, end):
+            rows.append((item_type, row[f"{item_field}_id"], row))
+
+    resolved = items.resolve_items((item_type, item_id) for item_type, item_id, _row in rows)
+    result = []
+    for item_type, item_id, row in rows:
+        item = resolved.get((item_type, item_id))
+        result.append(ExpiringItem(
+            item_type,
+            item_id,
+            item.label if item else items.missing_label(item_type, item_id),
+            row['batch_count'],
+            row['total_quantity'] or Decimal('0'),
+            row['total_value'] or Decimal('0'),
+            row['earliest_expiry'],
+        ))
+    return sorted(result, key=lambda entry: (entry.earliest_expiry, entry.label))
+
+
+def summarize(days=None, today=None):
+    """Store (or replace) today's expiry totals and return the ``ExpirySummary`` row."""
+    today = today or timezone.localdate()
+    days = horizon_days(days)
+    totals = {
+        items.PRODUCT: [0, Decimal('0')],
+        items.RAW_MATERIAL: [0, Decimal('0')],
+    }
+    for entry in expiring(days, today):
+        totals[entry.item_type][0] += entry.batches
+        totals[entry.item_type][1] += entry.value
+    summary, _created = ExpirySummary.objects.update_or_create(
+        as_of=today,
+        defaults={
+            'horizon_days': days,
+            'product_batches': totals[items.PRODUCT][0],
+            'product_value': totals[items.PRODUCT][1],
+            'raw_batches': totals[items.RAW_MATERIAL][0],
+            'raw_value': totals[items.RAW_MATERIAL][1],
+        },
+    )
+    return summary
+
+
+def latest_summary():
+    return ExpirySummary.objects.order_by('-as_of').first()
@@ -0,0 +1,129 @@
+"""
+CSV export of the ledger tables.
+
+Rows are read with ``QuerySet.iterator(chunk_size=...)``, which uses a
+server-side cursor on PostgreSQL, and item names are resolved once per
+chunk. Memory use therefore stays flat however long the date range is.
+``iter_csv`` yields encoded lines as they are produced, so a
+``StreamingHttpResponse`` starts sending at once and keeps the connection
+busy until the last row. Text cells that a spreadsheet would evaluate as a
+formula are prefixed with ``'``.
+"""
+import csv
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from . import items
+from .models import Expenses, Sales, StockChanges, Withdrawals
+
+CHUNK_SIZE = 2000
+
+Ledger = namedtuple('Ledger', ['model', 'fields', 'header', 'has_items'])
+
+# ``fields`` feed values_list(); item ledgers get an "Item Name" column after item_id
+LEDGERS = {
+    'stock_changes': Ledger(
+        StockChanges,
+        ['id', 'date', 'item_type', 'item_id', 'quantity_change', 'category', 'created_by_admin__username'],
+        ['ID', 'Date', 'Item Type', 'Item ID', 'Item Name', 'Quantity Change', 'Category', 'Created By'],
+        True,
+    ),
+    'withdrawals': Ledger(
+        Withdrawals,
+        ['id', 'date', 'item_type', 'item_id', 'quantity', 'custom_price', 'reason', 'is_archived',
+         'created_by_admin__username'],
+        ['ID', 'Date', 'Item Type', 'Item ID', 'Item Name', 'Quantity', 'Custom Price', 'Reason', 'Archived',
+         'Created By'],
+        True,
+    ),
+    'sales': Ledger(
+        Sales,
+        ['id', 'date', 'category', 'amount', 'description', 'created_by_admin__username'],
+        ['ID', 'Date', 'Category', 'Amount', 'Description', 'Created By'],
+        False,
+    ),
+    'expenses': Ledger(
+        Expenses,
+        ['id', 'date', 'category', 'amount', 'description', 'created_by_admin__username'],
+        ['ID', 'Date', 'Category', 'Amount', 'Description', 'Created By'],
+        False,
+    ),
+}
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD filter value; raises ValueError when malformed."""
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def ledger_queryset(name, start=None, end=None):
+    """Rows of ledger ``name`` dated within [start, end] (local dates, inclusive)."""
+    ledger = LEDGERS[name]
+    queryset = ledger.model.objects.all()
+    if start:
+        queryset = queryset.filter(date__gte=timezone.make_aware(datetime.combine(start, time.min)))
+    if end:
+        queryset = queryset.filter(date__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)))
+    return queryset.order_by('date', 'id').values_list(*ledger.fields)
+
+
+# Text starting with these is read as a formula by spreadsheet apps
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _format(value):
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return '' if value is None else value
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for row in iterable:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_rows(name, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """Yield the header and then one list per ledger row, ready for csv.writer."""
+    ledger = LEDGERS[name]
+    yield ledger.header
+    rows = ledger_queryset(name, start, end).iterator(chunk_size=chunk_size)
+    for chunk in _chunks(rows, chunk_size):
+        resolved = items.resolve_items((row[2], row[3]) for row in chunk) if ledger.has_items else {}
+        for row in chunk:
+            values = [_format(value) for value in row]
+            if ledger.has_items:
+                item = items.lookup(resolved, row[2], row[3])
+                values.insert(4, _format(item.label if item else items.missing_label(row[2], row[3])))
+            yield values
+
+
+class _Echo:
+    """File-like object whose write() hands the formatted line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(name, start=None, end=None, chunk_size=CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+    for values in iter_rows(name, start, end, chunk_size):
+        yield writer.writerow(values)
+
+
+def filename(name, start=None, end=None):
+    parts = [name]
+    if start:
+        parts.append(f"from-{start:%Y%m%d}")
+    if end:
+        parts.append(f"to-{end:%Y%m%d}")
+    return "_".join(parts) + ".csv"
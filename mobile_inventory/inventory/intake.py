@@ -0,0 +1,221 @@
+"""
+Bulk intake of product and raw material batches.
+
+``receive`` validates a list of batch lines, then in one transaction
+bulk-inserts the batch rows and one ``StockChanges`` entry per line, and
+adds the summed quantity per item to the inventory table with a single
+``UPDATE ... SET total_stock = total_stock + CASE ...``. Items without an
+inventory row get one first (threshold 0).
+
+Bulk writes skip model signals, so the data-version stamps, dashboard
+counters and low-stock notifications those receivers maintain are refreshed
+here once the transaction commits.
+"""
+import csv
+import io
+from collections import defaultdict, namedtuple
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from . import counters, items, notifications, versions
+from .models import (
+    ProductBatches,
+    ProductInventory,
+    Products,
+    RawMaterialBatches,
+    RawMaterialInventory,
+    RawMaterials,
+    StockChanges,
+)
+
+INTAKE_CATEGORY = 'Batch Intake'
+MAX_LINES = 20000
+BATCH_SIZE = 1000
+
+CSV_COLUMNS = [
+    'item_type', 'item_id', 'quantity', 'batch_date',
+    'manufactured_date', 'received_date', 'expiration_date',
+]
+
+IntakeResult = namedtuple('IntakeResult', ['batches', 'items', 'created_inventory'])
+
+
+class IntakeError(ValueError):
+    """Raised with every problem found in the submitted lines."""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+def parse_csv(text):
+    """Read intake lines from CSV text with a header row (see ``CSV_COLUMNS``)."""
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or not {'item_type', 'item_id', 'quantity'} <= set(reader.fieldnames):
+        raise IntakeError(["CSV needs at least item_type, item_id and quantity columns"])
+    return [{key: (value or '').strip() for key, value in row.items() if key} for row in reader]
+
+
+def _date(value, required, errors, label):
+    if value in (None, ''):
+        if required:
+            errors.append(f"{label} is required")
+        return None
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(str(value), "%Y-%m-%d").date()
+    except ValueError:
+        errors.append(f"{label} must be YYYY-MM-DD")
+        return None
+
+
+def _clean(lines):
+    """Validate raw lines into (item_type, item_id, quantity, dates) tuples."""
+    if not isinstance(lines, list) or not lines:
+        raise IntakeError(["No batch lines given"])
+    if len(lines) > MAX_LINES:
+        raise IntakeError([f"At most {MAX_LINES} lines per intake"])
+
+    today = timezone.localdate()
+    cleaned, errors = [], []
+    for number, line in enumerate(lines, start=1):
+        problems = []
+        if not isinstance(line, dict):
+            errors.append(f"Line {number}: expected an object")
+            continue
+        item_type = items.normalize_item_type(line.get('item_type'))
+        if item_type is None:
+            problems.append("item_type must be product or raw_material")
+        try:
+            item_id = int(line.get('item_id'))
+        except (TypeError, ValueError):
+            item_id = None
+            problems.append("item_id must be an integer")
+        try:
+            quantity = Decimal(str(line.get('quantity')))
+            if not quantity.is_finite() or quantity <= 0:
+                raise InvalidOperation
+            if item_type == items.PRODUCT and quantity != quantity.to_integral_value():
+                problems.append("product quantities must be whole numbers")
+        except InvalidOperation:
+            quantity = None
+            problems.append("quantity must be a positive number")
+
+        batch_date = _date(line.get('batch_date'), False, problems, "batch_date") or today
+        expiration_date = _date(line.get('expiration_date'), item_type == items.PRODUCT, problems, "expiration_date")
+        if item_type == items.PRODUCT:
+            made_date = _date(line.get('manufactured_date'), True, problems, "manufactured_date")
+        else:
+            made_date = _date(line.get('received_date'), False, problems, "received_date") or batch_date
+
+        if problems:
+            errors.extend(f"Line {number}: {problem}" for problem in problems)
+        else:
+            cleaned.append((item_type, item_id, quantity, batch_date, made_date, expiration_date))
+    if errors:
+        raise IntakeError(errors)
+    return cleaned
+
+
+def _check_items(cleaned):
+    wanted = defaultdict(set)
+    for item_type, item_id, *_rest in cleaned:
+        wanted[item_type].add(item_id)
+    active = {
+        items.PRODUCT: set(
+            Products.objects.filter(id__in=wanted[items.PRODUCT], is_archived=False).values_list('id', flat=True)
+        ) if wanted[items.PRODUCT] else set(),
+        items.RAW_MATERIAL: set(
+            RawMaterials.objects.filter(id__in=wanted[items.RAW_MATERIAL], is_archived=False)
+            .values_list('id', flat=True)
+        ) if wanted[items.RAW_MATERIAL] else set(),
+    }
+    errors = [
+        f"Line {number}: unknown or archived {item_type} {item_id}"
+        for number, (item_type, item_id, *_rest) in enumerate(cleaned, start=1)
+        if item_id not in active[item_type]
+    ]
+    if errors:
+        raise IntakeError(errors)
+
+
+def _apply_deltas(model, threshold_field, deltas):
+    """Add ``deltas`` ({item_id: quantity}) to total_stock; returns inventory rows created."""
+    if not deltas:
+        return 0
+    pk = model._meta.pk.attname
+    existing = set(model.objects.filter(pk__in=deltas).values_list(pk, flat=True))
+    missing = [item_id for item_id in deltas if item_id not in existing]
+    if missing:
+        model.objects.bulk_create(
+            [model(**{pk: item_id, 'total_stock': 0, threshold_field: 0}) for item_id in missing],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+    field = model._meta.get_field('total_stock')
+    amount = DecimalField(max_digits=field.max_digits, decimal_places=field.decimal_places)
+    model.objects.filter(pk__in=deltas).update(
+        total_stock=F('total_stock') + Case(
+            *[When(pk=item_id, then=Value(delta, output_field=amount)) for item_id, delta in deltas.items()],
+            output_field=amount,
+        )
+    )
+    return len(missing)
+
+
+def receive(lines, user):
+    """
+    Record a list of batch lines (dicts, e.g. from JSON or ``parse_csv``) as
+    received by ``user``. Raises ``IntakeError`` without writing anything if
+    any line is invalid.
+    """
+    cleaned = _clean(lines)
+    _check_items(cleaned)
+
+    now = timezone.now()
+    product_batches, raw_batches, changes = [], [], []
+    deltas = {items.PRODUCT: defaultdict(Decimal), items.RAW_MATERIAL: defaultdict(Decimal)}
+    for item_type, item_id, quantity, batch_date, made_date, expiration_date in cleaned:
+        if item_type == items.PRODUCT:
+            product_batches.append(ProductBatches(
+                batch_date=batch_date, product_id=item_id, quantity=int(quantity),
+                manufactured_date=made_date, expiration_date=expiration_date, created_by_admin_id=user.pk,
+            ))
+        else:
+            raw_batches.append(RawMaterialBatches(
+                batch_date=batch_date, material_id=item_id, quantity=quantity,
+                received_date=made_date, expiration_date=expiration_date, created_by_admin_id=user.pk,
+            ))
+        changes.append(StockChanges(
+            item_type=item_type, item_id=item_id, quantity_change=quantity,
+            category=INTAKE_CATEGORY, date=now, created_by_admin_id=user.pk,
+        ))
+        deltas[item_type][item_id] += quantity
+
+    with transaction.atomic():
+        ProductBatches.objects.bulk_create(product_batches, batch_size=BATCH_SIZE)
+        RawMaterialBatches.objects.bulk_create(raw_batches, batch_size=BATCH_SIZE)
+        StockChanges.objects.bulk_create(changes, batch_size=BATCH_SIZE)
+        created = _apply_deltas(ProductInventory, 'restock_threshold', deltas[items.PRODUCT])
+        created += _apply_deltas(RawMaterialInventory, 'reorder_threshold', deltas[items.RAW_MATERIAL])
+        transaction.on_commit(lambda: _after_commit(bool(created), deltas))
+
+    return IntakeResult(
+        batches=len(cleaned),
+        items=len(deltas[items.PRODUCT]) + len(deltas[items.RAW_MATERIAL]),
+        created_inventory=created,
+    )
+
+
+def _after_commit(created_inventory, deltas):
+    for model in (ProductBatches, RawMaterialBatches, StockChanges, ProductInventory, RawMaterialInventory):
+        versions.bump(model)
+    if created_inventory:
+        counters.invalidate('product_count', 'raw_count')
+    # Received items can still be at or below their threshold
+    notifications.generate(product_ids=list(deltas[items.PRODUCT]), material_ids=list(deltas[items.RAW_MATERIAL]))
@@ -0,0 +1,182 @@
+"""
+Shared resolver for loose ``(item_type, item_id)`` references.
+
+``StockChanges``, ``Withdrawals`` and ``Notifications`` point at products and
+raw materials through an ``item_type``/``item_id`` pair whose casing differs
+between tables ('product' vs 'PRODUCT'). ``resolve_items`` normalizes the
+type and resolves a batch of references with at most one query per type.
+
+Resolved items are kept in a per-process cache tagged with a version stamp
+stored in the shared Django cache. ``bump_version`` (called from
+``inventory.signals`` when products, materials or their lookup tables change)
+makes every process drop its copy; ``ITEM_CACHE_TTL`` bounds staleness for
+writes made outside Django.
+"""
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+
+from . import metrics
+from .models import Products, RawMaterials
+
+PRODUCT = 'product'
+RAW_MATERIAL = 'raw_material'
+
+_TYPE_ALIASES = {
+    'product': PRODUCT,
+    'products': PRODUCT,
+    'raw_material': RAW_MATERIAL,
+    'raw_materials': RAW_MATERIAL,
+    'raw material': RAW_MATERIAL,
+    'rawmaterial': RAW_MATERIAL,
+}
+
+VERSION_KEY = 'items:version'
+MAX_CACHED_ITEMS = 5000
+
+ItemInfo = namedtuple('ItemInfo', ['item_type', 'item_id', 'name', 'detail', 'label', 'price', 'is_archived'])
+
+_lock = threading.Lock()
+_cache = {'version': None, 'loaded_at': 0.0, 'items': {}}
+
+
+def normalize_item_type(value):
+    """Map any stored spelling of an item type to PRODUCT/RAW_MATERIAL (or None)."""
+    return _TYPE_ALIASES.get((value or '').strip().lower())
+
+
+def missing_label(item_type, item_id):
+    item_type = normalize_item_type(item_type)
+    if item_type == PRODUCT:
+        return f"Product ID {item_id} (Deleted)"
+    if item_type == RAW_MATERIAL:
+        return f"Raw Material ID {item_id} (Deleted)"
+    return "Unknown Item"
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def bump_version():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def _load_products(ids):
+    items = {}
+    queryset = (
+        Products.objects.select_related('product_type', 'variant', 'size', 'size_unit', 'unit_price')
+        .filter(id__in=ids)
+    )
+    for product in queryset:
+        size_label = getattr(product.size, 'size_label', 'N/A')
+        unit_name = getattr(product.size_unit, 'unit_name', '')
+        name = f"{product.product_type.name} - {product.variant.name}"
+        detail = f"{size_label} {unit_name}"
+        items[(PRODUCT, product.id)] = ItemInfo(
+            PRODUCT, product.id, name, detail, f"{name} ({detail})",
+            product.unit_price.unit_price, product.is_archived,
+        )
+    return items
+
+
+def _load_raw_materials(ids):
+    items = {}
+    for material in RawMaterials.objects.select_related('unit').filter(id__in=ids):
+        unit_name = getattr(material.unit, 'unit_name', '')
+        detail = f"{material.size} {unit_name}"
+        items[(RAW_MATERIAL, material.id)] = ItemInfo(
+            RAW_MATERIAL, material.id, material.name, detail, f"{material.name} ({detail})",
+            material.price_per_unit, material.is_archived,
+        )
+    return items
+
+
+def resolve_items(refs):
+    """
+    Resolve ``(item_type, item_id)`` pairs to ``ItemInfo`` keyed by the
+    normalized pair. Unknown types and deleted items are left out.
+    """
+    wanted = set()
+    for item_type, item_id in refs:
+        normalized = normalize_item_type(item_type)
+        if normalized and item_id is not None:
+            wanted.add((normalized, item_id))
+    if not wanted:
+        return {}
+
+    version = current_version()
+    ttl = getattr(settings, 'ITEM_CACHE_TTL', 300)
+    with _lock:
+        expired = time.monotonic() - _cache['loaded_at'] > ttl
+        if _cache['version'] != version or expired or len(_cache['items']) > MAX_CACHED_ITEMS:
+            _cache.update(version=version, loaded_at=time.monotonic(), items={})
+        cached = _cache['items']
+        resolved = {ref: cached[ref] for ref in wanted if ref in cached}
+
+    missing = wanted - resolved.keys()
+    metrics.cache_lookup('item_labels', len(resolved), len(missing))
+    if missing:
+        loaded = {}
+        product_ids = {item_id for item_type, item_id in missing if item_type == PRODUCT}
+        raw_ids = {item_id for item_type, item_id in missing if item_type == RAW_MATERIAL}
+        if product_ids:
+            loaded.update(_load_products(product_ids))
+        if raw_ids:
+            loaded.update(_load_raw_materials(raw_ids))
+        resolved.update(loaded)
+        with _lock:
+            if _cache['version'] == version:
+                _cache['items'].update(loaded)
+    return resolved
+
+
+def lookup(resolved, item_type, item_id):
+    """Fetch one reference from a ``resolve_items`` result."""
+    return resolved.get((normalize_item_type(item_type), item_id))
+
+
+def _product_label():
+    return Concat(
+        'product_type__name', Value(' - '), 'variant__name',
+        Value(' ('), 'size__size_label', Value(' '), 'size_unit__unit_name', Value(')'),
+        output_field=CharField(),
+    )
+
+
+def _raw_material_label():
+    return Concat(
+        'name', Value(' ('), Cast('size', CharField()), Value(' '), 'unit__unit_name', Value(')'),
+        output_field=CharField(),
+    )
+
+
+def matching_item_ids(term):
+    """
+    ``{item type: [id, ...]}`` of the products and raw materials whose label
+    (as ``ItemInfo.label``) contains ``term``, ignoring case. These tables
+    are small, so ledgers can be searched by label through indexed id lists.
+    """
+    return {
+        PRODUCT: list(
+            Products.objects.alias(label=_product_label())
+            .filter(label__icontains=term)
+            .values_list('id', flat=True)
+        ),
+        RAW_MATERIAL: list(
+            RawMaterials.objects.alias(label=_raw_material_label())
+            .filter(label__icontains=term)
+            .values_list('id', flat=True)
+        ),
+    }
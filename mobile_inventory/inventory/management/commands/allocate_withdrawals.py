@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import allocation
+
+
+class Command(BaseCommand):
+    help = "Allocate withdrawals that have no batch allocation yet (FEFO), oldest first, in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help="Withdrawals allocated per transaction")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be positive")
+
+        last_id = 0
+        withdrawals = rows = 0
+        while True:
+            chunk = list(allocation.unallocated_withdrawals().filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            rows += allocation.allocate(chunk)
+            withdrawals += len(chunk)
+            last_id = chunk[-1].id
+            self.stdout.write(f"Allocated up to withdrawal {last_id}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {withdrawals} withdrawal(s) into {rows} allocation row(s)"
+        ))
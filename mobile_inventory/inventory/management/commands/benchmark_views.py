@@ -0,0 +1,92 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inventory import benchmark
+
+
+def parse_volume(value):
+    name, _sep, count = value.partition('=')
+    if name not in benchmark.VOLUMES or not count.isdigit():
+        raise CommandError(f"Invalid volume '{value}', expected NAME=COUNT with NAME one of: "
+                           f"{', '.join(benchmark.VOLUMES)}")
+    return name, int(count)
+
+
+class Command(BaseCommand):
+    help = "Seed synthetic data into a throwaway test database and time every view against it."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1, help="Multiply the base volumes (e.g. 10, 100)")
+        parser.add_argument('--volume', action='append', default=[], metavar='NAME=COUNT',
+                            help="Override one volume (repeatable)")
+        parser.add_argument('--days', type=int, default=730, help="Spread seeded rows over this many days")
+        parser.add_argument('--repeat', type=int, default=3, help="Requests per view (median is reported)")
+        parser.add_argument('--warm', action='store_true', help="Keep the cache between requests")
+        parser.add_argument('--view', action='append', dest='views', default=[],
+                            help="Only time this view (repeatable)")
+        parser.add_argument('--seed', type=int, default=1, help="Random seed for the synthetic data")
+        parser.add_argument('--json', dest='json_path', help="Also write the results as JSON to this file ('-' for stdout)")
+        parser.add_argument('--compare', help="JSON file from an earlier run to compare against")
+
+    def handle(self, *args, **options):
+        if options['scale'] <= 0:
+            raise CommandError("--scale must be positive")
+        if options['repeat'] < 1 or options['days'] < 1:
+            raise CommandError("--repeat and --days must be positive")
+        known = {view[0] for view in benchmark.VIEWS}
+        unknown = set(options['views']) - known
+        if unknown:
+            raise CommandError(f"Unknown view(s): {', '.join(sorted(unknown))}")
+        baseline = self._load_baseline(options['compare']) if options['compare'] else {}
+
+        counts = benchmark.volumes(options['scale'], dict(parse_volume(v) for v in options['volume']))
+        verbosity = max(options['verbosity'] - 1, 0)
+        with benchmark.throwaway_database(verbosity) as name:
+            self.stderr.write(f"Seeding {name}: " + ', '.join(f"{k}={v}" for k, v in counts.items()))
+            started = timezone.now()
+            user = benchmark.seed(counts, days=options['days'], seed_value=options['seed'])
+            self.stderr.write(f"Seeded in {(timezone.now() - started).total_seconds():.1f}s")
+            timings = benchmark.run(user, options['repeat'], options['warm'], set(options['views']))
+
+        # Keep stdout clean when the JSON goes there
+        self._print_table(timings, baseline, self.stderr if options['json_path'] == '-' else self.stdout)
+        if options['json_path']:
+            payload = json.dumps({
+                'scale': options['scale'],
+                'volumes': counts,
+                'repeat': options['repeat'],
+                'warm': options['warm'],
+                'results': [timing._asdict() for timing in timings],
+            }, indent=2)
+            if options['json_path'] == '-':
+                self.stdout.write(payload)
+            else:
+                with open(options['json_path'], 'w', encoding='utf-8') as handle:
+                    handle.write(payload + '\n')
+                self.stderr.write(self.style.SUCCESS(f"Wrote {options['json_path']}"))
+
+    def _load_baseline(self, path):
+        try:
+            with open(path, encoding='utf-8') as handle:
+                results = json.load(handle)['results']
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f"Cannot read baseline '{path}': {exc}")
+        return {result['view']: result for result in results}
+
+    def _print_table(self, timings, baseline, out):
+        width = max(len(timing.view) for timing in timings) if timings else 4
+        header = f"{'view':<{width}}  status   wall ms  queries    sql ms"
+        if baseline:
+            header += "   wall Δ  queries Δ"
+        out.write(header)
+        out.write('-' * len(header))
+        for timing in timings:
+            line = (f"{timing.view:<{width}}  {timing.status:>6}  {timing.wall_ms:>8.1f}"
+                    f"  {timing.queries:>7}  {timing.sql_ms:>8.1f}")
+            before = baseline.get(timing.view)
+            if before:
+                ratio = timing.wall_ms / before['wall_ms'] if before['wall_ms'] else 0
+                line += f"  {ratio:>6.2f}x  {timing.queries - before['queries']:>+9}"
+            out.write(line)
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import exports
+
+
+def parse_date(value):
+    try:
+        return exports.parse_date(value)
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Export a ledger (stock_changes, withdrawals, sales, expenses) as CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('ledger', choices=sorted(exports.LEDGERS))
+        parser.add_argument('--from', dest='start', help="First day to export (YYYY-MM-DD)")
+        parser.add_argument('--to', dest='end', help="Last day to export (YYYY-MM-DD)")
+        parser.add_argument('--output', '-o', help="Write to this file instead of stdout")
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE,
+                            help="Rows fetched per database round trip")
+
+    def handle(self, *args, **options):
+        start = parse_date(options['start']) if options['start'] else None
+        end = parse_date(options['end']) if options['end'] else None
+        if start and end and start > end:
+            raise CommandError("--from must not be after --to")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive")
+
+        lines = exports.iter_csv(options['ledger'], start, end, options['chunk_size'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        count = -1  # header line
+        with open(options['output'], 'w', newline='', encoding='utf-8') as handle:
+            for line in lines:
+                handle.write(line)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f"Exported {count} row(s) to {options['output']}"))
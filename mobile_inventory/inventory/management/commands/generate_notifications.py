@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from inventory import notifications
+
+
+class Command(BaseCommand):
+    help = "Create low-stock notifications for items at or below their restock/reorder threshold."
+
+    def handle(self, *args, **options):
+        created = notifications.generate()
+        self.stdout.write(self.style.SUCCESS(f"Created {created} low-stock notification(s)"))
@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import intake
+from inventory.models import AuthUser
+
+
+class Command(BaseCommand):
+    help = "Receive product/raw material batches from a CSV or JSON file in one transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file with a header row, or a JSON list of batch objects")
+        parser.add_argument('--user', required=True, help="Username recorded as created_by_admin")
+        parser.add_argument('--format', choices=['csv', 'json'],
+                            help="Input format (default: from the file extension)")
+
+    def handle(self, *args, **options):
+        try:
+            user = AuthUser.objects.get(username=options['user'])
+        except AuthUser.DoesNotExist:
+            raise CommandError(f"Unknown user '{options['user']}'")
+
+        path = options['path']
+        file_format = options['format'] or ('json' if path.lower().endswith('.json') else 'csv')
+        try:
+            with open(path, encoding='utf-8-sig') as handle:
+                text = handle.read()
+        except OSError as exc:
+            raise CommandError(f"Cannot read {path}: {exc}")
+
+        try:
+            if file_format == 'json':
+                payload = json.loads(text)
+                lines = payload.get('batches') if isinstance(payload, dict) else payload
+            else:
+                lines = intake.parse_csv(text)
+            result = intake.receive(lines, user)
+        except intake.IntakeError as exc:
+            for error in exc.errors:
+                self.stderr.write(error)
+            raise CommandError(f"Nothing was received ({len(exc.errors)} problem(s))")
+        except ValueError as exc:
+            raise CommandError(f"Cannot parse {path}: {exc}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Received {result.batches} batch(es) for {result.items} item(s); "
+            f"created {result.created_inventory} inventory row(s)"
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from inventory import session_tracking
+
+
+class Command(BaseCommand):
+    help = "Bulk-delete expired Django sessions and old user session tracker rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-days', type=int, default=30,
+            help="Keep tracker rows (last logout history) this many days past expiry (default: 30)",
+        )
+
+    def handle(self, *args, **options):
+        sessions, tracker_rows = session_tracking.purge_expired(options['keep_days'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {sessions} expired session(s) and {tracker_rows} tracker row(s)"
+        ))
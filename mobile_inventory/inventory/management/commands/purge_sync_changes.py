@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import sync
+
+
+class Command(BaseCommand):
+    help = "Delete old offline-sync change log entries; clients holding older tokens do a full resync."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-days', type=int, default=30,
+            help="Keep change entries this many days (default: 30)",
+        )
+
+    def handle(self, *args, **options):
+        if options['keep_days'] < 0:
+            raise CommandError("--keep-days must not be negative")
+        deleted = sync.purge(options['keep_days'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} sync change entr{'y' if deleted == 1 else 'ies'}"))
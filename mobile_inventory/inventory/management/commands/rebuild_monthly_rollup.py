@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import rollups
+
+
+def parse_month(value):
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise CommandError(f"Invalid month '{value}', expected YYYY-MM")
+
+
+class Command(BaseCommand):
+    help = "Rebuild the monthly financial rollup from sales, expenses and loss withdrawals."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help="First month to rebuild (YYYY-MM)")
+        parser.add_argument('--to', dest='end', help="Last month to rebuild (YYYY-MM)")
+
+    def handle(self, *args, **options):
+        start = parse_month(options['start']) if options['start'] else None
+        end = parse_month(options['end']) if options['end'] else None
+        if start and end and start > end:
+            raise CommandError("--from must not be after --to")
+
+        written = rollups.rebuild(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} month(s) of the monthly rollup"))
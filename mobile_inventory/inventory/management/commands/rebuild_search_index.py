@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from inventory import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the SQLite FTS5 search index from products, raw materials, sales and expenses."
+
+    def handle(self, *args, **options):
+        indexed = search.rebuild()
+        if indexed is None:
+            self.stdout.write("No FTS5 search index in this database; nothing to rebuild.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} row(s) for search"))
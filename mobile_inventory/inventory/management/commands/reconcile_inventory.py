@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from inventory import reconciliation
+
+
+class Command(BaseCommand):
+    help = "Compare inventory totals with the StockChanges ledger (incrementally, from checkpoints)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true',
+                            help="Overwrite drifting totals with the ledger balance")
+        parser.add_argument('--full', action='store_true',
+                            help="Ignore checkpoints and rebuild them from the whole ledger")
+
+    def handle(self, *args, **options):
+        result = reconciliation.reconcile(repair=options['repair'], full=options['full'])
+
+        for drift in result.drifts:
+            self.stdout.write(
+                f"{drift.label}: stored {drift.stored}, ledger {drift.ledger} "
+                f"(off by {drift.stored - drift.ledger})"
+            )
+        summary = (
+            f"Checked {result.items_checked} item(s) from {result.rows_scanned} new ledger row(s); "
+            f"{len(result.drifts)} drifting"
+        )
+        if options['repair']:
+            summary += f", {result.repaired} repaired"
+        style = self.style.WARNING if result.drifts and not options['repair'] else self.style.SUCCESS
+        self.stdout.write(style(summary))
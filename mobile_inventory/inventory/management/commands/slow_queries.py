@@ -0,0 +1,58 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import slow_queries
+
+
+class Command(BaseCommand):
+    help = "List the slowest recorded SQL fingerprints by total time (from the slow-query log)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help="Number of fingerprints to show")
+        parser.add_argument('--url-name', help="Only statements recorded for this URL name")
+        parser.add_argument('--since', help="Only statements recorded on or after this day (YYYY-MM-DD)")
+        parser.add_argument('--plans', action='store_true', help="Show the latest captured EXPLAIN plan")
+
+    def handle(self, *args, **options):
+        if options['top'] < 1:
+            raise CommandError("--top must be positive")
+        since = None
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], "%Y-%m-%d").date().isoformat()
+            except ValueError:
+                raise CommandError(f"Invalid date '{options['since']}', expected YYYY-MM-DD")
+
+        groups = {}
+        for entry in slow_queries.read_entries():
+            if options['url_name'] and entry.get('url_name') != options['url_name']:
+                continue
+            if since and entry.get('at', '')[:10] < since:
+                continue
+            group = groups.setdefault(entry['fingerprint'], {
+                'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'url_names': set(), 'sql': entry['sql'], 'plan': None,
+            })
+            group['count'] += 1
+            group['total_ms'] += entry['duration_ms']
+            group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+            group['url_names'].add(entry.get('url_name', '-'))
+            if entry.get('plan'):
+                group['plan'] = entry['plan']
+
+        if not groups:
+            self.stdout.write("No slow queries recorded.")
+            return
+
+        ranked = sorted(groups.items(), key=lambda item: item[1]['total_ms'], reverse=True)[:options['top']]
+        for digest, group in ranked:
+            self.stdout.write(self.style.WARNING(
+                f"{digest}  total {group['total_ms']:.0f} ms  count {group['count']}  "
+                f"avg {group['total_ms'] / group['count']:.0f} ms  max {group['max_ms']:.0f} ms  "
+                f"[{', '.join(sorted(group['url_names']))}]"
+            ))
+            self.stdout.write(f"    {group['sql'][:500]}")
+            if options['plans'] and group['plan']:
+                for line in group['plan'].splitlines():
+                    self.stdout.write(f"      {line}")
+        self.stdout.write(self.style.SUCCESS(f"{len(groups)} fingerprint(s) recorded"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inventory import snapshots
+
+
+class Command(BaseCommand):
+    help = "Store a per-item stock snapshot (ledger balance) for fast stock-as-of queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--at', help="Snapshot time: YYYY-MM-DD (end of day) or ISO datetime (default: now)")
+
+    def handle(self, *args, **options):
+        try:
+            at = snapshots.parse_at(options['at']) if options['at'] else timezone.now()
+            written = snapshots.take(at)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {written} item balance(s) as of {timezone.localtime(at):%Y-%m-%d %H:%M:%S}"
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from inventory import expiry
+
+
+class Command(BaseCommand):
+    help = "Store today's totals of batches expiring within the horizon for the dashboard (run nightly)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Horizon in days (default: EXPIRY_HORIZON_DAYS)")
+
+    def handle(self, *args, **options):
+        summary = expiry.summarize(options['days'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary.batch_count} batch(es) worth ₱{summary.value_at_risk:,.2f} expire within "
+            f"{summary.horizon_days} days of {summary.as_of}"
+        ))
@@ -0,0 +1,319 @@
+"""
+Process-shared request metrics in Prometheus text format.
+
+Each gunicorn worker keeps its counters and fixed-bucket histograms in
+memory and writes them to ``<METRICS_DIR>/<pid>-<start time>.json`` at most
+every ``METRICS_FLUSH_SECONDS`` and once more at exit. The start time keeps
+a later process that reuses the pid from overwriting the file. The write
+goes through a temporary file and ``os.replace``, so readers never see a
+partial file. ``render`` flushes the calling worker, then adds up the files
+of every worker, including ones that have exited, so totals never go
+backwards. On POSIX the files of exited workers are folded into
+``retired.json`` and removed, under a ``flock`` that readers share, so the
+directory doesn't grow with every restart. ``METRICS_DIR`` must therefore
+be local to the host: workers of another host would look exited. DB
+connection counts are read live from ``pg_stat_activity`` at scrape time
+(PostgreSQL only).
+
+Request metrics are recorded by ``RequestTimingMiddleware``; cache lookups
+by the dashboard counters, the item label cache and the page cache (per tier
+and per whole response, see ``inventory.caching``).
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: exited workers' files are kept
+    fcntl = None
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'inventory_http_requests_total': ('counter', "Requests by URL name, method and status class", None),
+    'inventory_http_request_duration_seconds': ('histogram', "Request latency by URL name", DURATION_BUCKETS),
+    'inventory_db_queries_total': ('counter', "SQL statements run by requests, by URL name", None),
+    'inventory_db_query_duration_seconds_total': ('counter', "Time spent in SQL by requests, by URL name", None),
+    'inventory_cache_requests_total': ('counter', "Cache lookups by cache and result (hit/miss)", None),
+}
+
+RETIRED_FILE = 'retired.json'
+LOCK_FILE = '.lock'
+
+_lock = threading.Lock()
+_state = {'pid': None, 'file': None, 'counters': {}, 'histograms': {}, 'flushed_at': 0.0}
+
+
+def _directory():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _reset_after_fork():
+    # Numbers inherited from a parent process belong to the parent's file
+    if _state['pid'] != os.getpid():
+        _state.update(
+            pid=os.getpid(), file=f"{os.getpid()}-{time.time_ns()}.json",
+            counters={}, histograms={}, flushed_at=0.0,
+        )
+
+
+def inc(name, labels, value=1):
+    key = (name, _labels_key(labels))
+    with _lock:
+        _reset_after_fork()
+        _state['counters'][key] = _state['counters'].get(key, 0) + value
+
+
+def observe(name, labels, value):
+    buckets = METRICS[name][2]
+    key = (name, _labels_key(labels))
+    with _lock:
+        _reset_after_fork()
+        histogram = _state['histograms'].get(key)
+        if histogram is None:
+            # per-bucket counts (+Inf last), sum, count
+            histogram = _state['histograms'][key] = [[0] * (len(buckets) + 1), 0.0, 0]
+        histogram[0][bisect_left(buckets, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+def observe_request(url_name, method, status, seconds, queries, sql_seconds):
+    labels = {'view': url_name}
+    inc('inventory_http_requests_total', {**labels, 'method': method, 'status': f"{status // 100}xx"})
+    observe('inventory_http_request_duration_seconds', labels, seconds)
+    if queries:
+        inc('inventory_db_queries_total', labels, queries)
+        inc('inventory_db_query_duration_seconds_total', labels, sql_seconds)
+    maybe_flush()
+
+
+def cache_lookup(cache_name, hits, misses=0):
+    if hits:
+        inc('inventory_cache_requests_total', {'cache': cache_name, 'result': 'hit'}, hits)
+    if misses:
+        inc('inventory_cache_requests_total', {'cache': cache_name, 'result': 'miss'}, misses)
+
+
+def _payload(counters, histograms):
+    return {
+        'counters': [[name, dict(labels), value] for (name, labels), value in counters.items()],
+        'histograms': [
+            [name, dict(labels), list(buckets), total, count]
+            for (name, labels), (buckets, total, count) in histograms.items()
+        ],
+    }
+
+
+def _snapshot():
+    with _lock:
+        _reset_after_fork()
+        _state['flushed_at'] = time.monotonic()
+        return _state['file'], _payload(_state['counters'], _state['histograms'])
+
+
+def _write(directory, name, payload):
+    path = os.path.join(directory, name)
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    os.makedirs(directory, exist_ok=True)
+    with open(temporary, 'w', encoding='utf-8') as handle:
+        json.dump(payload, handle)
+    os.replace(temporary, path)
+
+
+def flush():
+    """Write this process's metrics to its file in ``METRICS_DIR``."""
+    directory = _directory()
+    if not directory:
+        return
+    name, payload = _snapshot()
+    try:
+        _write(directory, name, payload)
+    except OSError:
+        logger.exception("Could not write metrics to %s", os.path.join(directory, name))
+
+
+# The interval since the last flush would otherwise be lost when a worker exits
+atexit.register(flush)
+
+
+def maybe_flush():
+    if time.monotonic() - _state['flushed_at'] >= getattr(settings, 'METRICS_FLUSH_SECONDS', 5):
+        flush()
+
+
+def _add(counters, histograms, payload):
+    for name, labels, value in payload.get('counters', []):
+        key = (name, _labels_key(labels))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, buckets, total, count in payload.get('histograms', []):
+        key = (name, _labels_key(labels))
+        merged = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+        merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+        merged[1] += total
+        merged[2] += count
+
+
+def _read(directory, names):
+    payloads = {}
+    for name in names:
+        try:
+            with open(os.path.join(directory, name), encoding='utf-8') as handle:
+                payloads[name] = json.load(handle)
+        except (OSError, ValueError):
+            continue
+    return payloads
+
+
+def _metric_files(directory):
+    return [name for name in os.listdir(directory) if name.endswith('.json')]
+
+
+@contextmanager
+def _directory_lock(directory, exclusive):
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, LOCK_FILE), 'a') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _exited(directory):
+    """Metric files of processes that no longer run (POSIX only)."""
+    if fcntl is None:
+        return []
+    exited = []
+    for name in _metric_files(directory):
+        pid = name.split('-', 1)[0]
+        if name != RETIRED_FILE and pid.isdigit() and int(pid) != os.getpid() and not _alive(int(pid)):
+            exited.append(name)
+    return exited
+
+
+def _retire(directory):
+    """Fold the files of exited processes into ``RETIRED_FILE`` and delete them."""
+    if not _exited(directory):
+        return
+    with _directory_lock(directory, exclusive=True):
+        # Another scrape may have retired them while this one waited
+        exited = _exited(directory)
+        if not exited:
+            return
+        counters, histograms = {}, {}
+        for payload in _read(directory, [RETIRED_FILE, *exited]).values():
+            _add(counters, histograms, payload)
+        _write(directory, RETIRED_FILE, _payload(counters, histograms))
+        for name in exited:
+            os.remove(os.path.join(directory, name))
+
+
+def _merged():
+    """Sum the metric files of every process (this one included)."""
+    counters = {}
+    histograms = {}
+    directory = _directory()
+    if directory:
+        flush()
+        payloads = []
+        if os.path.isdir(directory):
+            try:
+                _retire(directory)
+            except OSError:
+                logger.exception("Could not retire metric files in %s", directory)
+            # Shared with _retire, so a file is never counted both alone and in RETIRED_FILE
+            with _directory_lock(directory, exclusive=False):
+                payloads = _read(directory, _metric_files(directory)).values()
+    else:
+        payloads = [_snapshot()[1]]
+
+    for payload in payloads:
+        _add(counters, histograms, payload)
+    return counters, histograms
+
+
+def db_connections():
+    """{state: connection count} for this database, or {} when not on PostgreSQL."""
+    if connection.vendor != 'postgresql':
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COALESCE(state, 'unknown'), COUNT(*) FROM pg_stat_activity "
+            "WHERE datname = current_database() GROUP BY 1"
+        )
+        return dict(cursor.fetchall())
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    counters, histograms = _merged()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_number(value)}")
+            continue
+        for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                le = bound if bound == '+Inf' else _number(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    connections = db_connections()
+    if connections:
+        lines.append("# HELP inventory_db_connections Connections to this database by state")
+        lines.append("# TYPE inventory_db_connections gauge")
+        for state, count in sorted(connections.items()):
+            lines.append(f"inventory_db_connections{_format_labels((('state', state),))} {count}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,86 @@
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics, timing
+
+logger = logging.getLogger('inventory.timing')
+
+
+def url_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else '-'
+
+
+class RequestTimingMiddleware:
+    """
+    Time SQL, template rendering and the remaining view code of each request.
+    The figures go out in a ``Server-Timing`` header (visible in the browser's
+    network panel), as one ``inventory.timing`` log line per request and into
+    the per-view metrics served at ``/metrics``.
+    Requests over ``REQUEST_TIMING_SLOW_MS`` are logged as warnings.
+    Streaming responses (CSV exports) are timed up to their first byte.
+    Works under both WSGI and ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'REQUEST_TIMING_SLOW_MS', 1000)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, token = timing.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            timing.finish(token)
+        return self.report(request, response, timings)
+
+    async def __acall__(self, request):
+        timings, token = timing.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timing.finish(token)
+        return self.report(request, response, timings)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Label the view's queries for the slow-query log
+        timings = timing.current()
+        if timings is not None:
+            timings.url_name = url_name(request)
+
+    def report(self, request, response, timings):
+        total = timings.elapsed() * 1000
+        sql = timings.sql * 1000
+        template = timings.template * 1000
+        view = max(total - sql - template, 0)
+        response['Server-Timing'] = (
+            f'db;dur={sql:.1f};desc="{timings.queries} queries", '
+            f'tpl;dur={template:.1f}, view;dur={view:.1f}, total;dur={total:.1f}'
+        )
+        name = url_name(request)
+        logger.log(
+            logging.WARNING if total >= self.slow_ms else logging.INFO,
+            "url_name=%s method=%s status=%s queries=%d db_ms=%.1f tpl_ms=%.1f view_ms=%.1f total_ms=%.1f",
+            name, request.method, response.status_code, timings.queries, sql, template, view, total,
+            extra={
+                'url_name': name,
+                'status_code': response.status_code,
+                'queries': timings.queries,
+                'db_ms': round(sql, 1),
+                'tpl_ms': round(template, 1),
+                'view_ms': round(view, 1),
+                'total_ms': round(total, 1),
+            },
+        )
+        metrics.observe_request(
+            name, request.method, response.status_code, total / 1000, timings.queries, timings.sql,
+        )
+        return response
@@ -0,0 +1,43 @@
+from django.db import migrations
+
+# The ledger tables are unmanaged (created by the main system), so the
+# composite indexes backing keyset pagination are added with plain DDL and
+# skipped when a table does not exist in this database (e.g. a test database).
+KEYSET_INDEXES = [
+    ('history_log_log_date_id_idx', 'history_log', ['log_date', 'id']),
+    ('sales_date_id_idx', 'sales', ['date', 'id']),
+    ('expenses_date_id_idx', 'expenses', ['date', 'id']),
+    ('stock_changes_date_id_idx', 'stock_changes', ['date', 'id']),
+    ('raw_materials_name_id_idx', 'raw_materials', ['name', 'id']),
+]
+
+
+def create_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    tables = set(connection.introspection.table_names())
+    concurrently = 'CONCURRENTLY ' if connection.vendor == 'postgresql' else ''
+    for name, table, columns in KEYSET_INDEXES:
+        if table not in tables:
+            continue
+        quoted = ', '.join(schema_editor.quote_name(column) for column in columns)
+        schema_editor.execute(
+            f"CREATE INDEX {concurrently}IF NOT EXISTS {schema_editor.quote_name(name)} "
+            f"ON {schema_editor.quote_name(table)} ({quoted})"
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    for name, _table, _columns in KEYSET_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(name)}")
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0002_monthly_financial_rollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSessions',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(max_length=40, unique=True)),
+                ('login_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('logout_at', models.DateTimeField(blank=True, null=True)),
+                ('expire_date', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='inventory.authuser')),
+            ],
+            options={
+                'db_table': 'user_sessions',
+                'indexes': [models.Index(fields=['user', 'expire_date'], name='user_sessions_user_expire_idx'), models.Index(fields=['user', 'logout_at'], name='user_sessions_user_logout_idx'), models.Index(fields=['expire_date'], name='user_sessions_expire_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_sync_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpirySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField(unique=True)),
+                ('horizon_days', models.PositiveIntegerField()),
+                ('product_batches', models.PositiveIntegerField(default=0)),
+                ('product_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('raw_batches', models.PositiveIntegerField(default=0)),
+                ('raw_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'expiry_summary',
+                'ordering': ['-as_of'],
+            },
+        ),
+    ]
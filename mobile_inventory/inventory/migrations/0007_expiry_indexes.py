@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# Batch tables are unmanaged (created by the main system), so the indexes
+# backing the expiring-batch report are added with plain DDL and skipped
+# when a table does not exist in this database (e.g. a test database).
+EXPIRY_INDEXES = [
+    ('product_batches_expiry_product_idx', 'product_batches', ['expiration_date', 'product_id']),
+    ('raw_material_batches_expiry_material_idx', 'raw_material_batches', ['expiration_date', 'material_id']),
+]
+
+
+def create_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    tables = set(connection.introspection.table_names())
+    concurrently = 'CONCURRENTLY ' if connection.vendor == 'postgresql' else ''
+    for name, table, columns in EXPIRY_INDEXES:
+        if table not in tables:
+            continue
+        quoted = ', '.join(schema_editor.quote_name(column) for column in columns)
+        schema_editor.execute(
+            f"CREATE INDEX {concurrently}IF NOT EXISTS {schema_editor.quote_name(name)} "
+            f"ON {schema_editor.quote_name(table)} ({quoted})"
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    for name, _table, _columns in EXPIRY_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(name)}")
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0006_expiry_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_expiry_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchAllocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_type', models.CharField(max_length=12)),
+                ('item_id', models.BigIntegerField()),
+                ('batch_id', models.BigIntegerField(blank=True, null=True)),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('allocated_at', models.DateTimeField(auto_now_add=True)),
+                ('withdrawal', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='allocations', to='inventory.withdrawals')),
+            ],
+            options={
+                'db_table': 'batch_allocations',
+                'indexes': [models.Index(fields=['item_type', 'batch_id'], name='batch_alloc_batch_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_ledger_checkpoints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('item_type', models.CharField(max_length=12)),
+                ('item_id', models.BigIntegerField()),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=14)),
+            ],
+            options={
+                'db_table': 'stock_snapshots',
+                'constraints': [models.UniqueConstraint(fields=('taken_at', 'item_type', 'item_id'), name='stock_snapshot_item_uniq')],
+            },
+        ),
+    ]
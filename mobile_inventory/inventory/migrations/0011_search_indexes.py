@@ -0,0 +1,68 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+# Indexes backing inventory.search. The searched tables are unmanaged
+# (created by the main system), so they are added with plain DDL and skipped
+# when a table does not exist in this database (e.g. a test database).
+# The expressions must stay identical to the ones in inventory/search.py.
+LEDGER_DOC = "(COALESCE(category, '') || ' ' || COALESCE(description, ''))"
+
+SEARCH_INDEXES = [
+    ('product_types_name_trgm_idx', 'product_types', '"name" gin_trgm_ops'),
+    ('product_variants_name_trgm_idx', 'product_variants', '"name" gin_trgm_ops'),
+    ('products_description_trgm_idx', 'products', '"description" gin_trgm_ops'),
+    ('raw_materials_name_trgm_idx', 'raw_materials', '"name" gin_trgm_ops'),
+    ('sales_search_trgm_idx', 'sales', f'{LEDGER_DOC} gin_trgm_ops'),
+    ('sales_search_fts_idx', 'sales', f"to_tsvector('simple'::regconfig, {LEDGER_DOC})"),
+    ('expenses_search_trgm_idx', 'expenses', f'{LEDGER_DOC} gin_trgm_ops'),
+    ('expenses_search_fts_idx', 'expenses', f"to_tsvector('simple'::regconfig, {LEDGER_DOC})"),
+]
+
+# SQLite stand-in: one FTS5 table holding every entity's text. The entity
+# is indexed too, so a search only walks that entity's matches.
+FTS_TABLE_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index "
+    "USING fts5(entity, body, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+
+
+def create_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        try:
+            schema_editor.execute(FTS_TABLE_SQL)
+        except OperationalError:
+            pass  # SQLite built without FTS5: search falls back to icontains
+        return
+    if connection.vendor != 'postgresql':
+        return
+    tables = set(connection.introspection.table_names())
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, expression in SEARCH_INDEXES:
+        if table not in tables:
+            continue
+        schema_editor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {schema_editor.quote_name(name)} "
+            f"ON {schema_editor.quote_name(table)} USING gin ({expression})"
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS search_index")
+    elif connection.vendor == 'postgresql':
+        for name, _table, _expression in SEARCH_INDEXES:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(name)}")
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0010_stock_snapshots'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,54 @@
+from django.db import migrations
+
+# Indexes backing the stock changes search (inventory.search.stock_changes_filter).
+# stock_changes is unmanaged (created by the main system), so they are added
+# with plain DDL and skipped when the table does not exist (e.g. a test
+# database). The trigram expression must stay identical to
+# search.STOCK_CHANGE_DOC.
+STOCK_CHANGE_DOC = "(category || ' ' || item_type || ' ' || quantity_change::text)"
+
+BTREE_INDEXES = [
+    ('stock_changes_item_id_idx', ['item_id']),
+    ('stock_changes_created_by_idx', ['created_by_admin_id']),
+]
+
+TRIGRAM_INDEX = 'stock_changes_search_trgm_idx'
+
+
+def create_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if 'stock_changes' not in connection.introspection.table_names():
+        return
+    concurrently = 'CONCURRENTLY ' if connection.vendor == 'postgresql' else ''
+    for name, columns in BTREE_INDEXES:
+        quoted = ', '.join(schema_editor.quote_name(column) for column in columns)
+        schema_editor.execute(
+            f"CREATE INDEX {concurrently}IF NOT EXISTS {schema_editor.quote_name(name)} "
+            f"ON stock_changes ({quoted})"
+        )
+    if connection.vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {schema_editor.quote_name(TRIGRAM_INDEX)} "
+            f"ON stock_changes USING gin ({STOCK_CHANGE_DOC} gin_trgm_ops)"
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    names = [name for name, _columns in BTREE_INDEXES]
+    if schema_editor.connection.vendor == 'postgresql':
+        names.append(TRIGRAM_INDEX)
+    for name in names:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(name)}")
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0011_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
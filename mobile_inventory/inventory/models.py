@@ -415,3 +415,138 @@ class Withdrawals(models.Model):
 
     def __str__(self):
         return f"{self.item_type} {self.item_id} - {self.quantity}"
+
+
+class MonthlyFinancialRollup(models.Model):
+    """Per-month sales, expenses and loss totals (Asia/Manila months), maintained by inventory.rollups."""
+    month = models.DateField(unique=True)
+    total_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_expenses = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_loss = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'monthly_financial_rollup'
+        ordering = ['month']
+
+    def __str__(self):
+        return self.month.strftime('%B %Y')
+
+
+class UserSessions(models.Model):
+    """Login/logout tracking per Django session, maintained by inventory.session_tracking."""
+    session_key = models.CharField(max_length=40, unique=True)
+    user = models.ForeignKey(AuthUser, models.DO_NOTHING)
+    login_at = models.DateTimeField(default=timezone.now)
+    logout_at = models.DateTimeField(blank=True, null=True)
+    expire_date = models.DateTimeField()
+
+    class Meta:
+        db_table = 'user_sessions'
+        indexes = [
+            models.Index(fields=['user', 'expire_date'], name='user_sessions_user_expire_idx'),
+            models.Index(fields=['user', 'logout_at'], name='user_sessions_user_logout_idx'),
+            models.Index(fields=['expire_date'], name='user_sessions_expire_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} @ {self.login_at:%Y-%m-%d %H:%M}"
+
+
+class SyncChanges(models.Model):
+    """Change log of ORM updates/deletes for the delta sync endpoint (inventory.sync)."""
+    OP_CHOICES = [
+        ('upsert', 'Upsert'),
+        ('delete', 'Delete'),
+    ]
+    table_name = models.CharField(max_length=64)
+    object_id = models.BigIntegerField()
+    op = models.CharField(max_length=6, choices=OP_CHOICES)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'sync_changes'
+
+
+class ExpirySummary(models.Model):
+    """Nightly totals of batches expiring within the horizon, written by inventory.expiry."""
+    as_of = models.DateField(unique=True)
+    horizon_days = models.PositiveIntegerField()
+    product_batches = models.PositiveIntegerField(default=0)
+    product_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    raw_batches = models.PositiveIntegerField(default=0)
+    raw_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'expiry_summary'
+        ordering = ['-as_of']
+
+    def __str__(self):
+        return f"Expiring within {self.horizon_days} days as of {self.as_of}"
+
+    @property
+    def batch_count(self):
+        return self.product_batches + self.raw_batches
+
+    @property
+    def value_at_risk(self):
+        return self.product_value + self.raw_value
+
+
+class BatchAllocation(models.Model):
+    """
+    First-expiry-first-out split of a withdrawal across batches, written by
+    inventory.allocation. A row without a batch is the part of the withdrawal
+    no open batch could cover.
+    """
+    withdrawal = models.ForeignKey(Withdrawals, models.DO_NOTHING, db_constraint=False, related_name='allocations')
+    item_type = models.CharField(max_length=12)
+    item_id = models.BigIntegerField()
+    batch_id = models.BigIntegerField(blank=True, null=True)
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    allocated_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'batch_allocations'
+        indexes = [
+            models.Index(fields=['item_type', 'batch_id'], name='batch_alloc_batch_idx'),
+        ]
+
+    def __str__(self):
+        return f"Withdrawal {self.withdrawal_id}: {self.quantity} from batch {self.batch_id or '-'}"
+
+
+class LedgerCheckpoint(models.Model):
+    """Per-item StockChanges balance up to ``last_change_id``, maintained by inventory.reconciliation."""
+    item_type = models.CharField(max_length=12)
+    item_id = models.BigIntegerField()
+    last_change_id = models.BigIntegerField()
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'ledger_checkpoints'
+        constraints = [
+            models.UniqueConstraint(fields=['item_type', 'item_id'], name='ledger_checkpoint_item_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.item_type} {self.item_id}: {self.balance} @ change {self.last_change_id}"
+
+
+class StockSnapshot(models.Model):
+    """Per-item ledger balance at ``taken_at``, written by inventory.snapshots."""
+    taken_at = models.DateTimeField()
+    item_type = models.CharField(max_length=12)
+    item_id = models.BigIntegerField()
+    quantity = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        db_table = 'stock_snapshots'
+        constraints = [
+            models.UniqueConstraint(fields=['taken_at', 'item_type', 'item_id'], name='stock_snapshot_item_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.item_type} {self.item_id}: {self.quantity} @ {self.taken_at:%Y-%m-%d %H:%M}"
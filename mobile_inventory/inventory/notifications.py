@@ -0,0 +1,69 @@
+"""
+Low-stock notifications.
+
+``generate`` finds every item at or below its threshold with one query per
+inventory table. It leaves out items that already have an unread low-stock
+notification, and inserts the rest with ``bulk_create``. It runs from the
+``generate_notifications`` command, after bulk intake, and (scoped to the
+saved item) from the inventory ``post_save`` receivers.
+"""
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from . import counters, items
+from .models import Notifications, ProductInventory, RawMaterialInventory
+
+LOW_STOCK = 'low_stock'
+
+# (inventory model, notification item_type, threshold field, archived flag lookup)
+SOURCES = (
+    (ProductInventory, items.PRODUCT, 'restock_threshold', 'product__is_archived'),
+    (RawMaterialInventory, items.RAW_MATERIAL, 'reorder_threshold', 'material__is_archived'),
+)
+
+
+def low_stock_ids(model, item_type, threshold, archived, ids=None):
+    """Ids of active items at or below threshold without an unread low-stock notification."""
+    pk = model._meta.pk.attname
+    unread = Notifications.objects.filter(
+        item_type__iexact=item_type,
+        item_id=OuterRef(pk),
+        notification_type__iexact=LOW_STOCK,
+        is_read=False,
+    )
+    queryset = model.objects.filter(total_stock__lte=F(threshold), **{archived: False}).filter(~Exists(unread))
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    return list(queryset.values_list(pk, flat=True))
+
+
+def generate(product_ids=None, material_ids=None):
+    """
+    Create the missing low-stock notifications and return how many were
+    created. ``None`` checks every item of that type; an empty list skips it.
+    """
+    now = timezone.now()
+    scopes = {items.PRODUCT: product_ids, items.RAW_MATERIAL: material_ids}
+    new_rows = []
+    for model, item_type, threshold, archived in SOURCES:
+        ids = scopes[item_type]
+        if ids is not None and not ids:
+            continue
+        new_rows.extend(
+            Notifications(
+                item_type=item_type,
+                item_id=item_id,
+                notification_type=LOW_STOCK,
+                notification_timestamp=now,
+                is_read=False,
+            )
+            for item_id in low_stock_ids(model, item_type, threshold, archived, ids)
+        )
+    if new_rows:
+        Notifications.objects.bulk_create(new_rows, batch_size=1000)
+        counters.invalidate('unread_notifications')
+    return len(new_rows)
+
+
+def unread_count():
+    return counters.get('unread_notifications')
@@ -0,0 +1,182 @@
+"""
+Keyset (cursor) pagination for the list views.
+
+Django's ``Paginator`` issues a ``COUNT(*)`` and an ``OFFSET`` that grows with
+the page number. ``KeysetPaginator`` instead seeks from the last row shown,
+keyed on the view's ordering (e.g. ``('-date', '-id')``), so every page costs
+the same as the first one. ``paginate`` picks the mode from the
+``KEYSET_PAGINATION`` setting.
+"""
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps([direction, [_serialize(v) for v in values]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return ``(direction, values)`` or ``None`` for a missing/tampered cursor."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+def _serialize(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _resolve(obj, path):
+    for part in path.split('__'):
+        obj = getattr(obj, part)
+    return obj
+
+
+def approximate_row_count(model, using='default'):
+    """Planner row estimate for ``model``'s table (PostgreSQL only), else ``None``."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class KeysetPage(Sequence):
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<KeysetPage of {len(self.object_list)} rows>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Seek-based paginator. ``ordering`` must end in a unique field and use one
+    direction throughout, e.g. ``('-date', '-id')`` or ``('material__name', 'material_id')``.
+    """
+
+    def __init__(self, queryset, ordering, per_page=10, approximate_total=False):
+        descending = {field.startswith('-') for field in ordering}
+        if len(descending) != 1:
+            raise ValueError("Keyset ordering fields must all sort in the same direction")
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.fields = [field.lstrip('-') for field in ordering]
+        self.descending = descending.pop()
+        self.per_page = per_page
+        self.approximate_total = approximate_total
+
+    @property
+    def approximate_count(self):
+        """Cheap total for unfiltered querysets; ``None`` when unavailable."""
+        if not self.approximate_total or self.queryset.query.where:
+            return None
+        if not hasattr(self, '_approximate_count'):
+            self._approximate_count = approximate_row_count(self.queryset.model, self.queryset.db)
+        return self._approximate_count
+
+    def _seek(self, values, forward):
+        # Rows strictly after ``values`` in (forward) ordering: a lexicographic
+        # comparison spelled out as ORs, plus a range on the leading key so the
+        # composite index can be range-scanned.
+        after = forward != self.descending
+        op = 'gt' if after else 'lt'
+        condition = Q()
+        for i, field in enumerate(self.fields):
+            clause = Q(**{f"{field}__{op}": values[i]})
+            for prev_field, prev_value in zip(self.fields[:i], values[:i]):
+                clause &= Q(**{prev_field: prev_value})
+            condition |= clause
+        leading = Q(**{f"{self.fields[0]}__{op}e": values[0]})
+        return leading & condition
+
+    def _keys(self, obj):
+        return [_resolve(obj, field) for field in self.fields]
+
+    def get_page(self, cursor=None):
+        decoded = decode_cursor(cursor)
+        if decoded and len(decoded[1]) != len(self.fields):
+            decoded = None
+
+        if decoded is None:
+            rows = list(self.queryset.order_by(*self.ordering)[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_next, has_previous = has_more, False
+        elif decoded[0] == 'next':
+            qs = self.queryset.filter(self._seek(decoded[1], forward=True))
+            rows = list(qs.order_by(*self.ordering)[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_next, has_previous = has_more, True
+        else:
+            reverse = [f[1:] if f.startswith('-') else f"-{f}" for f in self.ordering]
+            qs = self.queryset.filter(self._seek(decoded[1], forward=False))
+            rows = list(qs.order_by(*reverse)[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next, has_previous = True, has_more
+
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor('next', self._keys(rows[-1]))
+        if rows and has_previous:
+            previous_cursor = encode_cursor('prev', self._keys(rows[0]))
+        return KeysetPage(rows, self, next_cursor, previous_cursor)
+
+
+def paginate(request, queryset, ordering, per_page=10, approximate_total=False):
+    """Page ``queryset`` by cursor (keyset mode) or by ``?page=`` number."""
+    if getattr(settings, 'KEYSET_PAGINATION', True):
+        paginator = KeysetPaginator(queryset, ordering, per_page, approximate_total)
+        return paginator.get_page(request.GET.get('cursor'))
+    paginator = Paginator(queryset.order_by(*ordering), per_page)
+    return paginator.get_page(request.GET.get('page'))
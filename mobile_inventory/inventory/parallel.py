@@ -0,0 +1,56 @@
+"""
+Run independent ORM queries concurrently from async views.
+
+``gather`` runs each callable in a shared, bounded thread pool
+(``REPORT_QUERY_THREADS`` per process) through
+``sync_to_async(thread_sensitive=False)``. Every pool thread has its own
+database connection, so the queries really do run in parallel. The request's
+context variables (timing, replica routing) go with them. Pool-thread
+connections are recycled by ``close_old_connections`` around each job,
+as request threads' connections are around each request.
+
+A request's latency then approaches its slowest query instead of the sum.
+The price is up to ``REPORT_QUERY_THREADS`` extra connections per worker
+process, and the results don't share a single transaction snapshot.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'REPORT_QUERY_THREADS', 4),
+                thread_name_prefix='inventory-query',
+            )
+    return _executor
+
+
+def _job(function):
+    def run():
+        close_old_connections()
+        try:
+            return function()
+        finally:
+            close_old_connections()
+    return run
+
+
+def run(function):
+    """Awaitable calling the zero-argument ``function`` in the pool."""
+    return sync_to_async(_job(function), thread_sensitive=False, executor=_pool())()
+
+
+async def gather(*functions):
+    """Call the zero-argument ``functions`` concurrently; results in the same order."""
+    return await asyncio.gather(*(run(function) for function in functions))
@@ -0,0 +1,127 @@
+"""
+How many units of each product the current raw material stock can make.
+
+``compute`` loads the whole recipe matrix and the material stock with one
+query each, converts every recipe quantity into its material's unit through
+``SizeUnits.unit_name``, and works out all products in a single pass:
+
+    max_units(product) = min over its materials of floor(available / needed)
+
+where ``available = total_stock * size`` (stock is counted in packs of the
+material's ``size``/``unit``). The material giving the minimum is the
+bottleneck. Recipes whose units cannot be converted (e.g. grams of a
+material stocked in pieces) are reported instead of guessed.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from . import items
+from .models import ProductRecipes, RawMaterials
+
+# unit name -> (dimension, factor to the dimension's base unit)
+UNIT_FACTORS = {
+    'mg': ('mass', Decimal('0.001')),
+    'g': ('mass', Decimal('1')),
+    'gram': ('mass', Decimal('1')),
+    'grams': ('mass', Decimal('1')),
+    'kg': ('mass', Decimal('1000')),
+    'kilogram': ('mass', Decimal('1000')),
+    'kilograms': ('mass', Decimal('1000')),
+    'oz': ('mass', Decimal('28.349523125')),
+    'lb': ('mass', Decimal('453.59237')),
+    'lbs': ('mass', Decimal('453.59237')),
+    'ml': ('volume', Decimal('1')),
+    'l': ('volume', Decimal('1000')),
+    'liter': ('volume', Decimal('1000')),
+    'liters': ('volume', Decimal('1000')),
+    'litre': ('volume', Decimal('1000')),
+    'pc': ('count', Decimal('1')),
+    'pcs': ('count', Decimal('1')),
+    'piece': ('count', Decimal('1')),
+    'pieces': ('count', Decimal('1')),
+    'dozen': ('count', Decimal('12')),
+}
+
+Component = namedtuple('Component', ['material_id', 'label', 'needed', 'available', 'unit', 'supports'])
+Capacity = namedtuple('Capacity', ['product_id', 'label', 'max_units', 'bottleneck', 'components', 'problems'])
+
+
+def conversion_factor(from_unit, to_unit):
+    """Multiplier taking a quantity in ``from_unit`` to ``to_unit``, or None if incompatible."""
+    from_key = (from_unit or '').strip().lower()
+    to_key = (to_unit or '').strip().lower()
+    if from_key == to_key:
+        return Decimal('1')
+    source, target = UNIT_FACTORS.get(from_key), UNIT_FACTORS.get(to_key)
+    if not source or not target or source[0] != target[0]:
+        return None
+    return source[1] / target[1]
+
+
+def _material_stock():
+    """{material_id: (available amount in the material's unit, unit name)}"""
+    rows = RawMaterials.objects.values_list('id', 'size', 'unit__unit_name', 'rawmaterialinventory__total_stock')
+    return {
+        material_id: ((total_stock or Decimal('0')) * (size or Decimal('0')), unit_name or '')
+        for material_id, size, unit_name, total_stock in rows
+    }
+
+
+def compute():
+    """Return a ``Capacity`` for every active product with a recipe, ordered by label."""
+    stock = _material_stock()
+    recipes = ProductRecipes.objects.filter(product__is_archived=False).values_list(
+        'product_id', 'material_id', 'quantity_needed', 'unit__unit_name',
+    )
+
+    # product -> material -> quantity needed per unit, in the material's unit
+    needed = {}
+    problems = {}
+    for product_id, material_id, quantity, unit_name in recipes:
+        per_product = needed.setdefault(product_id, {})
+        if material_id not in stock:
+            problems.setdefault(product_id, []).append((material_id, "material no longer exists"))
+            continue
+        factor = conversion_factor(unit_name, stock[material_id][1])
+        if factor is None:
+            problems.setdefault(product_id, []).append(
+                (material_id, f"cannot convert {unit_name or '?'} to {stock[material_id][1] or '?'}")
+            )
+            continue
+        per_product[material_id] = per_product.get(material_id, Decimal('0')) + quantity * factor
+
+    resolved = items.resolve_items(
+        [(items.PRODUCT, product_id) for product_id in needed]
+        + [(items.RAW_MATERIAL, material_id) for material_id in stock]
+    )
+
+    def label(item_type, item_id):
+        item = resolved.get((item_type, item_id))
+        return item.label if item else items.missing_label(item_type, item_id)
+
+    capacities = []
+    for product_id, materials in needed.items():
+        components = []
+        for material_id, quantity in materials.items():
+            available, unit_name = stock[material_id]
+            supports = int(available // quantity) if quantity > 0 else None
+            components.append(Component(
+                material_id, label(items.RAW_MATERIAL, material_id), quantity, available, unit_name,
+                max(supports, 0) if supports is not None else None,
+            ))
+        limiting = [component for component in components if component.supports is not None]
+        bottleneck = min(limiting, key=lambda component: component.supports) if limiting else None
+        product_problems = [
+            f"{label(items.RAW_MATERIAL, material_id)}: {message}"
+            for material_id, message in problems.get(product_id, [])
+        ]
+        capacities.append(Capacity(
+            product_id,
+            label(items.PRODUCT, product_id),
+            # An unconvertible ingredient makes the answer unknown, not unlimited
+            bottleneck.supports if bottleneck and not product_problems else None,
+            bottleneck,
+            sorted(components, key=lambda component: (component.supports is None, component.supports)),
+            product_problems,
+        ))
+    return sorted(capacities, key=lambda capacity: capacity.label)
@@ -0,0 +1,147 @@
+"""
+Reconcile stored inventory totals against the ``StockChanges`` ledger.
+
+Every item's ledger balance is ``LedgerCheckpoint.balance`` plus the sum of
+its stock changes with an id above the checkpoint's ``last_change_id``. One
+grouped query computes those sums for all items. It only reads rows above
+the lowest checkpoint, and a correlated subquery skips each item's rows
+already folded into its checkpoint. The checkpoints are then moved forward,
+so the next run scans only what was added since.
+
+Edits and deletes of ledger rows through Django reset the item's checkpoint
+(``inventory.signals``). After changes made outside Django, or if a ledger
+row commits after a higher id was already checkpointed, run with
+``full=True`` to rebuild every checkpoint from the whole ledger.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Lower
+
+from . import items, notifications, versions
+from .models import LedgerCheckpoint, ProductInventory, RawMaterialInventory, StockChanges
+
+# item type -> (inventory model, pk attname)
+INVENTORIES = {
+    items.PRODUCT: (ProductInventory, 'product_id'),
+    items.RAW_MATERIAL: (RawMaterialInventory, 'material_id'),
+}
+
+Drift = namedtuple('Drift', ['item_type', 'item_id', 'label', 'stored', 'ledger'])
+ReconcileResult = namedtuple('ReconcileResult', ['items_checked', 'rows_scanned', 'drifts', 'repaired'])
+
+
+def ledger_deltas(full=False):
+    """
+    {(item_type, item_id): (sum of new quantity_change, highest change id, row count)}
+    for ledger rows not yet folded into a checkpoint.
+    """
+    changes = StockChanges.objects.annotate(normalized_type=Lower('item_type')).filter(
+        normalized_type__in=[items.PRODUCT, items.RAW_MATERIAL],
+    )
+    if not full:
+        floor = LedgerCheckpoint.objects.aggregate(floor=Min('last_change_id'))['floor'] or 0
+        threshold = LedgerCheckpoint.objects.filter(
+            item_type=OuterRef('normalized_type'), item_id=OuterRef('item_id'),
+        ).values('last_change_id')[:1]
+        changes = (
+            changes.filter(id__gt=floor)
+            .alias(threshold=Coalesce(Subquery(threshold), Value(0)))
+            .filter(id__gt=F('threshold'))
+        )
+    rows = changes.values('normalized_type', 'item_id').annotate(
+        delta=Sum('quantity_change'), last_id=Max('id'), row_count=Count('id'),
+    ).order_by()
+    return {
+        (row['normalized_type'], row['item_id']): (row['delta'] or Decimal('0'), row['last_id'], row['row_count'])
+        for row in rows
+    }
+
+
+def reconcile(repair=False, full=False):
+    """
+    Compare every stored total with its ledger balance, advancing the
+    checkpoints. With ``repair`` the drifting totals are overwritten with the
+    ledger balance in one bulk update per inventory table.
+    """
+    with transaction.atomic():
+        deltas = ledger_deltas(full)
+        checkpoints = {} if full else {
+            (cp.item_type, cp.item_id): cp for cp in LedgerCheckpoint.objects.all()
+        }
+        balances = {ref: cp.balance for ref, cp in checkpoints.items()}
+        updated = []
+        for ref, (delta, last_id, _count) in deltas.items():
+            balances[ref] = balances.get(ref, Decimal('0')) + delta
+            updated.append(LedgerCheckpoint(
+                item_type=ref[0], item_id=ref[1], last_change_id=last_id, balance=balances[ref],
+            ))
+        if full:
+            LedgerCheckpoint.objects.all().delete()
+        LedgerCheckpoint.objects.bulk_create(
+            updated,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['item_type', 'item_id'],
+            update_fields=['last_change_id', 'balance', 'updated_at'],
+        )
+
+        drifts = []
+        checked = 0
+        for item_type, (model, pk) in INVENTORIES.items():
+            for item_id, stored in model.objects.values_list(pk, 'total_stock'):
+                checked += 1
+                ledger = balances.get((item_type, item_id), Decimal('0'))
+                if stored != ledger:
+                    drifts.append([item_type, item_id, stored, ledger])
+
+        repaired = _repair(drifts) if repair and drifts else 0
+
+    resolved = items.resolve_items((item_type, item_id) for item_type, item_id, _s, _l in drifts)
+    return ReconcileResult(
+        items_checked=checked,
+        rows_scanned=sum(count for _delta, _last, count in deltas.values()),
+        drifts=[
+            Drift(item_type, item_id, _label(resolved, item_type, item_id), stored, ledger)
+            for item_type, item_id, stored, ledger in drifts
+        ],
+        repaired=repaired,
+    )
+
+
+def _label(resolved, item_type, item_id):
+    item = resolved.get((item_type, item_id))
+    return item.label if item else items.missing_label(item_type, item_id)
+
+
+def _repair(drifts):
+    repaired = 0
+    touched = {items.PRODUCT: [], items.RAW_MATERIAL: []}
+    for item_type, (model, pk) in INVENTORIES.items():
+        rows = [
+            model(**{pk: item_id, 'total_stock': ledger})
+            for drift_type, item_id, _stored, ledger in drifts
+            if drift_type == item_type
+        ]
+        if rows:
+            model.objects.bulk_update(rows, ['total_stock'], batch_size=1000)
+            touched[item_type] = [getattr(row, pk) for row in rows]
+            repaired += len(rows)
+
+    def after_commit():
+        versions.bump(ProductInventory)
+        versions.bump(RawMaterialInventory)
+        notifications.generate(product_ids=touched[items.PRODUCT], material_ids=touched[items.RAW_MATERIAL])
+    transaction.on_commit(after_commit)
+    return repaired
+
+
+def reset_checkpoint(item_type, item_id):
+    """Force the next run to rescan an item whose ledger rows were edited or deleted."""
+    item_type = items.normalize_item_type(item_type)
+    if item_type:
+        LedgerCheckpoint.objects.filter(item_type=item_type, item_id=item_id).update(
+            last_change_id=0, balance=0,
+        )
@@ -0,0 +1,220 @@
+"""
+Monthly financial rollup maintenance.
+
+``MonthlyFinancialRollup`` keeps one row per local (Asia/Manila) month with the
+sales, expenses and loss totals that ``monthly_report_data`` used to compute
+from scratch on every call. Rows are refreshed per month from signal handlers
+(see ``inventory.signals``) and can be rebuilt with the
+``rebuild_monthly_rollup`` management command (run once after the first
+migrate, see the README).
+Rows written outside Django reach it through ``refresh_recent``: the report
+recomputes the current and previous month when they were last refreshed
+more than ``MONTHLY_ROLLUP_TTL`` seconds ago, as the dashboard counters
+expire.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from .models import (
+    Expenses,
+    MonthlyFinancialRollup,
+    Products,
+    RawMaterials,
+    Sales,
+    Withdrawals,
+)
+from .routers import use_primary
+
+LOSS_REASONS = ['EXPIRED', 'DAMAGED', 'REPLACEMENT_FOR_RETURNED']
+
+FRESH_KEY = 'rollup:recent:fresh'
+
+ZERO = Decimal('0.00')
+
+
+def month_of(value):
+    """Return the first day of the local month containing ``value``."""
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        value = value.date()
+    return value.replace(day=1)
+
+
+def month_bounds(month):
+    """Return the aware [start, end) datetimes covering the local ``month``."""
+    tz = timezone.get_current_timezone()
+    start = datetime(month.year, month.month, 1, tzinfo=tz)
+    if month.month == 12:
+        end = datetime(month.year + 1, 1, 1, tzinfo=tz)
+    else:
+        end = datetime(month.year, month.month + 1, 1, tzinfo=tz)
+    return start, end
+
+
+def loss_withdrawals():
+    return Withdrawals.objects.filter(reason__in=LOSS_REASONS, is_archived=False)
+
+
+def loss_amount():
+    """Withdrawal quantity priced by custom price, else the item's current price."""
+    product_price = Subquery(
+        Products.objects.filter(id=OuterRef('item_id')).values('unit_price__unit_price')[:1]
+    )
+    raw_price = Subquery(
+        RawMaterials.objects.filter(id=OuterRef('item_id')).values('price_per_unit')[:1]
+    )
+    price = Coalesce(
+        'custom_price',
+        Case(
+            When(item_type='PRODUCT', then=product_price),
+            When(item_type='RAW_MATERIAL', then=raw_price),
+            output_field=DecimalField(),
+        ),
+        output_field=DecimalField(),
+    )
+    # Rows without any price contribute NULL, which SUM ignores
+    return Sum(F('quantity') * price, output_field=DecimalField())
+
+
+def _monthly(queryset, start, end, **aggregates):
+    tz = timezone.get_current_timezone()
+    if start is not None:
+        queryset = queryset.filter(date__gte=start)
+    if end is not None:
+        queryset = queryset.filter(date__lt=end)
+    rows = (
+        queryset.annotate(month=TruncMonth('date', tzinfo=tz))
+        .values('month')
+        .annotate(**aggregates)
+        .order_by()
+    )
+    return {month_of(row.pop('month')): row for row in rows}
+
+
+def monthly_sales(start=None, end=None):
+    return _monthly(Sales.objects.all(), start, end, total=Sum('amount'))
+
+
+def monthly_expenses(start=None, end=None):
+    return _monthly(Expenses.objects.all(), start, end, total=Sum('amount'))
+
+
+def monthly_losses(start=None, end=None, withdrawals=None):
+    """Priced loss per month, over ``withdrawals`` (default: every loss withdrawal)."""
+    if withdrawals is None:
+        withdrawals = loss_withdrawals()
+    return _monthly(withdrawals, start, end, total=loss_amount())
+
+
+def loss_parts():
+    """Loss withdrawals split into disjoint querysets (products / the rest) that can be aggregated in parallel."""
+    losses = loss_withdrawals()
+    return [losses.filter(item_type='PRODUCT'), losses.exclude(item_type='PRODUCT')]
+
+
+def merge_months(sales, expenses, *losses):
+    """Combine per-month ``monthly_*`` results into rollup totals."""
+    months = set(sales) | set(expenses)
+    for loss in losses:
+        months |= set(loss)
+    totals = {}
+    for month in months:
+        totals[month] = {
+            'total_sales': (sales.get(month) or {}).get('total') or ZERO,
+            'total_expenses': (expenses.get(month) or {}).get('total') or ZERO,
+            'total_loss': sum(((loss.get(month) or {}).get('total') or ZERO for loss in losses), ZERO),
+        }
+    return totals
+
+
+def compute_months(start=None, end=None):
+    """Aggregate sales, expenses and loss per local month within [start, end)."""
+    return merge_months(
+        monthly_sales(start, end),
+        monthly_expenses(start, end),
+        monthly_losses(start, end),
+    )
+
+
+def _store(totals):
+    if not totals:
+        return
+    MonthlyFinancialRollup.objects.bulk_create(
+        [MonthlyFinancialRollup(month=month, **values) for month, values in totals.items()],
+        update_conflicts=True,
+        unique_fields=['month'],
+        update_fields=['total_sales', 'total_expenses', 'total_loss', 'updated_at'],
+    )
+
+
+def refresh_months(months):
+    """Recompute the rollup rows for ``months`` from their date ranges only."""
+    for month in sorted({month_of(m) for m in months if m is not None}):
+        start, end = month_bounds(month)
+        with transaction.atomic():
+            totals = compute_months(start, end)
+            if totals:
+                _store(totals)
+            else:
+                MonthlyFinancialRollup.objects.filter(month=month).delete()
+
+
+def refresh_recent():
+    """
+    Recompute the current and previous month unless that was done within
+    ``MONTHLY_ROLLUP_TTL`` seconds (by any worker). Returns whether it ran.
+    """
+    ttl = getattr(settings, 'MONTHLY_ROLLUP_TTL', 300)
+    if ttl <= 0 or not cache.add(FRESH_KEY, True, ttl):
+        return False
+    this_month = month_of(timezone.localdate())
+    try:
+        # Computed from the primary: the rows are written there
+        with use_primary():
+            refresh_months([this_month - timedelta(days=1), this_month])
+    except Exception:
+        cache.delete(FRESH_KEY)
+        raise
+    return True
+
+
+def refresh_item_loss_months(item_type, item_ids):
+    """Re-price the months holding list-priced loss withdrawals of the given items."""
+    tz = timezone.get_current_timezone()
+    months = (
+        loss_withdrawals()
+        .filter(item_type=item_type, item_id__in=item_ids, custom_price__isnull=True)
+        .annotate(month=TruncMonth('date', tzinfo=tz))
+        .values_list('month', flat=True)
+        .distinct()
+    )
+    refresh_months(list(months))
+
+
+def rebuild(start_month=None, end_month=None):
+    """
+    Rebuild rollup rows from scratch, optionally limited to an inclusive
+    month range. Returns the number of months written.
+    """
+    start = month_bounds(start_month)[0] if start_month else None
+    end = month_bounds(end_month)[1] if end_month else None
+
+    stale = MonthlyFinancialRollup.objects.all()
+    if start_month:
+        stale = stale.filter(month__gte=month_of(start_month))
+    if end_month:
+        stale = stale.filter(month__lte=month_of(end_month))
+
+    with transaction.atomic():
+        totals = compute_months(start, end)
+        stale.exclude(month__in=list(totals)).delete()
+        _store(totals)
+    return len(totals)
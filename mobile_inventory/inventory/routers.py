@@ -0,0 +1,84 @@
+"""
+Read-replica routing for the report views.
+
+Views decorated with ``reads_from_replica`` (or code run inside
+``use_replica()``) read from the ``replica`` database alias when one is
+configured (``REPLICA_DATABASE_URL``). The choice is kept in a context
+variable, so it follows the request into ``sync_to_async`` threads and
+does not leak into other requests served by the same thread. Writes, and
+reads anywhere else, stay on ``default``. Without a replica everything
+reads from the primary, as before.
+
+The replica may lag the primary slightly, so only views that never read
+back their own writes are routed to it.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+REPLICA = 'replica'
+
+_read_alias = ContextVar('inventory_read_alias', default=None)
+
+
+def replica_alias():
+    """The replica alias, or None when no replica is configured."""
+    return REPLICA if REPLICA in settings.DATABASES else None
+
+
+@contextmanager
+def use_replica():
+    token = _read_alias.set(replica_alias())
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary again, e.g. to compute rows that are then written there."""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def reads_from_replica(view):
+    """Route the view's reads to the replica (if configured)."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            with use_replica():
+                return await view(request, *args, **kwargs)
+        async_wrapper.reads_from_replica = True
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with use_replica():
+            return view(request, *args, **kwargs)
+    # Seen by decorators applied on top, e.g. inventory.caching.cached_page
+    wrapper.reads_from_replica = True
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        if {obj1._state.db, obj2._state.db} <= {'default', REPLICA}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db == REPLICA else None
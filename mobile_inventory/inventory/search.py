@@ -0,0 +1,333 @@
+"""
+Global search across products, raw materials, sales and expenses.
+
+On PostgreSQL the searched columns carry ``pg_trgm`` GIN indexes, and the
+sales/expense text also a ``simple`` full-text index (migration 0011). A
+search is then a handful of index scans however large the tables grow:
+
+* products and materials match when every word appears in the type,
+  variant, description or name (``ILIKE``, trigram-indexed from three
+  characters; these tables stay small);
+* sales and expenses match when every word prefix-matches the category or
+  description (``to_tsquery('simple', 'word:*')``), or the whole term
+  appears in it;
+* matches are ranked by trigram ``word_similarity`` (plus ``ts_rank``). At
+  most ``CANDIDATES`` matches per entity are ranked, which bounds the cost
+  of very common terms.
+
+SQLite has no such indexes, so the same text is copied into an FTS5 table
+(``search_index``, ranked by bm25 over the newest ``CANDIDATES`` matches).
+The receivers in ``inventory.signals`` keep it current, and
+``rebuild_search_index`` refills it after writes made outside Django.
+Other databases fall back to unranked ``icontains``.
+
+``stock_changes_filter`` backs the stock changes page's search box the same
+way. Item labels and usernames are matched in their own small tables, and
+the ledger is then filtered by indexed id lists. Category, type and quantity
+are matched on PostgreSQL through one trigram-indexed expression (migration
+0013).
+"""
+import re
+from collections import namedtuple
+
+from django.db import connections, router, transaction
+from django.db.models import BooleanField, CharField, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+from django.db.models.lookups import IContains
+
+from . import items
+from .models import AuthUser, Expenses, Products, ProductTypes, ProductVariants, RawMaterials, Sales, StockChanges
+
+FTS_TABLE = 'search_index'
+
+CANDIDATES = 200
+MAX_WORDS = 8
+BATCH_SIZE = 1000
+
+Entity = namedtuple('Entity', ['model', 'filters', 'fields'])
+
+# Ordered as the result groups; ``fields`` make up the searchable text
+ENTITIES = {
+    'products': Entity(Products, {'is_archived': False}, ('product_type__name', 'variant__name', 'description')),
+    'raw_materials': Entity(RawMaterials, {'is_archived': False}, ('name',)),
+    'sales': Entity(Sales, {}, ('category', 'description')),
+    'expenses': Entity(Expenses, {}, ('category', 'description')),
+}
+
+# Lookup tables whose names are part of another entity's text
+LABEL_MODELS = {
+    ProductTypes: ('products', 'product_type_id'),
+    ProductVariants: ('products', 'variant_id'),
+}
+
+_WORD = re.compile(r'\w+')
+
+_LEDGER_DOC = "(COALESCE({t}.category, '') || ' ' || COALESCE({t}.description, ''))"
+
+# Must stay identical to the expression indexed by migration 0013
+STOCK_CHANGE_DOC = (
+    "(stock_changes.category || ' ' || stock_changes.item_type || ' ' || stock_changes.quantity_change::text)"
+)
+
+_PG_LEDGER_SQL = """
+    SELECT id, rank FROM (
+        SELECT {t}.id,
+               ts_rank(to_tsvector('simple'::regconfig, {doc}), to_tsquery('simple', %(tsquery)s))
+               + word_similarity(%(term)s, {doc}) AS rank
+        FROM {table} {t}
+        WHERE to_tsvector('simple'::regconfig, {doc}) @@ to_tsquery('simple', %(tsquery)s)
+              {substring}
+        LIMIT %(candidates)s
+    ) matches
+    ORDER BY rank DESC, id DESC
+    LIMIT %(limit)s
+"""
+
+_PG_PRODUCTS_SQL = """
+    SELECT id, rank FROM (
+        SELECT p.id,
+               word_similarity(%(term)s, t.name || ' ' || v.name || ' ' || COALESCE(p.description, '')) AS rank
+        FROM products p
+        JOIN product_types t ON t.id = p.product_type_id
+        JOIN product_variants v ON v.id = p.variant_id
+        WHERE NOT p.is_archived AND {words}
+        LIMIT %(candidates)s
+    ) matches
+    ORDER BY rank DESC, id
+    LIMIT %(limit)s
+"""
+
+_PG_MATERIALS_SQL = """
+    SELECT id, rank FROM (
+        SELECT m.id, word_similarity(%(term)s, m.name) AS rank
+        FROM raw_materials m
+        WHERE NOT m.is_archived AND {words}
+        LIMIT %(candidates)s
+    ) matches
+    ORDER BY rank DESC, id
+    LIMIT %(limit)s
+"""
+
+_fts_databases = set()
+
+
+def words(term):
+    return _WORD.findall((term or '').lower())[:MAX_WORDS]
+
+
+def _like(value):
+    return '%' + value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def _connection(entity):
+    return connections[router.db_for_read(ENTITIES[entity].model)]
+
+
+def _has_fts(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    key = (connection.alias, str(connection.settings_dict['NAME']))
+    # Only a positive answer is remembered: migrating later adds the table
+    if key not in _fts_databases and FTS_TABLE in connection.introspection.table_names():
+        _fts_databases.add(key)
+    return key in _fts_databases
+
+
+def _fetch(connection, sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _search_postgresql(connection, entity, term, terms, limit):
+    params = {'term': term, 'limit': limit, 'candidates': CANDIDATES}
+    if entity in ('sales', 'expenses'):
+        doc = _LEDGER_DOC.format(t='l')
+        params['tsquery'] = ' & '.join(f'{word}:*' for word in terms)
+        substring = ''
+        if len(term) >= 3:
+            # Also a substring anywhere (mid-word), trigram-indexed
+            params['like'] = _like(term)
+            substring = f"OR {doc} ILIKE %(like)s"
+        sql = _PG_LEDGER_SQL.format(t='l', table=entity, doc=doc, substring=substring)
+        return _fetch(connection, sql, params)
+
+    columns = ('t.name', 'v.name', 'p.description') if entity == 'products' else ('m.name',)
+    conditions = []
+    for i, word in enumerate(terms):
+        params[f'word{i}'] = _like(word)
+        conditions.append('(' + ' OR '.join(f"{column} ILIKE %(word{i})s" for column in columns) + ')')
+    template = _PG_PRODUCTS_SQL if entity == 'products' else _PG_MATERIALS_SQL
+    return _fetch(connection, template.format(words=' AND '.join(conditions)), params)
+
+
+def _search_fts(connection, entity, terms, limit):
+    query = f'entity : "{entity}" AND body : (' + ' '.join(f'"{word}"*' for word in terms) + ')'
+    rows = _fetch(
+        connection,
+        f"SELECT rowid, bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+        f"ORDER BY rowid DESC LIMIT %s",
+        [query, CANDIDATES],
+    )
+    # bm25 is lower-is-better; flip it so every backend ranks higher-is-better
+    ranked = sorted(((_item_id(rowid), -score) for rowid, score in rows), key=lambda row: (-row[1], -row[0]))
+    return ranked[:limit]
+
+
+def _search_basic(entity, terms, limit):
+    spec = ENTITIES[entity]
+    queryset = spec.model.objects.filter(**spec.filters)
+    for word in terms:
+        match = Q()
+        for field in spec.fields:
+            match |= Q(**{f'{field}__icontains': word})
+        queryset = queryset.filter(match)
+    return [(pk, 0.0) for pk in queryset.order_by('-pk').values_list('pk', flat=True)[:limit]]
+
+
+def ranked_ids(entity, term, limit=10):
+    """``[(id, rank)]`` of the best ``entity`` matches for ``term``, best first."""
+    terms = words(term)
+    if not terms:
+        return []
+    connection = _connection(entity)
+    if connection.vendor == 'postgresql':
+        return _search_postgresql(connection, entity, term.strip(), terms, limit)
+    if _has_fts(connection):
+        return _search_fts(connection, entity, terms, limit)
+    return _search_basic(entity, terms, limit)
+
+
+def _describe_items(item_type, ids):
+    resolved = items.resolve_items((item_type, pk) for pk in ids)
+    results = {}
+    for pk in ids:
+        item = resolved.get((item_type, pk))
+        if item:
+            results[pk] = {'id': pk, 'title': item.name, 'detail': item.detail}
+    return results
+
+
+def _describe_ledger(model, ids):
+    rows = model.objects.filter(pk__in=ids).values('id', 'category', 'description', 'amount', 'date')
+    return {
+        row['id']: {
+            'id': row['id'],
+            'title': row['category'],
+            'detail': row['description'] or '',
+            'amount': row['amount'],
+            'date': row['date'],
+        }
+        for row in rows
+    }
+
+
+def search(term, limit=10):
+    """
+    Ranked matches grouped by entity: ``{entity: [result, ...]}`` in
+    ``ENTITIES`` order, each result a dict with at least ``id``, ``title``,
+    ``detail`` and ``rank``.
+    """
+    groups = {}
+    for entity in ENTITIES:
+        ranked = ranked_ids(entity, term, limit)
+        ids = [pk for pk, _rank in ranked]
+        if entity == 'products':
+            described = _describe_items(items.PRODUCT, ids)
+        elif entity == 'raw_materials':
+            described = _describe_items(items.RAW_MATERIAL, ids)
+        else:
+            described = _describe_ledger(ENTITIES[entity].model, ids) if ids else {}
+        groups[entity] = [
+            {**described[pk], 'rank': round(float(rank), 4)} for pk, rank in ranked if pk in described
+        ]
+    return groups
+
+
+def stock_changes_filter(term):
+    """``Q`` for stock changes whose item label, type, category, quantity or creator contains ``term``."""
+    labelled = items.matching_item_ids(term)
+    user_ids = list(AuthUser.objects.filter(username__icontains=term).values_list('id', flat=True))
+    match = (
+        Q(item_type__iexact=items.PRODUCT, item_id__in=labelled[items.PRODUCT])
+        | Q(item_type__iexact=items.RAW_MATERIAL, item_id__in=labelled[items.RAW_MATERIAL])
+        | Q(created_by_admin_id__in=user_ids)
+    )
+    if connections[router.db_for_read(StockChanges)].vendor == 'postgresql':
+        return match | Q(RawSQL(f"{STOCK_CHANGE_DOC} ILIKE %s", [_like(term)], output_field=BooleanField()))
+    return (
+        match
+        | Q(category__icontains=term)
+        | Q(item_type__icontains=term)
+        | Q(IContains(Cast('quantity_change', CharField()), term))
+    )
+
+
+# SQLite FTS5 index. Rowids encode (item id, entity) so rows can be replaced by rowid.
+
+def _rowid(entity, pk):
+    return pk * len(ENTITIES) + list(ENTITIES).index(entity)
+
+
+def _item_id(rowid):
+    return rowid // len(ENTITIES)
+
+
+def _documents(entity, ids=None):
+    spec = ENTITIES[entity]
+    queryset = spec.model.objects.filter(**spec.filters)
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    for pk, *values in queryset.values_list('pk', *spec.fields).iterator(chunk_size=BATCH_SIZE):
+        yield _rowid(entity, pk), entity, ' '.join(value for value in values if value)
+
+
+def _insert(cursor, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            cursor.executemany(f"INSERT INTO {FTS_TABLE} (rowid, entity, body) VALUES (%s, %s, %s)", batch)
+            batch = []
+    if batch:
+        cursor.executemany(f"INSERT INTO {FTS_TABLE} (rowid, entity, body) VALUES (%s, %s, %s)", batch)
+
+
+def refresh(entity, ids):
+    """Re-index (or drop, when gone or archived) the given rows in the FTS5 table."""
+    ids = list(ids)
+    connection = connections['default']
+    if not ids or not _has_fts(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+            [(_rowid(entity, pk),) for pk in ids],
+        )
+        _insert(cursor, _documents(entity, ids))
+
+
+def changed(model, pk):
+    """Receiver-side entry point: ``model`` row ``pk`` was saved or deleted."""
+    if model in LABEL_MODELS:
+        entity, field = LABEL_MODELS[model]
+        ids = ENTITIES[entity].model.objects.filter(**{field: pk}).values_list('pk', flat=True)
+        refresh(entity, ids)
+        return
+    for entity, spec in ENTITIES.items():
+        if spec.model is model:
+            refresh(entity, [pk])
+
+
+def rebuild():
+    """Refill the FTS5 table from scratch; returns the number of rows indexed (None without FTS5)."""
+    connection = connections['default']
+    if not _has_fts(connection):
+        return None
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        for entity in ENTITIES:
+            _insert(cursor, _documents(entity))
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
@@ -0,0 +1,88 @@
+"""
+User session tracking.
+
+``UserSessions`` gets a row per login (keyed by the Django session key) from
+the ``user_logged_in``/``user_logged_out`` receivers in ``inventory.signals``,
+so ``user_activity`` can answer "who is online" and "when did they last log
+out" with one indexed query instead of decoding every ``django_session`` row.
+"""
+from datetime import timedelta
+
+from django.contrib.sessions.models import Session
+from django.db.models import Exists, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .models import AuthUser, UserSessions
+
+EXCLUDED_USERNAME_PREFIXES = ("deleted_", "inactive_", "rejected_")
+
+
+def record_login(request, user):
+    session_key = request.session.session_key
+    if not session_key:
+        return
+    UserSessions.objects.update_or_create(
+        session_key=session_key,
+        defaults={
+            'user_id': user.pk,
+            'login_at': timezone.now(),
+            'logout_at': None,
+            'expire_date': request.session.get_expiry_date(),
+        },
+    )
+
+
+def update_expiry(request):
+    """Sync the tracked expiry after the view changes it (e.g. "Remember Me")."""
+    session_key = request.session.session_key
+    if session_key:
+        UserSessions.objects.filter(session_key=session_key).update(
+            expire_date=request.session.get_expiry_date()
+        )
+
+
+def record_logout(request, user):
+    session_key = getattr(request, 'session', None) and request.session.session_key
+    if session_key:
+        UserSessions.objects.filter(session_key=session_key, logout_at__isnull=True).update(
+            logout_at=timezone.now()
+        )
+
+
+def user_activity_queryset():
+    """Users annotated with ``is_online`` and ``last_logout`` in a single query."""
+    now = timezone.now()
+    live_sessions = UserSessions.objects.filter(
+        user=OuterRef('pk'),
+        logout_at__isnull=True,
+        expire_date__gt=now,
+    ).filter(
+        # Rotated or flushed keys leave a tracker row behind without a session
+        Exists(Session.objects.filter(session_key=OuterRef('session_key'), expire_date__gt=now))
+    )
+    last_logout = (
+        UserSessions.objects.filter(user=OuterRef('pk'), logout_at__isnull=False)
+        .order_by('-logout_at')
+        .values('logout_at')[:1]
+    )
+    excluded = Q()
+    for prefix in EXCLUDED_USERNAME_PREFIXES:
+        excluded |= Q(username__istartswith=prefix)
+    return (
+        AuthUser.objects.exclude(excluded)
+        .annotate(is_online=Exists(live_sessions), last_logout=Subquery(last_logout))
+        .order_by('username')
+    )
+
+
+def purge_expired(keep_days=30):
+    """
+    Bulk-delete expired Django sessions and tracker rows that expired more
+    than ``keep_days`` ago. Returns ``(sessions_deleted, tracker_rows_deleted)``.
+    """
+    now = timezone.now()
+    sessions_deleted, _ = Session.objects.filter(expire_date__lt=now).delete()
+    tracker_deleted, _ = UserSessions.objects.filter(
+        expire_date__lt=now - timedelta(days=keep_days)
+    ).delete()
+    return sessions_deleted, tracker_deleted
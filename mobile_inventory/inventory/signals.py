@@ -0,0 +1,314 @@
+"""
+Signal receivers that keep derived tables in step with ORM/admin writes.
+
+Writes made outside Django (e.g. by the main system) do not fire these; the
+corresponding management commands rebuild the derived data for those.
+"""
+import logging
+
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import (
+    allocation,
+    counters,
+    items,
+    notifications,
+    reconciliation,
+    rollups,
+    search,
+    session_tracking,
+    snapshots,
+    sync,
+    timing,
+    versions,
+)
+from .models import (
+    Expenses,
+    HistoryLog,
+    HistoryLogTypes,
+    Notifications,
+    ProductBatches,
+    ProductInventory,
+    ProductRecipes,
+    Products,
+    ProductTypes,
+    ProductVariants,
+    RawMaterialBatches,
+    RawMaterialInventory,
+    RawMaterials,
+    Sales,
+    Sizes,
+    SizeUnits,
+    StockChanges,
+    UnitPrices,
+    Withdrawals,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _refresh_rollup_on_commit(months):
+    def refresh():
+        try:
+            rollups.refresh_months(months)
+        except Exception:
+            logger.exception(f"Failed to refresh monthly rollup for {sorted(months)}")
+    transaction.on_commit(refresh)
+
+
+@receiver(pre_save, sender=Sales)
+@receiver(pre_save, sender=Expenses)
+@receiver(pre_save, sender=Withdrawals)
+def remember_previous_financial_row(sender, instance, **kwargs):
+    """Stash the stored date/reason so an edit also refreshes the month it left."""
+    instance._rollup_previous = None
+    if instance.pk is None:
+        return
+    fields = ['date', 'reason'] if sender is Withdrawals else ['date']
+    instance._rollup_previous = sender.objects.filter(pk=instance.pk).values(*fields).first()
+
+
+@receiver(post_save, sender=Sales)
+@receiver(post_save, sender=Expenses)
+@receiver(post_delete, sender=Sales)
+@receiver(post_delete, sender=Expenses)
+def refresh_rollup_for_ledger_row(sender, instance, **kwargs):
+    months = {rollups.month_of(instance.date)}
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous and previous['date']:
+        months.add(rollups.month_of(previous['date']))
+    _refresh_rollup_on_commit(months)
+
+
+@receiver(post_save, sender=Withdrawals)
+@receiver(post_delete, sender=Withdrawals)
+def refresh_rollup_for_withdrawal(sender, instance, **kwargs):
+    previous = getattr(instance, '_rollup_previous', None)
+    months = set()
+    if instance.reason in rollups.LOSS_REASONS and instance.date:
+        months.add(rollups.month_of(instance.date))
+    if previous and previous['reason'] in rollups.LOSS_REASONS and previous['date']:
+        months.add(rollups.month_of(previous['date']))
+    if months:
+        _refresh_rollup_on_commit(months)
+
+
+@receiver(post_save, sender=Withdrawals)
+def allocate_withdrawal(sender, instance, created, **kwargs):
+    def run():
+        try:
+            if created:
+                allocation.allocate([instance])
+            else:
+                allocation.reallocate(instance)
+        except Exception:
+            logger.exception(f"Failed to allocate withdrawal {instance.pk} to batches")
+    transaction.on_commit(run)
+
+
+@receiver(post_delete, sender=Withdrawals)
+def release_withdrawal(sender, instance, **kwargs):
+    allocation.release(instance.pk)
+
+
+@receiver(pre_save, sender=StockChanges)
+def remember_previous_ledger_item(sender, instance, **kwargs):
+    instance._ledger_previous = None
+    if instance.pk is not None:
+        instance._ledger_previous = (
+            sender.objects.filter(pk=instance.pk).values_list('item_type', 'item_id', 'date').first()
+        )
+
+
+@receiver(post_save, sender=StockChanges)
+@receiver(post_delete, sender=StockChanges)
+def reset_ledger_checkpoint(sender, instance, created=False, **kwargs):
+    """An edited or deleted ledger row invalidates the checkpointed balance of its item(s)."""
+    if created:
+        return
+    reconciliation.reset_checkpoint(instance.item_type, instance.item_id)
+    previous = getattr(instance, '_ledger_previous', None)
+    if previous:
+        reconciliation.reset_checkpoint(previous[0], previous[1])
+
+
+@receiver(post_save, sender=StockChanges)
+@receiver(post_delete, sender=StockChanges)
+def invalidate_stock_snapshots(sender, instance, **kwargs):
+    """Snapshots taken after a changed (or back-dated) ledger row no longer hold."""
+    dates = [instance.date]
+    previous = getattr(instance, '_ledger_previous', None)
+    if previous:
+        dates.append(previous[2])
+    dates = [date for date in dates if date is not None]
+    if dates:
+        snapshots.invalidate_from(min(dates))
+
+
+@receiver(post_save, sender=Products)
+def reprice_product_losses(sender, instance, created, **kwargs):
+    if created:
+        return
+    transaction.on_commit(lambda: rollups.refresh_item_loss_months('PRODUCT', [instance.pk]))
+
+
+@receiver(post_save, sender=RawMaterials)
+def reprice_raw_material_losses(sender, instance, created, **kwargs):
+    if created:
+        return
+    transaction.on_commit(lambda: rollups.refresh_item_loss_months('RAW_MATERIAL', [instance.pk]))
+
+
+@receiver(post_save, sender=UnitPrices)
+def reprice_unit_price_losses(sender, instance, created, **kwargs):
+    if created:
+        return
+    product_ids = list(Products.objects.filter(unit_price=instance).values_list('id', flat=True))
+    if product_ids:
+        transaction.on_commit(lambda: rollups.refresh_item_loss_months('PRODUCT', product_ids))
+
+
+COUNTED_MODELS = {
+    Sales: 'sales_count',
+    Expenses: 'expense_count',
+    HistoryLog: 'log_count',
+}
+
+
+@receiver(post_save, sender=Sales)
+@receiver(post_save, sender=Expenses)
+@receiver(post_save, sender=HistoryLog)
+def count_created_row(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: counters.invalidate(COUNTED_MODELS[sender]))
+
+
+@receiver(post_delete, sender=Sales)
+@receiver(post_delete, sender=Expenses)
+@receiver(post_delete, sender=HistoryLog)
+def count_deleted_row(sender, instance, **kwargs):
+    transaction.on_commit(lambda: counters.invalidate(COUNTED_MODELS[sender]))
+
+
+@receiver(post_save, sender=ProductInventory)
+@receiver(post_delete, sender=ProductInventory)
+@receiver(post_save, sender=Products)
+@receiver(post_delete, sender=Products)
+def invalidate_product_count(sender, instance, **kwargs):
+    # Archiving a product changes the count without touching its inventory row
+    transaction.on_commit(lambda: counters.invalidate('product_count'))
+
+
+@receiver(post_save, sender=RawMaterialInventory)
+@receiver(post_delete, sender=RawMaterialInventory)
+@receiver(post_save, sender=RawMaterials)
+@receiver(post_delete, sender=RawMaterials)
+def invalidate_raw_count(sender, instance, **kwargs):
+    transaction.on_commit(lambda: counters.invalidate('raw_count'))
+
+
+@receiver(post_save, sender=ProductInventory)
+def notify_low_product_stock(sender, instance, **kwargs):
+    transaction.on_commit(lambda: notifications.generate(product_ids=[instance.pk], material_ids=[]))
+
+
+@receiver(post_save, sender=RawMaterialInventory)
+def notify_low_raw_stock(sender, instance, **kwargs):
+    transaction.on_commit(lambda: notifications.generate(product_ids=[], material_ids=[instance.pk]))
+
+
+@receiver(post_save, sender=Notifications)
+@receiver(post_delete, sender=Notifications)
+def invalidate_unread_count(sender, instance, **kwargs):
+    transaction.on_commit(lambda: counters.invalidate('unread_notifications'))
+
+
+@receiver(user_logged_in)
+def track_login(sender, request, user, **kwargs):
+    session_tracking.record_login(request, user)
+
+
+@receiver(user_logged_out)
+def track_logout(sender, request, user, **kwargs):
+    session_tracking.record_logout(request, user)
+
+
+@receiver(post_save, sender=Products)
+@receiver(post_delete, sender=Products)
+@receiver(post_save, sender=RawMaterials)
+@receiver(post_delete, sender=RawMaterials)
+@receiver(post_save, sender=ProductTypes)
+@receiver(post_delete, sender=ProductTypes)
+@receiver(post_save, sender=ProductVariants)
+@receiver(post_delete, sender=ProductVariants)
+@receiver(post_save, sender=Sizes)
+@receiver(post_delete, sender=Sizes)
+@receiver(post_save, sender=SizeUnits)
+@receiver(post_delete, sender=SizeUnits)
+@receiver(post_save, sender=UnitPrices)
+@receiver(post_delete, sender=UnitPrices)
+def invalidate_item_cache(sender, instance, **kwargs):
+    transaction.on_commit(items.bump_version)
+
+
+# Tables whose data-version stamp feeds the JSON API ETags and the page cache
+VERSIONED_MODELS = (
+    ProductInventory,
+    RawMaterialInventory,
+    Products,
+    RawMaterials,
+    Sales,
+    Expenses,
+    StockChanges,
+    HistoryLog,
+    HistoryLogTypes,
+    ProductRecipes,
+    SizeUnits,
+    ProductBatches,
+    RawMaterialBatches,
+    UnitPrices,
+    Withdrawals,
+)
+
+
+def bump_data_version(sender, **kwargs):
+    transaction.on_commit(lambda: versions.bump(sender))
+
+
+for _model in VERSIONED_MODELS:
+    post_save.connect(bump_data_version, sender=_model, dispatch_uid=f"data-version-save-{_model.__name__}")
+    post_delete.connect(bump_data_version, sender=_model, dispatch_uid=f"data-version-delete-{_model.__name__}")
+
+
+def record_sync_update(sender, instance, created, **kwargs):
+    # Inserts reach the replica through the id high-water mark
+    if not created:
+        sync.record_change(sender, instance.pk, 'upsert')
+
+
+def record_sync_delete(sender, instance, **kwargs):
+    sync.record_change(sender, instance.pk, 'delete')
+
+
+for _model in sync.SYNCED_MODELS.values():
+    post_save.connect(record_sync_update, sender=_model, dispatch_uid=f"sync-save-{_model.__name__}")
+    post_delete.connect(record_sync_delete, sender=_model, dispatch_uid=f"sync-delete-{_model.__name__}")
+
+
+def refresh_search_index(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: search.changed(sender, pk))
+
+
+# Keeps the SQLite FTS5 search table current (a no-op on PostgreSQL)
+for _model in (*(entity.model for entity in search.ENTITIES.values()), *search.LABEL_MODELS):
+    post_save.connect(refresh_search_index, sender=_model, dispatch_uid=f"search-save-{_model.__name__}")
+    post_delete.connect(refresh_search_index, sender=_model, dispatch_uid=f"search-delete-{_model.__name__}")
+
+
+# Per-request SQL timing (inventory.timing) on every connection, in every thread
+connection_created.connect(timing.install_sql_hook, dispatch_uid="timing-sql-hook")
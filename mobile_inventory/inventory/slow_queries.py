@@ -0,0 +1,127 @@
+"""
+Slow-query recorder.
+
+``timing.sql_hook`` (the ``execute_wrapper`` hook installed for every
+request) passes statements that took ``SLOW_QUERY_MS`` or longer to
+``record``. Each one is written as a JSON line to the ``inventory.slow_queries``
+logger, which settings route to a rotating file (``SLOW_QUERY_LOG``). The
+line holds the URL name, a fingerprint of the normalized SQL (literals and
+placeholder lists collapsed, so the same query with other parameters
+groups together) and the duration.
+
+For a ``SLOW_QUERY_EXPLAIN_RATE`` sample of slow SELECTs, the plan is also
+captured with a plain ``EXPLAIN``. The statement is not run again. The
+EXPLAIN runs in a savepoint, and at most once per fingerprint per process
+every ``EXPLAIN_INTERVAL`` seconds. The ``slow_queries`` command ranks the
+recorded fingerprints by total time.
+"""
+import glob
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN_INTERVAL = 600
+MAX_SQL_LENGTH = 4000
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_READ = re.compile(r'^\s*(?:SELECT|WITH)\b', re.IGNORECASE)
+
+_explained = {}
+_explained_lock = threading.Lock()
+
+
+def threshold():
+    """Slow-query threshold in seconds."""
+    return getattr(settings, 'SLOW_QUERY_MS', 200) / 1000
+
+
+def normalize(sql):
+    text = _WHITESPACE.sub(' ', sql).strip()
+    text = _STRING.sub('?', text).replace('%s', '?')
+    text = _NUMBER.sub('?', text)
+    return _PLACEHOLDER_LIST.sub('(?, ...)', text)
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+def _should_explain(digest, sql, many):
+    if many or not _READ.match(sql):
+        return False
+    if random.random() >= getattr(settings, 'SLOW_QUERY_EXPLAIN_RATE', 0.1):
+        return False
+    now = time.monotonic()
+    with _explained_lock:
+        if now - _explained.get(digest, -EXPLAIN_INTERVAL) < EXPLAIN_INTERVAL:
+            return False
+        _explained[digest] = now
+    return True
+
+
+def explain(connection, sql, params):
+    """Plan of ``sql`` as text, or None if the database refused to explain it."""
+    # Run outside the execute wrappers so the EXPLAIN is neither timed nor recorded
+    wrappers, connection.execute_wrappers = connection.execute_wrappers, []
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+                rows = cursor.fetchall()
+    except DatabaseError:
+        return None
+    finally:
+        connection.execute_wrappers = wrappers
+    return '\n'.join(' '.join(str(column) for column in row) for row in rows)
+
+
+def record(sql, params, many, seconds, connection, url_name):
+    normalized = normalize(sql)
+    digest = fingerprint(normalized)
+    entry = {
+        'at': timezone.now().isoformat(),
+        'url_name': url_name,
+        'fingerprint': digest,
+        'duration_ms': round(seconds * 1000, 1),
+        'database': connection.alias,
+        'sql': normalized[:MAX_SQL_LENGTH],
+    }
+    if _should_explain(digest, sql, many):
+        entry['plan'] = explain(connection, sql, params)
+    logger.info(json.dumps(entry))
+
+
+def log_files():
+    """The slow-query log and its rotated backups, oldest first."""
+    path = getattr(settings, 'SLOW_QUERY_LOG', None)
+    if not path:
+        return []
+    backups = [name for name in glob.glob(f"{glob.escape(path)}.*") if name.rsplit('.', 1)[1].isdigit()]
+    backups.sort(key=lambda name: int(name.rsplit('.', 1)[1]), reverse=True)
+    return backups + [path]
+
+
+def read_entries(paths=None):
+    for path in paths if paths is not None else log_files():
+        try:
+            with open(path, encoding='utf-8') as handle:
+                for line in handle:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except OSError:
+            continue
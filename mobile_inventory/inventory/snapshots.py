@@ -0,0 +1,141 @@
+"""
+Point-in-time stock from the ``StockChanges`` ledger.
+
+``stock_as_of`` starts from the ``StockSnapshot`` nearest to the requested
+time and replays only the ledger rows dated between the two, adding them
+when the snapshot is earlier and subtracting them when it is later. That is
+one snapshot read plus one grouped range query over ``(date, id)``,
+whatever the age of the ledger. ``take`` stores a snapshot and is run on a
+schedule by the ``snapshot_stock`` command.
+
+Quantities are ledger balances, the same figures ``reconcile_inventory``
+compares stored totals with. Values use today's prices (product unit price,
+raw material price per unit), since prices are not versioned. Editing,
+deleting or back-dating ledger rows through Django drops the snapshots
+those rows would change (``inventory.signals``).
+"""
+from collections import defaultdict, namedtuple
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max, Min, Sum
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import items
+from .models import ProductInventory, RawMaterialInventory, StockChanges, StockSnapshot
+
+StockLine = namedtuple('StockLine', ['item_type', 'item_id', 'label', 'quantity', 'unit_price', 'value'])
+StockAsOf = namedtuple('StockAsOf', ['at', 'snapshot_at', 'lines', 'total_value'])
+
+
+def parse_at(value):
+    """
+    Parse YYYY-MM-DD (end of that day, local time) or an ISO datetime into an
+    aware datetime; raises ValueError when malformed.
+    """
+    value = (value or '').strip()
+    day = parse_date(value) if len(value) == 10 else None
+    if day:
+        return timezone.make_aware(datetime.combine(day, time.max))
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(f"Invalid date/time '{value}'")
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+
+def _ledger_sums(start=None, end=None):
+    """{(item_type, item_id): sum of quantity_change} for rows dated in (start, end]."""
+    changes = StockChanges.objects.annotate(normalized_type=Lower('item_type')).filter(
+        normalized_type__in=[items.PRODUCT, items.RAW_MATERIAL],
+    )
+    if start is not None:
+        changes = changes.filter(date__gt=start)
+    if end is not None:
+        changes = changes.filter(date__lte=end)
+    rows = changes.values('normalized_type', 'item_id').annotate(total=Sum('quantity_change')).order_by()
+    return {(row['normalized_type'], row['item_id']): row['total'] or Decimal('0') for row in rows}
+
+
+def nearest_snapshot(at):
+    """``taken_at`` of the snapshot closest in time to ``at``, or None."""
+    before = StockSnapshot.objects.filter(taken_at__lte=at).aggregate(taken_at=Max('taken_at'))['taken_at']
+    after = StockSnapshot.objects.filter(taken_at__gt=at).aggregate(taken_at=Min('taken_at'))['taken_at']
+    if before is None or after is None:
+        return before or after
+    return before if at - before <= after - at else after
+
+
+def balances_as_of(at):
+    """Return ``(snapshot_at, {(item_type, item_id): quantity})`` for time ``at``."""
+    snapshot_at = nearest_snapshot(at)
+    if snapshot_at is None:
+        return None, _ledger_sums(end=at)
+
+    balances = defaultdict(Decimal)
+    for item_type, item_id, quantity in StockSnapshot.objects.filter(taken_at=snapshot_at).values_list(
+        'item_type', 'item_id', 'quantity',
+    ):
+        balances[(item_type, item_id)] = quantity
+    if snapshot_at <= at:
+        for ref, total in _ledger_sums(start=snapshot_at, end=at).items():
+            balances[ref] += total
+    else:
+        for ref, total in _ledger_sums(start=at, end=snapshot_at).items():
+            balances[ref] -= total
+    return snapshot_at, dict(balances)
+
+
+def stock_as_of(at):
+    """Quantity and value of every stocked item at ``at`` (an aware datetime)."""
+    snapshot_at, balances = balances_as_of(at)
+    refs = set(balances)
+    refs.update((items.PRODUCT, pk) for pk in ProductInventory.objects.values_list('product_id', flat=True))
+    refs.update((items.RAW_MATERIAL, pk) for pk in RawMaterialInventory.objects.values_list('material_id', flat=True))
+
+    resolved = items.resolve_items(refs)
+    lines = []
+    total_value = Decimal('0')
+    for item_type, item_id in refs:
+        quantity = balances.get((item_type, item_id), Decimal('0'))
+        item = resolved.get((item_type, item_id))
+        price = item.price if item else None
+        value = quantity * price if price is not None else None
+        if value is not None:
+            total_value += value
+        lines.append(StockLine(
+            item_type, item_id,
+            item.label if item else items.missing_label(item_type, item_id),
+            quantity, price, value,
+        ))
+    lines.sort(key=lambda line: (line.item_type != items.PRODUCT, line.label))
+    return StockAsOf(at, snapshot_at, lines, total_value)
+
+
+def take(at):
+    """
+    Store the ledger balance of every item at ``at``; returns the number of rows
+    written. Raises ValueError for a future ``at``: ledger rows added later with
+    an earlier date (bulk intake, the main system) would be missing from it.
+    """
+    if at > timezone.now():
+        raise ValueError("Cannot take a snapshot in the future")
+    _snapshot_at, balances = balances_as_of(at)
+    with transaction.atomic():
+        StockSnapshot.objects.filter(taken_at=at).delete()
+        StockSnapshot.objects.bulk_create(
+            [
+                StockSnapshot(taken_at=at, item_type=item_type, item_id=item_id, quantity=quantity)
+                for (item_type, item_id), quantity in balances.items()
+            ],
+            batch_size=1000,
+        )
+    return len(balances)
+
+
+def invalidate_from(date):
+    """Drop snapshots that a ledger change dated ``date`` would alter."""
+    if date is not None:
+        StockSnapshot.objects.filter(taken_at__gte=date).delete()
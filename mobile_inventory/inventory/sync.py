@@ -0,0 +1,229 @@
+"""
+Delta sync for the service worker's offline replica.
+
+A sync token records, per table, the highest primary key already sent plus
+the last ``SyncChanges`` entry applied. ``build_delta`` returns what changed
+after a token, capped at ``limit`` rows per call (``has_more`` asks the
+client to call again):
+
+* rows whose id is above the table's high-water mark (inserts, including
+  those made outside Django),
+* inventory rows of every item touched by newly seen stock changes or
+  withdrawals (the main system updates totals alongside those), and
+* rows updated or deleted through the ORM/admin, recorded in ``SyncChanges``
+  by ``inventory.signals``.
+
+A row whose transaction commits after a higher id was already synced can be
+missed until it is touched again; the replica treats the server as the
+source of truth and can always be rebuilt with an empty token.
+
+``purge`` deletes ``SyncChanges`` entries older than ``keep_days`` (the
+``purge_sync_changes`` command), always keeping the newest one. A token
+whose ``seq`` is below the oldest entry left may have missed purged
+entries, so it starts over like an invalid token. Starting over from
+scratch answers with ``reset`` set, so the client clears its replica before
+applying the delta. A full load doesn't replay the change log: it reads
+every row as it is now.
+"""
+import base64
+import binascii
+import json
+from datetime import timedelta
+
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from . import items
+from .models import (
+    Expenses,
+    ProductInventory,
+    RawMaterialInventory,
+    Sales,
+    StockChanges,
+    SyncChanges,
+    Withdrawals,
+)
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+
+# Append-mostly tables synced by id high-water mark, in transfer order
+LEDGERS = {
+    'stock_changes': (
+        StockChanges,
+        ['id', 'item_type', 'item_id', 'quantity_change', 'category', 'date'],
+    ),
+    'withdrawals': (
+        Withdrawals,
+        ['id', 'item_type', 'item_id', 'quantity', 'custom_price', 'reason', 'date', 'is_archived'],
+    ),
+    'sales': (Sales, ['id', 'category', 'amount', 'date', 'description']),
+    'expenses': (Expenses, ['id', 'category', 'amount', 'date', 'description']),
+}
+
+INVENTORIES = {
+    'product_inventory': (
+        ProductInventory, items.PRODUCT,
+        ['product_id', 'name', 'total_stock', 'restock_threshold'],
+    ),
+    'raw_material_inventory': (
+        RawMaterialInventory, items.RAW_MATERIAL,
+        ['material_id', 'name', 'total_stock', 'reorder_threshold'],
+    ),
+}
+
+SYNCED_MODELS = {
+    **{name: model for name, (model, _columns) in LEDGERS.items()},
+    **{name: model for name, (model, _type, _columns) in INVENTORIES.items()},
+}
+
+
+def encode_token(state):
+    raw = json.dumps(state, separators=(',', ':'), sort_keys=True).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_token(token):
+    """Return the token state, or a fresh state for a missing/invalid token."""
+    state = {'seq': 0, 'hwm': {}}
+    if not token:
+        return state
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode((token + '=' * (-len(token) % 4)).encode()))
+        state['seq'] = int(decoded.get('seq', 0))
+        state['hwm'] = {name: int(value) for name, value in decoded.get('hwm', {}).items()}
+    except (ValueError, TypeError, AttributeError, binascii.Error):
+        return {'seq': 0, 'hwm': {}}
+    return state
+
+
+def _restart(token, state):
+    """Whether ``state`` (decoded from ``token``) must be replaced by a full load."""
+    if not state['seq'] and not state['hwm']:
+        # No token, an invalid one, or a load that hadn't started yet
+        return bool(token)
+    oldest = SyncChanges.objects.aggregate(oldest=Min('id'))['oldest']
+    return oldest is not None and state['seq'] < oldest - 1
+
+
+def purge(keep_days=30):
+    """Delete change entries older than ``keep_days``, except the newest. Returns how many."""
+    cutoff = timezone.now() - timedelta(days=keep_days)
+    newest = SyncChanges.objects.aggregate(newest=Max('id'))['newest']
+    if newest is None:
+        return 0
+    deleted, _ = SyncChanges.objects.filter(changed_at__lt=cutoff, id__lt=newest).delete()
+    return deleted
+
+
+def record_change(model, object_id, op):
+    table = model._meta.db_table
+    if table in SYNCED_MODELS:
+        SyncChanges.objects.create(table_name=table, object_id=object_id, op=op)
+
+
+def _inventory_rows(name, ids):
+    model, item_type, columns = INVENTORIES[name]
+    key, _label, total, threshold = columns
+    rows = list(model.objects.filter(pk__in=ids).values_list(key, total, threshold))
+    resolved = items.resolve_items((item_type, row[0]) for row in rows)
+    result = []
+    for pk, total_stock, threshold_value in rows:
+        item = resolved.get((item_type, pk))
+        label = item.label if item else items.missing_label(item_type, pk)
+        result.append([pk, label, total_stock, threshold_value])
+    return result
+
+
+def build_delta(token, limit=DEFAULT_LIMIT):
+    state = decode_token(token)
+    reset = _restart(token, state)
+    if reset or not token:
+        state = {'seq': SyncChanges.objects.aggregate(newest=Max('id'))['newest'] or 0, 'hwm': {}}
+    hwm = state['hwm']
+    budget = limit
+    has_more = False
+    upserts = {}
+    deletes = {}
+    touched = {name: set() for name in INVENTORIES}
+
+    for name, (model, columns) in LEDGERS.items():
+        if budget <= 0:
+            has_more = True
+            break
+        rows = list(
+            model.objects.filter(id__gt=hwm.get(name, 0)).order_by('id').values_list(*columns)[:budget]
+        )
+        if not rows:
+            continue
+        if len(rows) == budget:
+            has_more = True
+        budget -= len(rows)
+        upserts[name] = rows
+        hwm[name] = rows[-1][0]
+        if name in ('stock_changes', 'withdrawals'):
+            for row in rows:
+                item_type = items.normalize_item_type(row[1])
+                if item_type == items.PRODUCT:
+                    touched['product_inventory'].add(row[2])
+                elif item_type == items.RAW_MATERIAL:
+                    touched['raw_material_inventory'].add(row[2])
+
+    # Newly inserted inventory rows (pk order follows product/material ids)
+    for name, (model, _type, _columns) in INVENTORIES.items():
+        pk = model._meta.pk.attname
+        new_ids = list(
+            model.objects.filter(pk__gt=hwm.get(name, 0)).order_by(pk).values_list(pk, flat=True)[:limit]
+        )
+        if new_ids:
+            touched[name].update(new_ids)
+            hwm[name] = new_ids[-1]
+            if len(new_ids) == limit:
+                has_more = True
+
+    changes = list(
+        SyncChanges.objects.filter(id__gt=state['seq']).order_by('id')
+        .values_list('id', 'table_name', 'object_id', 'op')[:limit]
+    )
+    if changes:
+        state['seq'] = changes[-1][0]
+        if len(changes) == limit:
+            has_more = True
+    changed = {}
+    for _seq, table, object_id, op in changes:
+        # Later entries win: an upsert followed by a delete ends as a delete
+        changed.setdefault(table, {})[object_id] = op
+    for table, ops in changed.items():
+        if table in INVENTORIES:
+            touched[table].update(object_id for object_id, op in ops.items() if op == 'upsert')
+            deletes[table] = [object_id for object_id, op in ops.items() if op == 'delete']
+            continue
+        if table not in LEDGERS:
+            continue
+        model, columns = LEDGERS[table]
+        upsert_ids = [object_id for object_id, op in ops.items() if op == 'upsert']
+        rows = list(model.objects.filter(id__in=upsert_ids).values_list(*columns))
+        found = {row[0] for row in rows}
+        upserts.setdefault(table, []).extend(rows)
+        deletes[table] = [object_id for object_id, op in ops.items() if op == 'delete']
+        # An update to a row that has since vanished is a delete for the replica
+        deletes[table].extend(object_id for object_id in upsert_ids if object_id not in found)
+
+    for name, ids in touched.items():
+        if not ids:
+            continue
+        rows = _inventory_rows(name, ids)
+        upserts.setdefault(name, []).extend(rows)
+        found = {row[0] for row in rows}
+        deletes.setdefault(name, []).extend(pk for pk in ids if pk not in found)
+
+    state['hwm'] = hwm
+    columns = {name: spec[-1] for name, spec in {**LEDGERS, **INVENTORIES}.items() if name in upserts}
+    return {
+        'token': encode_token(state),
+        'reset': reset,
+        'has_more': has_more,
+        'columns': columns,
+        'upserts': upserts,
+        'deletes': {name: ids for name, ids in deletes.items() if ids},
+    }
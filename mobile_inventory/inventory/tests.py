@@ -0,0 +1,558 @@
+import base64
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import allocation, benchmark, exports, intake, pagination, rollups, snapshots, sync, versions
+from .models import (
+    AuthUser,
+    BatchAllocation,
+    Expenses,
+    MonthlyFinancialRollup,
+    ProductBatches,
+    ProductInventory,
+    Products,
+    ProductTypes,
+    ProductVariants,
+    RawMaterialBatches,
+    RawMaterialInventory,
+    RawMaterials,
+    Sales,
+    Sizes,
+    SizeUnits,
+    SrpPrices,
+    StockChanges,
+    StockSnapshot,
+    SyncChanges,
+    UnitPrices,
+    Withdrawals,
+)
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'pages': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-pages'},
+}
+
+
+@override_settings(CACHES=TEST_CACHES, METRICS_DIR='')
+class InventoryTestCase(TestCase):
+    """
+    The inventory tables are unmanaged (created by the main system), so they
+    are created here in the test database, outside the per-class transaction.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        benchmark.create_unmanaged_tables()
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_superuser('tester', 'tester@example.com', 'tester')
+        cls.author = AuthUser.objects.get(pk=user.pk)
+        grams = SizeUnits.objects.create(unit_name='g', created_by_admin=cls.author)
+        kilos = SizeUnits.objects.create(unit_name='kg', created_by_admin=cls.author)
+        cls.product = Products.objects.create(
+            product_type=ProductTypes.objects.create(name='Polvoron', created_by_admin=cls.author),
+            variant=ProductVariants.objects.create(name='Classic', created_by_admin=cls.author),
+            size=Sizes.objects.create(size_label='250', created_by_admin=cls.author),
+            size_unit=grams,
+            unit_price=UnitPrices.objects.create(unit_price=Decimal('50'), created_by_admin=cls.author),
+            srp_price=SrpPrices.objects.create(srp_price=Decimal('60'), created_by_admin=cls.author),
+            created_by_admin=cls.author, is_archived=False,
+        )
+        ProductInventory.objects.create(product=cls.product, total_stock=Decimal('0'), restock_threshold=Decimal('5'))
+        cls.material = RawMaterials.objects.create(
+            name='Flour', size=Decimal('25'), unit=kilos, price_per_unit=Decimal('900'),
+            created_by_admin=cls.author, is_archived=False,
+        )
+        RawMaterialInventory.objects.create(
+            material=cls.material, total_stock=Decimal('0'), reorder_threshold=Decimal('2'),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def product_batch(self, quantity, expires, arrived=None):
+        arrived = arrived or timezone.localdate() - timedelta(days=30)
+        return ProductBatches.objects.create(
+            batch_date=arrived, product=self.product, quantity=quantity, manufactured_date=arrived,
+            expiration_date=expires, created_by_admin=self.author,
+        )
+
+    def material_batch(self, quantity, expires, arrived=None):
+        arrived = arrived or timezone.localdate() - timedelta(days=30)
+        return RawMaterialBatches.objects.create(
+            batch_date=arrived, material=self.material, quantity=Decimal(quantity), received_date=arrived,
+            expiration_date=expires, created_by_admin=self.author,
+        )
+
+    def withdraw(self, item, quantity, reason='SOLD', days_ago=0):
+        withdrawal = Withdrawals.objects.create(
+            item_type='PRODUCT' if isinstance(item, Products) else 'RAW_MATERIAL', item_id=item.pk,
+            quantity=Decimal(quantity), reason=reason, created_by_admin=self.author, is_archived=False,
+        )
+        if days_ago:
+            # ``date`` is auto_now_add, so back-date the row after inserting it
+            Withdrawals.objects.filter(pk=withdrawal.pk).update(date=timezone.now() - timedelta(days=days_ago))
+            withdrawal.refresh_from_db()
+        return withdrawal
+
+
+class AllocationTests(InventoryTestCase):
+    def splits(self, withdrawal):
+        return list(
+            BatchAllocation.objects.filter(withdrawal_id=withdrawal.pk)
+            .order_by('id')
+            .values_list('batch_id', 'quantity')
+        )
+
+    def test_earliest_expiry_first_with_undated_batches_last(self):
+        today = timezone.localdate()
+        undated = self.material_batch(10, None)
+        late = self.material_batch(10, today + timedelta(days=60))
+        early = self.material_batch(10, today + timedelta(days=10))
+        withdrawal = self.withdraw(self.material, 25)
+
+        self.assertEqual(allocation.allocate([withdrawal]), 3)
+        self.assertEqual(self.splits(withdrawal), [(early.pk, 10), (late.pk, 10), (undated.pk, 5)])
+
+    def test_batches_arriving_after_the_withdrawal_are_skipped(self):
+        today = timezone.localdate()
+        older = self.product_batch(5, today + timedelta(days=90), arrived=today - timedelta(days=20))
+        self.product_batch(50, today + timedelta(days=10), arrived=today - timedelta(days=5))
+        withdrawal = self.withdraw(self.product, 4, days_ago=10)
+
+        allocation.allocate([withdrawal])
+        self.assertEqual(self.splits(withdrawal), [(older.pk, 4)])
+
+    def test_uncovered_remainder_when_stock_runs_out(self):
+        batch = self.product_batch(3, timezone.localdate() + timedelta(days=30))
+        withdrawal = self.withdraw(self.product, 5)
+
+        allocation.allocate([withdrawal])
+        self.assertEqual(self.splits(withdrawal), [(batch.pk, 3), (None, 2)])
+        # Already allocated withdrawals are left alone
+        self.assertEqual(allocation.allocate([withdrawal]), 0)
+
+    def test_quantity_edit_reallocates(self):
+        first = self.product_batch(5, timezone.localdate() + timedelta(days=10))
+        second = self.product_batch(5, timezone.localdate() + timedelta(days=20))
+        with self.captureOnCommitCallbacks(execute=True):
+            withdrawal = self.withdraw(self.product, 3)
+        self.assertEqual(self.splits(withdrawal), [(first.pk, 3)])
+
+        withdrawal.quantity = Decimal('7')
+        with self.captureOnCommitCallbacks(execute=True):
+            withdrawal.save()
+        self.assertEqual(self.splits(withdrawal), [(first.pk, 5), (second.pk, 2)])
+
+    def test_delete_releases_the_allocation(self):
+        batch = self.product_batch(5, timezone.localdate() + timedelta(days=10))
+        with self.captureOnCommitCallbacks(execute=True):
+            withdrawal = self.withdraw(self.product, 5)
+        withdrawal_id = withdrawal.pk
+        self.assertEqual(self.splits(withdrawal), [(batch.pk, 5)])
+
+        withdrawal.delete()
+        self.assertFalse(BatchAllocation.objects.filter(withdrawal_id=withdrawal_id).exists())
+        # The batch is open again for the next withdrawal
+        other = self.withdraw(self.product, 2)
+        allocation.allocate([other])
+        self.assertEqual(self.splits(other), [(batch.pk, 2)])
+
+
+class MonthlyRollupTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        tz = timezone.get_current_timezone()
+        this_month = rollups.month_of(timezone.localdate())
+        last_month = rollups.month_of(this_month - timedelta(days=1))
+        older = rollups.month_of(last_month - timedelta(days=1))
+        # First and last local minute of each month, which UTC puts in a different month
+        self.moments = []
+        for month in (older, last_month, this_month):
+            start, end = rollups.month_bounds(month)
+            self.moments += [start.astimezone(tz), end.astimezone(tz) - timedelta(minutes=1)]
+        self.moments = [moment for moment in self.moments if moment <= timezone.now()]
+        self.months = (older, last_month, this_month)
+
+        for i, moment in enumerate(self.moments):
+            Sales.objects.create(
+                category='Retail', amount=Decimal(100 + i), date=moment, created_by_admin=self.author,
+            )
+            Expenses.objects.create(
+                category='Rent', amount=Decimal(40 + i), date=moment, created_by_admin=self.author,
+            )
+            for reason, custom_price in (('EXPIRED', None), ('DAMAGED', Decimal('7')), ('SOLD', None)):
+                withdrawal = self.withdraw(self.product, 2, reason=reason)
+                Withdrawals.objects.filter(pk=withdrawal.pk).update(date=moment, custom_price=custom_price)
+            withdrawal = self.withdraw(self.material, 1, reason='DAMAGED')
+            Withdrawals.objects.filter(pk=withdrawal.pk).update(date=moment)
+
+    def live_totals(self):
+        """The report's computation before the rollup: everything from the ledgers, priced in Python."""
+        tz = timezone.get_current_timezone()
+        totals = {}
+
+        def add(month, field, amount):
+            month = month.date() if hasattr(month, 'date') else month
+            row = totals.setdefault(month, {
+                'total_sales': Decimal('0'), 'total_expenses': Decimal('0'), 'total_loss': Decimal('0'),
+            })
+            row[field] += amount
+
+        for model, field in ((Sales, 'total_sales'), (Expenses, 'total_expenses')):
+            rows = model.objects.annotate(month=TruncMonth('date', tzinfo=tz)).values('month').annotate(total=Sum('amount'))
+            for row in rows:
+                add(row['month'], field, row['total'])
+        prices = {
+            'PRODUCT': {self.product.pk: Decimal('50')},
+            'RAW_MATERIAL': {self.material.pk: Decimal('900')},
+        }
+        losses = (
+            Withdrawals.objects.filter(reason__in=rollups.LOSS_REASONS, is_archived=False)
+            .annotate(month=TruncMonth('date', tzinfo=tz))
+            .values('month', 'item_type', 'item_id', 'quantity', 'custom_price')
+        )
+        for row in losses:
+            price = row['custom_price'] if row['custom_price'] is not None else prices[row['item_type']][row['item_id']]
+            add(row['month'], 'total_loss', row['quantity'] * price)
+        return totals
+
+    def stored(self):
+        return {
+            row.pop('month'): row
+            for row in MonthlyFinancialRollup.objects.values('month', 'total_sales', 'total_expenses', 'total_loss')
+        }
+
+    def test_refresh_months_matches_live_totals(self):
+        rollups.refresh_months(self.months)
+        self.assertEqual(self.stored(), self.live_totals())
+
+    def test_refresh_recent_covers_current_and_previous_month(self):
+        self.assertTrue(rollups.refresh_recent())
+        live = self.live_totals()
+        self.assertEqual(self.stored(), {month: live[month] for month in self.months[1:] if month in live})
+        # Within the TTL nothing is recomputed, even when the ledgers changed outside Django
+        Sales.objects.filter(date__gte=rollups.month_bounds(self.months[2])[0]).update(amount=Decimal('1'))
+        self.assertFalse(rollups.refresh_recent())
+        cache.delete(rollups.FRESH_KEY)
+        self.assertTrue(rollups.refresh_recent())
+        self.assertEqual(self.stored()[self.months[2]], self.live_totals()[self.months[2]])
+
+    def test_rebuild_matches_live_totals(self):
+        self.assertEqual(rollups.rebuild(), len(self.live_totals()))
+        self.assertEqual(self.stored(), self.live_totals())
+
+
+class IntakeTests(InventoryTestCase):
+    def test_invalid_line_writes_nothing(self):
+        lines = [
+            {'item_type': 'product', 'item_id': self.product.pk, 'quantity': '5',
+             'manufactured_date': '2026-01-01', 'expiration_date': '2026-12-01'},
+            {'item_type': 'raw_material', 'item_id': self.material.pk, 'quantity': '-1'},
+            {'item_type': 'product', 'item_id': 999999, 'quantity': '1',
+             'manufactured_date': '2026-01-01', 'expiration_date': '2026-12-01'},
+        ]
+        with self.assertRaises(intake.IntakeError) as raised:
+            intake.receive(lines, self.author)
+        self.assertEqual(raised.exception.errors, ["Line 2: quantity must be a positive number"])
+        lines.pop(1)
+        with self.assertRaises(intake.IntakeError) as raised:
+            intake.receive(lines, self.author)
+        self.assertEqual(raised.exception.errors, ["Line 2: unknown or archived product 999999"])
+
+        self.assertFalse(ProductBatches.objects.exists())
+        self.assertFalse(RawMaterialBatches.objects.exists())
+        self.assertFalse(StockChanges.objects.exists())
+        self.assertEqual(ProductInventory.objects.get(pk=self.product.pk).total_stock, 0)
+
+    def test_deltas_are_summed_per_item_and_missing_inventory_created(self):
+        ProductInventory.objects.filter(pk=self.product.pk).update(total_stock=Decimal('10'))
+        RawMaterialInventory.objects.filter(pk=self.material.pk).delete()
+        line = {'item_type': 'product', 'item_id': self.product.pk,
+                'manufactured_date': '2026-01-01', 'expiration_date': '2026-12-01'}
+        lines = [
+            {**line, 'quantity': '5'},
+            {**line, 'quantity': '7'},
+            {'item_type': 'raw material', 'item_id': self.material.pk, 'quantity': '2.5'},
+            {'item_type': 'RAW_MATERIAL', 'item_id': self.material.pk, 'quantity': '1.25'},
+        ]
+        stamps = versions._stamps([ProductBatches, RawMaterialBatches])
+        with self.captureOnCommitCallbacks(execute=True):
+            result = intake.receive(lines, self.author)
+
+        self.assertEqual(result, intake.IntakeResult(batches=4, items=2, created_inventory=1))
+        self.assertEqual(ProductInventory.objects.get(pk=self.product.pk).total_stock, Decimal('22'))
+        created = RawMaterialInventory.objects.get(pk=self.material.pk)
+        self.assertEqual((created.total_stock, created.reorder_threshold), (Decimal('3.75'), 0))
+        self.assertEqual(ProductBatches.objects.count(), 2)
+        self.assertEqual(RawMaterialBatches.objects.count(), 2)
+        self.assertEqual(
+            sorted(StockChanges.objects.values_list('quantity_change', flat=True)),
+            [Decimal('1.25'), Decimal('2.5'), Decimal('5'), Decimal('7')],
+        )
+        # The batch tables were bulk-inserted without signals; their stamps still moved
+        after = versions._stamps([ProductBatches, RawMaterialBatches])
+        self.assertTrue(all(old != new for old, new in zip(stamps, after)))
+
+
+class SyncTests(InventoryTestCase):
+    def sale(self, amount):
+        return Sales.objects.create(
+            category='Retail', amount=Decimal(amount), date=timezone.now(), created_by_admin=self.author,
+        )
+
+    def sync_all(self, token=None, limit=sync.DEFAULT_LIMIT):
+        """Follow ``has_more`` to the end; returns the final token and every delta."""
+        deltas = []
+        while True:
+            delta = sync.build_delta(token, limit)
+            deltas.append(delta)
+            token = delta['token']
+            if not delta['has_more']:
+                return token, deltas
+
+    def test_token_round_trip(self):
+        state = {'seq': 42, 'hwm': {'sales': 7, 'product_inventory': 3}}
+        self.assertEqual(sync.decode_token(sync.encode_token(state)), state)
+        for garbage in ('', 'not-a-token', sync.encode_token({'seq': 'x'}), 'e30'):
+            self.assertEqual(sync.decode_token(garbage), {'seq': 0, 'hwm': {}})
+
+    def test_has_more_pages_through_every_row(self):
+        sales = [self.sale(i + 1) for i in range(7)]
+        token, deltas = self.sync_all(limit=3)
+
+        self.assertGreater(len(deltas), 2)
+        self.assertTrue(all(delta['has_more'] for delta in deltas[:-1]))
+        synced = [row[0] for delta in deltas for row in delta['upserts'].get('sales', [])]
+        self.assertEqual(synced, [sale.pk for sale in sales])
+        self.assertEqual(self.sync_all(token)[1][-1]['upserts'], {})
+
+    def test_updates_and_deletes_since_token(self):
+        kept, removed = self.sale(10), self.sale(20)
+        token, _deltas = self.sync_all()
+
+        kept.amount = Decimal('15')
+        kept.save()
+        removed_id = removed.pk
+        removed.delete()
+        delta = sync.build_delta(token)
+
+        self.assertFalse(delta['reset'])
+        columns = delta['columns']['sales']
+        (row,) = delta['upserts']['sales']
+        self.assertEqual((row[0], row[columns.index('amount')]), (kept.pk, Decimal('15')))
+        self.assertEqual(delta['deletes'], {'sales': [removed_id]})
+
+    def test_token_older_than_the_purge_resyncs(self):
+        first = self.sale(10)
+        token, _deltas = self.sync_all()
+        for amount in (11, 12, 13):
+            first.amount = Decimal(amount)
+            first.save()
+        SyncChanges.objects.update(changed_at=timezone.now() - timedelta(days=40))
+
+        # The newest entry survives, so the table never looks untouched
+        self.assertEqual(sync.purge(keep_days=30), 2)
+        self.assertEqual(sync.purge(keep_days=30), 0)
+        delta = sync.build_delta(token)
+        self.assertTrue(delta['reset'])
+        self.assertEqual([row[0] for row in delta['upserts']['sales']], [first.pk])
+        # The new token is current again
+        self.assertFalse(sync.build_delta(delta['token'])['reset'])
+
+    def test_invalid_token_resets_and_no_token_does_not(self):
+        self.sale(10)
+        self.assertTrue(sync.build_delta('garbage')['reset'])
+        self.assertFalse(sync.build_delta(None)['reset'])
+
+
+class PaginationTests(InventoryTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Pairs of sales share a timestamp, so pages must break ties on ``id``
+        start = timezone.now() - timedelta(days=30)
+        cls.sales = [
+            Sales.objects.create(
+                category='Retail', amount=Decimal(i + 1), date=start + timedelta(days=i // 2),
+                created_by_admin=cls.author,
+            )
+            for i in range(11)
+        ]
+
+    def walk(self, paginator):
+        """Follow next cursors to the end, then previous cursors back; returns both id lists."""
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        forward = [[sale.pk for sale in page] for page in pages]
+        backward = [[sale.pk for sale in pages[-1]]]
+        page = pages[-1]
+        while page.has_previous():
+            page = paginator.get_page(page.previous_cursor)
+            backward.append([sale.pk for sale in page])
+        self.assertFalse(page.has_previous())
+        return forward, backward[::-1]
+
+    def test_cursor_round_trip(self):
+        moment = timezone.now()
+        token = pagination.encode_cursor('next', [moment, moment.date(), Decimal('1.50'), 7, 'x'])
+        self.assertEqual(
+            pagination.decode_cursor(token),
+            ('next', [moment.isoformat(), moment.date().isoformat(), '1.50', 7, 'x']),
+        )
+        self.assertNotIn('=', token)
+
+    def test_garbage_and_tampered_cursors_are_rejected(self):
+        wrong_direction = pagination.encode_cursor('sideways', [1])
+        not_a_list = base64.urlsafe_b64encode(b'["next",1]').decode()
+        not_json = base64.urlsafe_b64encode(b'not json').decode()
+        for token in (None, '', '!!!', not_json, wrong_direction, not_a_list):
+            self.assertIsNone(pagination.decode_cursor(token), token)
+
+    def test_bad_cursor_falls_back_to_the_first_page(self):
+        paginator = pagination.KeysetPaginator(Sales.objects.all(), ('-date', '-id'), per_page=4)
+        first = [sale.pk for sale in paginator.get_page()]
+        # Garbage, and a well-formed cursor with the wrong number of keys
+        for token in ('garbage', pagination.encode_cursor('next', [1])):
+            page = paginator.get_page(token)
+            self.assertEqual([sale.pk for sale in page], first)
+            self.assertFalse(page.has_previous())
+
+    def test_next_and_previous_in_both_directions(self):
+        newest_first = [sale.pk for sale in sorted(self.sales, key=lambda s: (s.date, s.pk), reverse=True)]
+        for ordering, expected in ((('-date', '-id'), newest_first), (('date', 'id'), newest_first[::-1])):
+            paginator = pagination.KeysetPaginator(Sales.objects.all(), ordering, per_page=4)
+            forward, backward = self.walk(paginator)
+            self.assertEqual(forward, [expected[0:4], expected[4:8], expected[8:]], ordering)
+            self.assertEqual(backward, forward, ordering)
+
+    def test_mixed_directions_are_refused(self):
+        with self.assertRaises(ValueError):
+            pagination.KeysetPaginator(Sales.objects.all(), ('-date', 'id'))
+
+    def test_approximate_count_only_for_unfiltered_querysets(self):
+        with mock.patch.object(pagination, 'approximate_row_count', return_value=123) as estimate:
+            unfiltered = pagination.KeysetPaginator(Sales.objects.all(), ('-id',), approximate_total=True)
+            filtered = pagination.KeysetPaginator(
+                Sales.objects.filter(category__icontains='retail'), ('-id',), approximate_total=True,
+            )
+            disabled = pagination.KeysetPaginator(Sales.objects.all(), ('-id',))
+            self.assertEqual(unfiltered.approximate_count, 123)
+            self.assertEqual(unfiltered.approximate_count, 123)
+            self.assertIsNone(filtered.approximate_count)
+            self.assertIsNone(disabled.approximate_count)
+        estimate.assert_called_once()
+
+    @override_settings(KEYSET_PAGINATION=True)
+    def test_sales_list_pages_by_cursor(self):
+        self.client.force_login(User.objects.get(username='tester'))
+        url = reverse('sales_list')
+
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        page = first.context['sales']
+        self.assertTrue(page.is_keyset)
+        self.assertEqual(len(page), 10)
+        self.assertContains(first, f'cursor={page.next_cursor}')
+
+        second = self.client.get(url, {'cursor': page.next_cursor})
+        rest = second.context['sales']
+        self.assertEqual(len(rest), 1)
+        self.assertFalse(rest.has_next())
+        self.assertTrue(rest.has_previous())
+        self.assertNotIn(rest[0].pk, {sale.pk for sale in page})
+
+
+class SnapshotTests(InventoryTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        now = timezone.now()
+        for days_ago, item, change in (
+            (20, cls.product, 40), (15, cls.material, 6), (10, cls.product, -12),
+            (5, cls.material, -2), (2, cls.product, -3),
+        ):
+            StockChanges.objects.create(
+                item_type='PRODUCT' if item is cls.product else 'RAW_MATERIAL', item_id=item.pk,
+                quantity_change=Decimal(change), category='test', date=now - timedelta(days=days_ago),
+                created_by_admin=cls.author,
+            )
+
+    def quantities(self, at):
+        result = snapshots.stock_as_of(at)
+        return [(line.item_type, line.item_id, line.quantity) for line in result.lines], result.total_value
+
+    def test_snapshots_before_or_after_do_not_change_the_result(self):
+        now = timezone.now()
+        at = now - timedelta(days=8)
+        expected = self.quantities(at)
+        self.assertEqual(expected[0], [
+            ('product', self.product.pk, Decimal('28')), ('raw_material', self.material.pk, Decimal('6')),
+        ])
+
+        for taken in (now - timedelta(days=12), now - timedelta(days=4), at):
+            StockSnapshot.objects.all().delete()
+            snapshots.take(taken)
+            result = snapshots.stock_as_of(at)
+            self.assertEqual(result.snapshot_at, taken)
+            self.assertEqual(self.quantities(at), expected, taken)
+
+    def test_future_snapshot_is_refused(self):
+        with self.assertRaises(ValueError):
+            snapshots.take(timezone.now() + timedelta(minutes=1))
+        self.assertFalse(StockSnapshot.objects.exists())
+
+
+class BestSellersTests(InventoryTestCase):
+    def test_year_choices_are_the_years_with_sales(self):
+        old = self.withdraw(self.product, 1, days_ago=3 * 366)
+        recent = self.withdraw(self.product, 2)
+        self.withdraw(self.product, 5, reason='EXPIRED', days_ago=2 * 366)
+        self.client.force_login(User.objects.get(username='tester'))
+
+        response = self.client.get(reverse('best_sellers'), {'show_all': '1'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context['filters']['available_years'],
+            [timezone.localtime(old.date).year, timezone.localtime(recent.date).year],
+        )
+
+
+class ExportTests(InventoryTestCase):
+    def test_formula_like_text_is_escaped(self):
+        ProductTypes.objects.filter(pk=self.product.product_type_id).update(name='=cmd|calc')
+        self.withdraw(self.product, 2)
+        for text in ('=SUM(A1)', '+1', '-1', '@x', '\tTab', '\rCR'):
+            Sales.objects.create(
+                category='Retail', amount=Decimal('-5'), description=text, date=timezone.now(),
+                created_by_admin=self.author,
+            )
+        Sales.objects.create(
+            category='Retail', amount=Decimal('5'), description='plain - text', date=timezone.now(),
+            created_by_admin=self.author,
+        )
+
+        header, *rows = exports.iter_rows('sales')
+        description = header.index('Description')
+        self.assertEqual(
+            [row[description] for row in rows],
+            ["'=SUM(A1)", "'+1", "'-1", "'@x", "'\tTab", "'\rCR", 'plain - text'],
+        )
+        # Numbers are left alone, negative or not
+        self.assertEqual(rows[0][header.index('Amount')], Decimal('-5'))
+
+        header, *rows = exports.iter_rows('withdrawals')
+        self.assertTrue(rows[0][header.index('Item Name')].startswith("'=cmd|calc"))
@@ -0,0 +1,106 @@
+"""
+Per-request SQL and template timing.
+
+``RequestTimingMiddleware`` starts a ``Timings`` for each request and keeps
+it in a context variable, which ``sync_to_async`` carries into worker
+threads. ``sql_hook`` is added to every database connection as it is
+opened (``connection_created``, see ``inventory.signals``) with
+``execute_wrappers``. It counts queries and adds up their time for whatever
+request is current, so queries run from report thread pools are included
+(their times add up, so ``db`` can exceed the wall-clock total). Outside a
+request it does nothing. ``TimedDjangoTemplates`` is a drop-in for the
+Django template backend that adds top-level render time. Included templates are rendered
+inside that call, so each page is counted once. Queries run lazily while
+rendering are counted as SQL and not as template time.
+
+The hooks use only ``perf_counter`` and a few additions, so they can stay
+on in production. Statements over ``SLOW_QUERY_MS`` are handed to
+``inventory.slow_queries``.
+"""
+import time
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from . import slow_queries
+
+_current = ContextVar('inventory_request_timings', default=None)
+
+
+class Timings:
+    __slots__ = ('started', 'url_name', 'queries', 'sql', 'template', 'parent')
+
+    def __init__(self, parent=None):
+        # SQL is also added to the enclosing Timings (the benchmark's, around a request)
+        self.parent = parent
+        self.started = time.perf_counter()
+        self.url_name = '-'
+        self.queries = 0
+        self.sql = 0.0
+        self.template = 0.0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def start():
+    """Begin timing the current request; returns the ``Timings`` and a token for ``finish``."""
+    timings = Timings(_current.get())
+    return timings, _current.set(timings)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def install_sql_hook(sender, connection, **kwargs):
+    """``connection_created`` receiver; idempotent across reconnects."""
+    if sql_hook not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_hook)
+
+
+def sql_hook(execute, sql, params, many, context):
+    """``execute_wrapper`` hook adding the statement's time to the current request."""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        result = execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        outer = timings
+        while outer is not None:
+            outer.sql += elapsed
+            outer.queries += 1
+            outer = outer.parent
+    if elapsed >= slow_queries.threshold():
+        slow_queries.record(sql, params, many, elapsed, context['connection'], timings.url_name)
+    return result
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        sql_before = timings.sql
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template += time.perf_counter() - started - (timings.sql - sql_before)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """``DjangoTemplates`` whose templates report their render time to the current request."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
@@ -1,17 +1,21 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.db.models import Sum, Count, Q
-from django.db.models.functions import TruncMonth
-from django.http import JsonResponse, FileResponse
+from django.db.models import Sum, Q, F, Exists, OuterRef, DecimalField
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse, FileResponse, Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_protect
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from decimal import Decimal
+from functools import partial
+import asyncio
 import logging
 from datetime import datetime
 
+from asgiref.sync import sync_to_async
+
 # Set up logging
 logger = logging.getLogger(__name__)
 
@@ -58,6 +62,7 @@ def login_view(request):
             else:
                 # Session ends when browser closes
                 request.session.set_expiry(0)
+            session_tracking.update_expiry(request)
             
             # Log successful login
             logger.info(f"Successful login: {username} from IP: {get_client_ip(request)}")
@@ -103,25 +108,29 @@ from .models import (
     Sales,
     Expenses,
     HistoryLog,
+    HistoryLogTypes,
     StockChanges,
     Products,
     RawMaterials,
-    AuthUser,
     Withdrawals,
+    MonthlyFinancialRollup,
 )
+from . import counters, expiry, exports, items, metrics, parallel, producibility, rollups, search, session_tracking, snapshots
+from .caching import cached_page
+from .pagination import paginate
+from .routers import reads_from_replica
 
 @login_required(login_url="login")
-def dashboard(request):
-    context = {
-        "product_count": ProductInventory.objects.filter(product__is_archived=False).count(),
-        "raw_count": RawMaterialInventory.objects.filter(material__is_archived=False).count(),
-        "sales_count": Sales.objects.count(),
-        "expense_count": Expenses.objects.count(),
-        "log_count": HistoryLog.objects.count(),
-    }
-    return render(request, "dashboard.html", context)
+async def dashboard(request):
+    context, expiry_summary = await asyncio.gather(
+        counters.adashboard_counts(),
+        parallel.run(expiry.latest_summary),
+    )
+    context["expiry_summary"] = expiry_summary
+    return await sync_to_async(render)(request, "dashboard.html", context)
 
 @login_required(login_url="login")
+@cached_page(ProductInventory, Products, labels=True)
 def product_stock(request):
     search_query = request.GET.get('q', '').strip()
 
@@ -129,7 +138,6 @@ def product_stock(request):
         ProductInventory.objects
         .select_related("product")
         .filter(product__is_archived=False)
-        .order_by("product__id")
     )
     if search_query:
         products_qs = products_qs.filter(
@@ -137,9 +145,7 @@ def product_stock(request):
             Q(product__variant__name__icontains=search_query) |
             Q(product__description__icontains=search_query)
         )
-    paginator = Paginator(products_qs, 10)
-    page_number = request.GET.get("page")
-    products_page = paginator.get_page(page_number)
+    products_page = paginate(request, products_qs, ("product_id",))
     return render(request, "product_stock.html", {
         "products": products_page,
         "search_query": search_query,
@@ -147,6 +153,7 @@ def product_stock(request):
 
 
 @login_required(login_url="login")
+@cached_page(RawMaterialInventory, RawMaterials, labels=True)
 def raw_stock(request):
     search_query = request.GET.get('q', '').strip()
 
@@ -154,15 +161,12 @@ def raw_stock(request):
         RawMaterialInventory.objects
         .select_related("material")
         .filter(material__is_archived=False)
-        .order_by('material__name')
     )
     if search_query:
         raws_qs = raws_qs.filter(
             Q(material__name__icontains=search_query)
         )
-    paginator = Paginator(raws_qs, 10)
-    page_number = request.GET.get("page")
-    raws_page = paginator.get_page(page_number)
+    raws_page = paginate(request, raws_qs, ("material__name", "material_id"))
     return render(request, "raw_stock.html", {
         "raws": raws_page,
         "search_query": search_query,
@@ -170,6 +174,8 @@ def raw_stock(request):
 
 
 @login_required(login_url="login")
+@cached_page(Withdrawals, Products, labels=True, dated=True)
+@reads_from_replica
 def best_sellers(request):
     """Display top/low selling products using mobile-friendly widgets"""
     month_param = request.GET.get('month')
@@ -188,79 +194,82 @@ def best_sellers(request):
         except ValueError:
             pass
 
-    withdrawals_qs = Withdrawals.objects.filter(
+    sold_qs = Withdrawals.objects.filter(
         item_type='PRODUCT',
         reason='SOLD',
         is_archived=False
     )
 
     if not show_all:
-        withdrawals_qs = withdrawals_qs.filter(date__year=filter_year, date__month=filter_month)
+        # Half-open local-time range so the planner can use an index on date
+        tz = timezone.get_current_timezone()
+        period_start = datetime(filter_year, filter_month, 1, tzinfo=tz)
+        if filter_month == 12:
+            period_end = datetime(filter_year + 1, 1, 1, tzinfo=tz)
+        else:
+            period_end = datetime(filter_year, filter_month + 1, 1, tzinfo=tz)
+        period_qs = sold_qs.filter(date__gte=period_start, date__lt=period_end)
     else:
+        period_qs = sold_qs
         filter_label = 'All Time'
 
-    product_sales: dict[int, dict[str, Decimal]] = {}
-    for withdrawal in withdrawals_qs:
-        stats = product_sales.setdefault(withdrawal.item_id, {
-            'total_quantity': Decimal('0'),
-            'total_revenue': Decimal('0'),
-        })
-        quantity = Decimal(withdrawal.quantity or 0)
-        stats['total_quantity'] += quantity
-        price = withdrawal.custom_price if withdrawal.custom_price is not None else Decimal('0')
-        stats['total_revenue'] += price * quantity
-
-    product_ids = list(product_sales.keys())
-    products_map = {
-        product.id: product
-        for product in Products.objects.select_related(
-            'product_type', 'variant', 'size', 'size_unit'
-        ).filter(id__in=product_ids)
-    }
+    product_totals = (
+        period_qs.values('item_id')
+        .annotate(
+            total_quantity=Coalesce(Sum('quantity'), Decimal('0'), output_field=DecimalField()),
+            total_revenue=Coalesce(
+                Sum(Coalesce('custom_price', Decimal('0'), output_field=DecimalField()) * F('quantity')),
+                Decimal('0'),
+                output_field=DecimalField(),
+            ),
+        )
+    )
+    best_rows = list(product_totals.order_by('-total_quantity', 'item_id')[:10])
+    low_rows = list(product_totals.order_by('total_quantity', 'item_id')[:10])
 
-    def describe_product(product_obj):
-        if not product_obj:
+    resolved = items.resolve_items(
+        (items.PRODUCT, row['item_id']) for row in best_rows + low_rows
+    )
+
+    def describe_product(product_id):
+        item = resolved.get((items.PRODUCT, product_id))
+        if not item:
             return ('Archived Product', 'Record no longer available')
-        return (
-            f"{product_obj.product_type.name} - {product_obj.variant.name}",
-            f"{product_obj.size.size_label} {product_obj.size_unit.unit_name}"
-        )
+        return (item.name, item.detail)
 
-    sold_products = []
-    for pid, stats in product_sales.items():
-        name, detail = describe_product(products_map.get(pid))
-        sold_products.append({
-            'product_id': pid,
+    def build_entry(row):
+        name, detail = describe_product(row['item_id'])
+        return {
+            'product_id': row['item_id'],
             'name': name,
             'detail': detail,
-            'total_quantity': stats['total_quantity'],
-            'total_revenue': stats['total_revenue'],
-        })
+            'total_quantity': row['total_quantity'],
+            'total_revenue': row['total_revenue'],
+        }
 
-    best_selling = sorted(sold_products, key=lambda item: item['total_quantity'], reverse=True)[:10]
-    low_selling = sorted(sold_products, key=lambda item: item['total_quantity'])[:10]
+    best_selling = [build_entry(row) for row in best_rows]
+    low_selling = [build_entry(row) for row in low_rows]
 
     if len(low_selling) < 10:
         missing = 10 - len(low_selling)
-        zero_products = (
+        zero_ids = list(
             Products.objects.filter(is_archived=False)
-            .exclude(id__in=product_ids)
-            .select_related('product_type', 'variant', 'size', 'size_unit')
-            .order_by('product_type__name', 'variant__name')[:missing]
+            .exclude(Exists(period_qs.filter(item_id=OuterRef('pk'))))
+            .order_by('product_type__name', 'variant__name')
+            .values_list('id', flat=True)[:missing]
         )
-        for product in zero_products:
-            name, detail = describe_product(product)
+        resolved.update(items.resolve_items((items.PRODUCT, pid) for pid in zero_ids))
+        for product_id in zero_ids:
+            name, detail = describe_product(product_id)
             low_selling.append({
-                'product_id': product.id,
+                'product_id': product_id,
                 'name': name,
                 'detail': detail,
                 'total_quantity': Decimal('0'),
                 'total_revenue': Decimal('0'),
             })
 
-    available_years = sorted({d.year for d in Withdrawals.objects.filter(
-        item_type='PRODUCT', reason='SOLD', is_archived=False
-    ).dates('date', 'year')})
+    available_years = sorted({d.year for d in sold_qs.dates('date', 'year')})
     month_choices = [
         {'value': f"{m:02d}", 'label': datetime(2000, m, 1).strftime('%B')}
         for m in range(1, 13)
@@ -283,11 +292,50 @@ def best_sellers(request):
 
 
 @login_required(login_url="login")
+def producibility_report(request):
+    """How many units of each product current raw material stock can make."""
+    search_query = request.GET.get('q', '').strip()
+    capacities = producibility.compute()
+    if search_query:
+        capacities = [c for c in capacities if search_query.lower() in c.label.lower()]
+    return render(request, "producibility.html", {
+        "capacities": capacities,
+        "search_query": search_query,
+    })
+
+
+@login_required(login_url="login")
+def expiring_report(request):
+    """Batches expiring within ?days= (default EXPIRY_HORIZON_DAYS), grouped by item."""
+    days = expiry.horizon_days(request.GET.get('days'))
+    entries = expiry.expiring(days)
+    return render(request, "expiring_batches.html", {
+        "entries": entries,
+        "days": days,
+        "total_value": sum((entry.value for entry in entries), Decimal("0")),
+    })
+
+
+@login_required(login_url="login")
+def stock_as_of_report(request):
+    """Quantity and value of every item at ?date= (end of that day) or ?at= (ISO datetime)."""
+    value = request.GET.get('at') or request.GET.get('date')
+    try:
+        at = snapshots.parse_at(value) if value else timezone.now()
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    result = snapshots.stock_as_of(at)
+    return render(request, "stock_as_of.html", {
+        "result": result,
+        "date": timezone.localtime(at).date(),
+    })
+
+
+@login_required(login_url="login")
+@cached_page(HistoryLog, HistoryLogTypes)
 def history_log_view(request):
-    logs_qs = HistoryLog.objects.select_related("admin", "log_type").order_by("-log_date")
-    paginator = Paginator(logs_qs, 10)
-    page_number = request.GET.get("page")
-    logs_page = paginator.get_page(page_number)
+    logs_qs = HistoryLog.objects.select_related("admin", "log_type")
+    logs_page = paginate(request, logs_qs, ("-log_date", "-id"), approximate_total=True)
     return render(request, "history_log.html", {"logs": logs_page})
 
 
@@ -295,14 +343,12 @@ def history_log_view(request):
 def sales_list(request):
     search_query = request.GET.get('q', '').strip()
 
-    sales_qs = Sales.objects.all().order_by('-date')
+    sales_qs = Sales.objects.all()
     if search_query:
         sales_qs = sales_qs.filter(
             Q(category__icontains=search_query)
         )
-    paginator = Paginator(sales_qs, 10)
-    page_number = request.GET.get("page")
-    sales_page = paginator.get_page(page_number)
+    sales_page = paginate(request, sales_qs, ("-date", "-id"), approximate_total=True)
     return render(request, "sales_list.html", {
         "sales": sales_page,
         "search_query": search_query,
@@ -313,15 +359,13 @@ def sales_list(request):
 def expenses_list(request):
     search_query = request.GET.get('q', '').strip()
 
-    expenses_qs = Expenses.objects.all().order_by('-date')
+    expenses_qs = Expenses.objects.all()
     if search_query:
         expenses_qs = expenses_qs.filter(
             Q(category__icontains=search_query) |
             Q(description__icontains=search_query)
         )
-    paginator = Paginator(expenses_qs, 10)
-    page_number = request.GET.get("page")
-    expenses_page = paginator.get_page(page_number)
+    expenses_page = paginate(request, expenses_qs, ("-date", "-id"), approximate_total=True)
     return render(request, "expenses_list.html", {
         "expenses": expenses_page,
         "search_query": search_query,
@@ -329,49 +373,23 @@ def expenses_list(request):
 
 
 @login_required(login_url="login")
+@reads_from_replica
 def stock_changes(request):
     """Display stock changes with pagination"""
     search_query = request.GET.get('q', '').strip()
-    changes_qs = StockChanges.objects.select_related('created_by_admin').order_by('-date')
+    changes_qs = StockChanges.objects.select_related('created_by_admin')
 
     def build_change_rows(changes):
         """Attach display data (item name, creator) to StockChanges instances."""
         if not changes:
             return []
 
-        product_ids = {c.item_id for c in changes if (c.item_type or '').lower() == 'product'}
-        raw_ids = {c.item_id for c in changes if (c.item_type or '').lower() == 'raw_material'}
-
-        product_map = {}
-        if product_ids:
-            product_qs = (
-                Products.objects.select_related('product_type', 'variant', 'size', 'size_unit')
-                .filter(id__in=product_ids)
-            )
-            for product in product_qs:
-                size_label = getattr(product.size, 'size_label', 'N/A')
-                unit_name = getattr(product.size_unit, 'unit_name', '')
-                product_map[product.id] = (
-                    f"{product.product_type.name} - {product.variant.name} "
-                    f"({size_label} {unit_name})"
-                )
-
-        raw_map = {}
-        if raw_ids:
-            raw_qs = RawMaterials.objects.select_related('unit').filter(id__in=raw_ids)
-            for material in raw_qs:
-                unit_name = getattr(material.unit, 'unit_name', '')
-                raw_map[material.id] = f"{material.name} ({material.size} {unit_name})"
+        resolved = items.resolve_items((c.item_type, c.item_id) for c in changes)
 
         rows = []
         for change in changes:
-            item_type = (change.item_type or '').lower()
-            if item_type == 'product':
-                item_name = product_map.get(change.item_id, f"Product ID {change.item_id} (Deleted)")
-            elif item_type == 'raw_material':
-                item_name = raw_map.get(change.item_id, f"Raw Material ID {change.item_id} (Deleted)")
-            else:
-                item_name = "Unknown Item"
+            item = items.lookup(resolved, change.item_type, change.item_id)
+            item_name = item.label if item else items.missing_label(change.item_type, change.item_id)
 
             rows.append({
                 'id': change.id,
@@ -384,27 +402,11 @@ def stock_changes(request):
             })
         return rows
 
-    page_number = request.GET.get('page')
-
     if search_query:
-        # Only build the expensive list when actually searching
-        all_changes = list(changes_qs)
-        changes_list = build_change_rows(all_changes)
-        query = search_query.lower()
-        filtered = [
-            entry for entry in changes_list
-            if query in entry['item_name'].lower()
-            or query in (entry['item_type'] or '').lower()
-            or query in entry['category'].lower()
-            or query in str(entry['quantity_change']).lower()
-            or query in entry['created_by'].lower()
-        ]
-        paginator = Paginator(filtered, 10)
-        changes_page = paginator.get_page(page_number)
-    else:
-        paginator = Paginator(changes_qs, 10)
-        changes_page = paginator.get_page(page_number)
-        changes_page.object_list = build_change_rows(list(changes_page.object_list))
+        changes_qs = changes_qs.filter(search.stock_changes_filter(search_query))
+
+    changes_page = paginate(request, changes_qs, ('-date', '-id'), approximate_total=True)
+    changes_page.object_list = build_change_rows(list(changes_page.object_list))
 
     return render(request, "stock_changes.html", {
         "changes": changes_page,
@@ -413,89 +415,63 @@ def stock_changes(request):
 
 
 @login_required(login_url="login")
+@require_http_methods(["GET"])
+def export_ledger(request, ledger):
+    """Stream a ledger as CSV, optionally limited to ?from=/&to= (YYYY-MM-DD)."""
+    if ledger not in exports.LEDGERS:
+        raise Http404("Unknown ledger")
+    try:
+        start = exports.parse_date(request.GET["from"]) if request.GET.get("from") else None
+        end = exports.parse_date(request.GET["to"]) if request.GET.get("to") else None
+    except ValueError:
+        return HttpResponseBadRequest("Dates must be YYYY-MM-DD")
+
+    logger.info(f"User {request.user.username} exported {ledger} ({start} to {end})")
+    response = StreamingHttpResponse(exports.iter_csv(ledger, start, end), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{exports.filename(ledger, start, end)}"'
+    return response
+
+
+@login_required(login_url="login")
+@cached_page()
 def monthly_report(request):
     """Render monthly business report page"""
     return render(request, "monthly_report.html")
 
 @login_required(login_url="login")
-def monthly_report_data(request):
-    """Mirror production monthly report logic using ORM"""
-    sales = (
-        Sales.objects.annotate(month=TruncMonth("date"))
-        .values("month")
-        .annotate(total_sales=Sum("amount"))
-        .order_by("month")
-    )
-
-    expenses = (
-        Expenses.objects.annotate(month=TruncMonth("date"))
-        .values("month")
-        .annotate(total_expenses=Sum("amount"))
-        .order_by("month")
-    )
-
-    loss_withdrawals = list(
-        Withdrawals.objects
-        .filter(
-            reason__in=['EXPIRED', 'DAMAGED', 'REPLACEMENT_FOR_RETURNED'],
-            is_archived=False
+@reads_from_replica
+async def monthly_report_data(request):
+    """
+    Monthly report served from the incrementally maintained rollup table
+    (its recent months refreshed first when older than MONTHLY_ROLLUP_TTL).
+    With ?live=1 it is recomputed from the ledgers instead, running the
+    sales, expenses and per-item-type loss aggregates concurrently.
+    """
+    if request.GET.get("live"):
+        sales, expenses, *losses = await parallel.gather(
+            rollups.monthly_sales,
+            rollups.monthly_expenses,
+            *(partial(rollups.monthly_losses, withdrawals=part) for part in rollups.loss_parts()),
         )
-        .annotate(month=TruncMonth("date"))
-        .values("month", "item_type", "item_id", "quantity", "custom_price")
-    )
-
-    product_ids = {w["item_id"] for w in loss_withdrawals if w["item_type"] == 'PRODUCT'}
-    raw_ids = {w["item_id"] for w in loss_withdrawals if w["item_type"] == 'RAW_MATERIAL'}
-
-    product_prices = {}
-    if product_ids:
-        product_qs = Products.objects.select_related('unit_price').filter(id__in=product_ids)
-        for product in product_qs:
-            product_prices[product.id] = Decimal(product.unit_price.unit_price)
-
-    raw_prices = {}
-    if raw_ids:
-        raw_qs = RawMaterials.objects.filter(id__in=raw_ids)
-        for material in raw_qs:
-            raw_prices[material.id] = Decimal(material.price_per_unit)
-
-    financial_loss_dict = {}
-    for withdrawal in loss_withdrawals:
-        month = withdrawal["month"]
-        if month not in financial_loss_dict:
-            financial_loss_dict[month] = Decimal('0.00')
-
-        quantity = Decimal(withdrawal["quantity"]) if withdrawal["quantity"] is not None else Decimal('0.00')
-        custom_price = withdrawal.get("custom_price")
-        if custom_price is not None:
-            price = Decimal(custom_price)
-        elif withdrawal["item_type"] == 'PRODUCT':
-            price = product_prices.get(withdrawal["item_id"])
-        else:
-            price = raw_prices.get(withdrawal["item_id"])
-
-        if price is None:
-            continue
-
-        loss_amount = quantity * price
-        financial_loss_dict[month] += loss_amount
-
-    def normalize_date(dt):
-        return dt.date() if hasattr(dt, 'date') else dt
-
-    expenses_dict = {normalize_date(e["month"]): e["total_expenses"] for e in expenses}
-    sales_dict = {normalize_date(s["month"]): s["total_sales"] for s in sales}
-    normalized_loss = {normalize_date(m): amt for m, amt in financial_loss_dict.items()}
+        totals = rollups.merge_months(sales, expenses, *losses)
+        rows = [{"month": month, **values} for month, values in sorted(totals.items())]
+    else:
+        await parallel.run(rollups.refresh_recent)
+        rows = [row async for row in MonthlyFinancialRollup.objects.order_by("month").values(
+            "month", "total_sales", "total_expenses", "total_loss"
+        )]
+    return JsonResponse(_monthly_report(rows))
 
-    months = sorted(set(list(sales_dict.keys()) + list(expenses_dict.keys()) + list(normalized_loss.keys())))
 
+def _monthly_report(rows):
     report = []
     prev = None
-    for month in months:
-        gross_revenue = Decimal(sales_dict.get(month, 0) or 0)
-        loss = Decimal(normalized_loss.get(month, 0) or 0)
+    for row in rows:
+        month = row["month"]
+        gross_revenue = row["total_sales"]
+        loss = row["total_loss"]
         revenue = gross_revenue - loss
-        expense = Decimal(expenses_dict.get(month, 0) or 0)
+        expense = row["total_expenses"]
         profit = revenue - expense
 
         revenue_change = profit_change = None
@@ -520,7 +496,7 @@ def monthly_report_data(request):
     total_profit = sum(r["profit"] for r in report)
     avg_profit = total_profit / len(report) if report else 0
 
-    return JsonResponse({
+    return {
         "summary": {
             "total_revenue": total_revenue,
             "total_loss": total_loss,
@@ -528,60 +504,32 @@ def monthly_report_data(request):
             "avg_profit": avg_profit,
         },
         "monthly_data": report
-    })
+    }
 
 
 @login_required(login_url="login")
+@reads_from_replica
 def user_activity(request):
     """Display list of users with their login/logout activity"""
-    from django.contrib.sessions.models import Session
-    
-    # Preload active sessions once to avoid repeated decoding and skip corrupted rows
-    active_sessions = Session.objects.filter(expire_date__gte=timezone.now())
-    active_user_ids = set()
-    for session in active_sessions:
-        try:
-            session_data = session.get_decoded()
-        except Exception as exc:
-            logger.warning(f"Skipping corrupted session {session.session_key}: {exc}")
-            continue
-        user_id = session_data.get('_auth_user_id')
-        if user_id:
-            try:
-                active_user_ids.add(int(user_id))
-            except ValueError:
-                continue
-
-    # Get all users
-    users = AuthUser.objects.all().order_by('username')
-    
-    # Build user activity data
     user_list = []
-    excluded_prefixes = ("deleted_", "inactive_", "rejected_")
-    for user in users:
-        username_lower = (user.username or "").lower()
-        if username_lower.startswith(excluded_prefixes):
-            continue
-        # Get last login
-        last_login = user.last_login
-        
+    for user in session_tracking.user_activity_queryset():
         # Determine status
         if not user.is_active:
             status = 'Inactive'
-        elif user.id in active_user_ids:
+        elif user.is_online:
             status = 'Active'
         else:
             status = 'Logged Out'
-        
+
         user_list.append({
             'username': user.username,
             'email': user.email,
             'status': status,
-            'last_login': last_login,
-            'last_logout': None,
+            'last_login': user.last_login,
+            'last_logout': user.last_logout,
             'is_active': user.is_active
         })
-    
+
     return render(request, "user_activity.html", {"users": user_list})
 
 
@@ -598,3 +546,23 @@ def service_worker(request):
     # prevent caching issues when updating SW
     response['Cache-Control'] = 'no-cache'
     return response
+
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """Prometheus metrics for staff users or a scraper sending ``Authorization: Bearer <METRICS_TOKEN>``"""
+    from django.conf import settings
+
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    scheme, _space, supplied = request.headers.get('Authorization', '').partition(' ')
+    authorized = (
+        (request.user.is_authenticated and request.user.is_staff)
+        or (token and scheme.lower() == 'bearer' and constant_time_compare(supplied, token))
+    )
+    if not authorized:
+        response = HttpResponse("Authentication required", status=401, content_type="text/plain")
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+    response = HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+    response['Cache-Control'] = 'no-store'
+    return response
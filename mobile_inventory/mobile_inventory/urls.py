@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.urls import path
-from inventory import views
+from inventory import api, views
 from django.shortcuts import redirect
 
 urlpatterns = [
@@ -15,6 +15,9 @@ urlpatterns = [
     path('raw/stock/', views.raw_stock, name="raw_stock"),
     path('stock/changes/', views.stock_changes, name="stock_changes"),
     path('report/best-sellers/', views.best_sellers, name="best_sellers"),
+    path('report/producibility/', views.producibility_report, name="producibility_report"),
+    path('report/expiring/', views.expiring_report, name="expiring_report"),
+    path('report/stock-as-of/', views.stock_as_of_report, name="stock_as_of_report"),
 
     path('history/', views.history_log_view, name="history_log"),
 
@@ -26,6 +29,25 @@ urlpatterns = [
     path('report/monthly/', views.monthly_report, name="monthly_report"),
     path('api/report/monthly/', views.monthly_report_data, name="monthly_report_data"),
     path('service-worker.js', views.service_worker, name="service_worker"),
+    path('metrics', views.metrics_view, name="metrics"),
+
+    # JSON API for the PWA (ETag / conditional GET)
+    path('api/stock/products/', api.product_stock_api, name="product_stock_api"),
+    path('api/stock/raw/', api.raw_stock_api, name="raw_stock_api"),
+    path('api/stock/changes/', api.stock_changes_api, name="stock_changes_api"),
+    path('api/sales/', api.sales_api, name="sales_api"),
+    path('api/expenses/', api.expenses_api, name="expenses_api"),
+    path('api/history/', api.history_api, name="history_api"),
+    path('api/producibility/', api.producibility_api, name="producibility_api"),
+    path('api/expiring/', api.expiring_api, name="expiring_api"),
+    path('api/stock/as-of/', api.stock_as_of_api, name="stock_as_of_api"),
+    path('api/sync/', api.sync_api, name="sync_api"),
+    path('api/intake/', api.intake_api, name="intake_api"),
+    path('api/notifications/unread/', api.unread_notifications_api, name="unread_notifications_api"),
+    path('api/search/', api.search_api, name="search_api"),
+
+    # CSV exports (stock_changes, withdrawals, sales, expenses)
+    path('export/<str:ledger>/', views.export_ledger, name="export_ledger"),
     
     # user activity
     path('user-activity/', views.user_activity, name="user_activity"),
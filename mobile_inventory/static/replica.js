@@ -0,0 +1,119 @@
+// Offline replica of the inventory tables in IndexedDB, kept current by
+// applying deltas from /api/sync/. Loaded by the service worker through
+// importScripts, and by base.html so list pages can render from it offline
+// (self.InventoryReplica).
+(function (scope) {
+  const DB_NAME = "inventory-replica";
+  const DB_VERSION = 1;
+  const SYNC_URL = "/api/sync/";
+  const STORES = {
+    product_inventory: "product_id",
+    raw_material_inventory: "material_id",
+    stock_changes: "id",
+    withdrawals: "id",
+    sales: "id",
+    expenses: "id"
+  };
+
+  function requestPromise(request) {
+    return new Promise((resolve, reject) => {
+      request.onsuccess = () => resolve(request.result);
+      request.onerror = () => reject(request.error);
+    });
+  }
+
+  function openReplica() {
+    const request = indexedDB.open(DB_NAME, DB_VERSION);
+    request.onupgradeneeded = () => {
+      const db = request.result;
+      Object.entries(STORES).forEach(([name, keyPath]) => {
+        if (!db.objectStoreNames.contains(name)) {
+          db.createObjectStore(name, { keyPath });
+        }
+      });
+      if (!db.objectStoreNames.contains("meta")) {
+        db.createObjectStore("meta");
+      }
+    };
+    return requestPromise(request);
+  }
+
+  // Rows arrive as arrays; columns[name] gives the field order per table
+  function applyDelta(db, delta) {
+    return new Promise((resolve, reject) => {
+      const tx = db.transaction([...Object.keys(STORES), "meta"], "readwrite");
+      // The server started over (stale or invalid token): drop what we have
+      if (delta.reset) {
+        Object.keys(STORES).forEach(name => tx.objectStore(name).clear());
+      }
+      Object.entries(delta.upserts || {}).forEach(([name, rows]) => {
+        const columns = delta.columns[name];
+        const store = tx.objectStore(name);
+        rows.forEach(row => {
+          const record = {};
+          columns.forEach((column, index) => { record[column] = row[index]; });
+          store.put(record);
+        });
+      });
+      Object.entries(delta.deletes || {}).forEach(([name, ids]) => {
+        const store = tx.objectStore(name);
+        ids.forEach(id => store.delete(id));
+      });
+      // Token is stored in the same transaction as the rows it covers
+      tx.objectStore("meta").put(delta.token, "token");
+      tx.objectStore("meta").put(new Date().toISOString(), "synced_at");
+      tx.oncomplete = () => resolve();
+      tx.onerror = () => reject(tx.error);
+      tx.onabort = () => reject(tx.error);
+    });
+  }
+
+  let running = null;
+
+  // Pull deltas until the server reports nothing more; concurrent calls share one run
+  function syncReplica() {
+    if (running) return running;
+    running = (async () => {
+      const db = await openReplica();
+      try {
+        let more = true;
+        while (more) {
+          const token = await requestPromise(db.transaction("meta").objectStore("meta").get("token"));
+          const url = SYNC_URL + (token ? "?since=" + encodeURIComponent(token) : "");
+          const response = await fetch(url, { credentials: "same-origin", cache: "no-store" });
+          if (!response.ok || response.redirected) {
+            // Logged out or server error; keep the replica as it is
+            return false;
+          }
+          const delta = await response.json();
+          await applyDelta(db, delta);
+          more = delta.has_more;
+        }
+        return true;
+      } finally {
+        db.close();
+      }
+    })().finally(() => { running = null; });
+    return running;
+  }
+
+  async function readReplica(name) {
+    const db = await openReplica();
+    try {
+      return await requestPromise(db.transaction(name).objectStore(name).getAll());
+    } finally {
+      db.close();
+    }
+  }
+
+  async function readMeta(key) {
+    const db = await openReplica();
+    try {
+      return await requestPromise(db.transaction("meta").objectStore("meta").get(key));
+    } finally {
+      db.close();
+    }
+  }
+
+  scope.InventoryReplica = { openReplica, applyDelta, syncReplica, readReplica, readMeta };
+})(self);
@@ -1,4 +1,6 @@
-const CACHE_NAME = "inventory-cache-v2";
+importScripts("/static/replica.js");
+
+const CACHE_NAME = "inventory-cache-v7";
 const urlsToCache = [
   "/dashboard/",
   "/products/stock/",
@@ -8,9 +10,13 @@ const urlsToCache = [
   "/expenses/",
   "/history/",
   "/report/best-sellers/",
+  "/report/producibility/",
+  "/report/expiring/",
+  "/report/stock-as-of/",
   "/report/monthly/",
   "/user-activity/",
   "/login/",
+  "/static/replica.js",
   // CDN resources for offline use
   "https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css",
   "https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js",
@@ -47,6 +53,25 @@ self.addEventListener("activate", event => {
   return self.clients.claim();
 });
 
+// Replica sync → pages ask after load/reconnect, background sync when supported
+function syncReplica() {
+  return self.InventoryReplica.syncReplica().catch(err => {
+    console.error("❌ Replica sync failed:", err);
+  });
+}
+
+self.addEventListener("message", event => {
+  if (event.data && event.data.type === "sync-replica") {
+    event.waitUntil(syncReplica());
+  }
+});
+
+self.addEventListener("sync", event => {
+  if (event.tag === "sync-replica") {
+    event.waitUntil(syncReplica());
+  }
+});
+
 // Fetch → Network First with Cache Fallback (para sa dynamic data)
 self.addEventListener("fetch", event => {
   const { request } = event;
@@ -58,6 +83,11 @@ self.addEventListener("fetch", event => {
     return;
   }
 
+  // Sync deltas go to IndexedDB and CSV exports are downloads; neither belongs in the page cache
+  if (url.pathname.startsWith("/api/sync/") || url.pathname.startsWith("/export/")) {
+    return;
+  }
+
   const cacheLookupKey = isHeadRequest ? request.url : request;
 
   event.respondWith(